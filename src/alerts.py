@@ -0,0 +1,362 @@
+"""Low-stock and fill-ratio alerts, evaluated on every change.
+
+Rules are checked where the quantities change, never by scanning:
+
+* ``LowStockIndex`` is an observer holding reorder points per product,
+  optionally overridden per warehouse. Every held product with a rule
+  sits in a ``SortedIndex`` by quantity / reorder point, so the items
+  below their reorder points are a prefix of it, lowest first.
+* ``FillIndex`` is an observer holding fill-ratio rules per warehouse,
+  comparing the total stock of the warehouse with its capacity.
+* ``FillWatch`` watches a single ``varasto.ValvottuVarasto`` bin.
+
+``StockAlerts`` combines the first two into the ``alerts`` index of a
+manager, through which clients set rules and read the low stock.
+
+Alerts are edge-triggered: one is raised when a rule starts to match
+and cleared when it stops. ``Debouncer`` collects them and hands them
+to the listeners in batches, at most one batch per ``interval``
+seconds. An alert cleared before its batch is sent is dropped, so a
+quantity bouncing around a threshold alerts at most once per interval.
+
+Rules are set through the manager, which logs and snapshots them with
+the inventory. Changes replayed from the storage do not alert: the
+process that made them already did.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from indexes import SortedIndex
+from observers import WarehouseObserver
+
+
+class Alert(NamedTuple):
+    """``kind`` is "low_stock" or "fill"; ``value`` is the quantity or
+    the fill ratio that crossed ``threshold``."""
+
+    kind: str
+    warehouse_id: object  # a warehouse ID, or the name of a watched bin
+    product: Optional[str]
+    value: float
+    threshold: float
+
+
+class Debouncer:
+    """Batches raised alerts and delivers them to the listeners."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._listeners = []
+        self._pending = {}  # {(kind, warehouse_id, product): Alert}
+        self._timer = None
+        self._lock = threading.Lock()
+        self._muted = False
+
+    def add_listener(self, listener):
+        """Call ``listener(alerts)`` with every batch of alerts."""
+        self._listeners.append(listener)
+
+    def raised(self, alert):
+        if self._muted:
+            return
+        with self._lock:
+            self._pending[alert[:3]] = alert
+            if self._timer is None and self.interval > 0:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.interval <= 0:
+            self.flush()
+
+    def cleared(self, kind, warehouse_id, product=None):
+        with self._lock:
+            self._pending.pop((kind, warehouse_id, product), None)
+
+    @contextmanager
+    def muted(self):
+        """Drop the alerts raised inside the block. Raising is not
+        locked, so nothing else may change the watched data meanwhile."""
+        self._muted = True
+        try:
+            yield
+        finally:
+            self._muted = False
+
+    def flush(self):
+        """Deliver the pending alerts now."""
+        with self._lock:
+            alerts = list(self._pending.values())
+            self._pending.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if alerts:
+            for listener in self._listeners:
+                listener(alerts)
+
+
+class LowStockIndex(WarehouseObserver):
+    """Reorder points, and the held products sorted by how far they are
+    from theirs."""
+
+    def __init__(self, products, alerts):
+        self._lock = threading.Lock()
+        self._products = products  # the ``indexes.ProductIndex``
+        self.alerts = alerts
+        self._points = {}  # {product_name: reorder point}
+        self._overrides = {}  # {product_name: {warehouse_id: point}}
+        self._keys = {}  # {(warehouse_id, product_name): key in _by_ratio}
+        # (quantity / point, warehouse_id, product_name, quantity)
+        self._by_ratio = SortedIndex()
+
+    def set_point(self, product_name, point, warehouse_id=None):
+        """Set the reorder point of a product, in every warehouse or in
+        one; None removes it. ``point`` must be positive."""
+        with self._lock:
+            # The rule goes in before the holdings are read, so a change
+            # made meanwhile is either read here or sees the rule.
+            if warehouse_id is None:
+                _set_or_pop(self._points, product_name, point)
+            else:
+                self._override(product_name, warehouse_id, point)
+            holdings = self._products.holdings(product_name)
+            if warehouse_id is not None:
+                holdings = {warehouse_id: holdings.get(warehouse_id)}
+            for wid, quantity in holdings.items():
+                self._update(wid, product_name, quantity)
+
+    def rules(self):
+        """(product_name, point, warehouse_id) of every reorder point;
+        warehouse_id is None for those set in every warehouse."""
+        with self._lock:
+            return [
+                (name, point, None) for name, point in self._points.items()
+            ] + [
+                (name, point, wid)
+                for name, points in self._overrides.items()
+                for wid, point in points.items()
+            ]
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        if product_name in self._points or product_name in self._overrides:
+            with self._lock:
+                self._update(warehouse_id, product_name, new)
+
+    def warehouse_deleted(self, warehouse_id, name):
+        with self._lock:
+            for product_name in list(self._overrides):
+                self._override(product_name, warehouse_id, None)
+
+    def below(self, limit):
+        """Up to ``limit`` (warehouse_id, product, quantity, point) below
+        their reorder points, the lowest relative to theirs first."""
+        with self._lock:
+            _, end = self._by_ratio.bounds(None, (1,))
+            return [
+                (wid, name, quantity, self._point(wid, name))
+                for _, wid, name, quantity in self._by_ratio.slice(
+                    0, min(end, limit)
+                )
+            ]
+
+    def _override(self, product_name, warehouse_id, point):
+        overrides = self._overrides.setdefault(product_name, {})
+        _set_or_pop(overrides, warehouse_id, point)
+        if not overrides:
+            del self._overrides[product_name]
+
+    def _point(self, warehouse_id, product_name):
+        point = self._overrides.get(product_name, {}).get(warehouse_id)
+        return self._points.get(product_name) if point is None else point
+
+    def _update(self, warehouse_id, product_name, quantity):
+        key = (warehouse_id, product_name)
+        point = self._point(warehouse_id, product_name)
+        was_low = self._reindex(key, quantity, point)
+        alert = None
+        if quantity is not None and point is not None and quantity < point:
+            alert = Alert("low_stock", *key, quantity, point)
+        _edge(self.alerts, was_low, alert, ("low_stock", *key))
+
+    def _reindex(self, key, quantity, point):
+        """Move ``key`` to its new place in ``_by_ratio``; returns
+        whether it was below its reorder point."""
+        old = self._keys.pop(key, None)
+        if old is not None:
+            self._by_ratio.remove(old)
+        if quantity is not None and point is not None:
+            self._keys[key] = (quantity / point, *key, quantity)
+            self._by_ratio.add(self._keys[key])
+        return old is not None and old[0] < 1
+
+
+class FillIndex(WarehouseObserver):
+    """Fill-ratio rules per warehouse: an alert when the total stock
+    reaches ``ratio`` of the warehouse capacity."""
+
+    def __init__(self, alerts):
+        self._lock = threading.Lock()
+        self._alerts = alerts
+        self._totals = {}  # {warehouse_id: total quantity}
+        self._capacities = {}  # {warehouse_id: capacity}
+        self._rules = {}  # {warehouse_id: ratio}
+        self._over = set()  # warehouses at or above their ratio
+
+    def set_ratio(self, warehouse_id, ratio):
+        with self._lock:
+            _set_or_pop(self._rules, warehouse_id, ratio)
+            self._check(warehouse_id)
+
+    def rules(self):
+        """(warehouse_id, ratio) of every fill-ratio rule."""
+        with self._lock:
+            return list(self._rules.items())
+
+    def warehouse_created(self, warehouse_id, name):
+        with self._lock:
+            self._totals[warehouse_id] = 0
+
+    def warehouse_deleted(self, warehouse_id, name):
+        with self._lock:
+            for mapping in (self._totals, self._capacities, self._rules):
+                mapping.pop(warehouse_id, None)
+            self._check(warehouse_id)
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        with self._lock:
+            self._totals[warehouse_id] += (new or 0) - (old or 0)
+            if warehouse_id in self._rules:
+                self._check(warehouse_id)
+
+    def capacity_changed(self, warehouse_id, product_name, capacity):
+        if product_name is not None:
+            return
+        with self._lock:
+            _set_or_pop(self._capacities, warehouse_id, capacity)
+            self._check(warehouse_id)
+
+    def _check(self, warehouse_id):
+        alert = self._fill_alert(warehouse_id)
+        was_over = warehouse_id in self._over
+        (self._over.add if alert else self._over.discard)(warehouse_id)
+        _edge(self._alerts, was_over, alert, ("fill", warehouse_id))
+
+    def _fill_alert(self, warehouse_id):
+        ratio = self._rules.get(warehouse_id)
+        capacity = self._capacities.get(warehouse_id)
+        if ratio is None or not capacity:
+            return None
+        fill = self._totals[warehouse_id] / capacity
+        if fill < ratio:
+            return None
+        return Alert("fill", warehouse_id, None, fill, ratio)
+
+
+class StockAlerts(WarehouseObserver):
+    """The alerts index of a manager: its reorder points and fill-ratio
+    rules, whose alerts share one ``Debouncer``.
+
+    Rules are changed through ``mutate(operation, warehouse_id, *args)``,
+    the manager's way to apply and log a change, which in turn calls
+    ``low.set_point`` or ``fill.set_ratio``.
+    """
+
+    def __init__(self, products, mutate):
+        self.debouncer = Debouncer()
+        self.low = LowStockIndex(products, self.debouncer)
+        self.fill = FillIndex(self.debouncer)
+        self._mutate = mutate
+
+    def warehouse_created(self, warehouse_id, name):
+        self.fill.warehouse_created(warehouse_id, name)
+
+    def warehouse_deleted(self, warehouse_id, name):
+        self.low.warehouse_deleted(warehouse_id, name)
+        self.fill.warehouse_deleted(warehouse_id, name)
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        self.low.product_changed(warehouse_id, product_name, old, new)
+        self.fill.product_changed(warehouse_id, product_name, old, new)
+
+    def capacity_changed(self, warehouse_id, product_name, capacity):
+        self.fill.capacity_changed(warehouse_id, product_name, capacity)
+
+    def set_reorder_point(self, product_name, level, warehouse_id=None):
+        """Alert when a product falls below ``level``, in every warehouse
+        or, overriding that, in one. A level of None removes the rule.
+
+        Returns False if the level is not positive or the warehouse does
+        not exist.
+        """
+        if level is not None and not level > 0:
+            return False
+        return self._mutate(
+            "set_reorder_point", warehouse_id, product_name, level
+        )
+
+    def set_fill_alert(self, warehouse_id, ratio):
+        """Alert when a warehouse is filled to ``ratio`` of its capacity;
+        None removes the rule. Returns True if successful."""
+        if ratio is not None and not ratio > 0:
+            return False
+        return self._mutate("set_fill_alert", warehouse_id, ratio)
+
+    def low_stock(self, limit=10):
+        """Up to ``limit`` (warehouse_id, product_name, quantity, level)
+        below their reorder points, the lowest relative to theirs first."""
+        return self.low.below(limit)
+
+    def rules(self):
+        """Every rule, as the [operation, warehouse_id, *args] to pass to
+        ``mutate`` to set it again; the last argument is the level or
+        ratio, which None would remove."""
+        return [
+            ["set_reorder_point", wid, name, point]
+            for name, point, wid in self.low.rules()
+        ] + [["set_fill_alert", wid, ratio] for wid, ratio in self.fill.rules()]
+
+    def add_listener(self, listener):
+        """Call ``listener(alerts)`` with batches of ``Alert``s, from a
+        timer thread, at most once a ``debouncer.interval``."""
+        self.debouncer.add_listener(listener)
+
+
+class FillWatch:
+    """The ``valvoja`` of a ``ValvottuVarasto``: alerts when the bin
+    reaches ``ratio`` of its ``tilavuus``."""
+
+    def __init__(self, name, ratio, alerts):
+        self.name = name
+        self.ratio = ratio
+        self.over = False
+        self._alerts = alerts
+
+    def saldo_muuttui(self, varasto):
+        alert = None
+        if varasto.tilavuus:
+            fill = varasto.saldo / varasto.tilavuus
+            if fill >= self.ratio:
+                alert = Alert("fill", self.name, None, fill, self.ratio)
+        _edge(self._alerts, self.over, alert, ("fill", self.name))
+        self.over = alert is not None
+
+    def reset(self):
+        """Forget the last state, so that a full bin alerts again."""
+        self.over = False
+
+
+def _edge(alerts, was_matching, alert, key):
+    """Raise ``alert`` if its rule started to match, or clear ``key`` if
+    the rule stopped matching; ``alert`` is None when it does not."""
+    if alert is not None and not was_matching:
+        alerts.raised(alert)
+    elif alert is None and was_matching:
+        alerts.cleared(*key)
+
+
+def _set_or_pop(mapping, key, value):
+    if value is None:
+        mapping.pop(key, None)
+    else:
+        mapping[key] = value
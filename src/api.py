@@ -0,0 +1,421 @@
+"""Versioned JSON API for Ohtuvarasto, mounted under /api/v1.
+
+Unlike the HTML views, these routes answer with JSON and plain status
+codes: no templates, redirects or flashed messages.
+"""
+
+import time
+from flask import Blueprint, current_app, jsonify, request
+from cache import cached_response
+from indexes import WarehouseQuery
+import payloads
+from payloads import error, not_found
+from quantities import parse_lines
+from startup import lazy_import
+
+# Only import and export use it.
+inventory = lazy_import("inventory")
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+def init_app(app, manager):
+    """Register the API on ``app``, serving data from ``manager``."""
+    app.extensions["ohtuvarasto"] = manager
+    app.register_blueprint(api)
+
+
+def _manager():
+    return current_app.extensions["ohtuvarasto"]
+
+
+def _index(name):
+    return _manager().index(name)
+
+
+def _json_field(name):
+    return payloads.field(request.get_json(silent=True), name)
+
+
+def _quantity(field="quantity", product=None):
+    return payloads.quantity(
+        request.get_json(silent=True), _manager().quantities, field, product
+    )
+
+
+def _number(quantity):
+    return _manager().quantities.number(quantity)
+
+
+def _optional_number(quantity):
+    return None if quantity is None else _number(quantity)
+
+
+def _name():
+    return payloads.name(request.get_json(silent=True))
+
+
+def _cached_json(key, build):
+    """A JSON response for ``build()``, served from the response cache."""
+    return cached_response(
+        ("api",) + key,
+        lambda: current_app.json.dumps(build()),
+        mimetype="application/json",
+    )
+
+
+def finite(number):
+    """JSON has no infinity, so unlimited space is reported as null."""
+    return None if number == float("inf") else number
+
+
+def warehouse_json(warehouse_id, warehouse):
+    return {
+        "id": warehouse_id,
+        "name": warehouse["name"],
+        "product_count": len(warehouse["products"]),
+    }
+
+
+def page_json(page, query):
+    """The JSON body of one page of the warehouse listing."""
+    return {
+        "warehouses": [warehouse_json(wid, data) for wid, data in page.items],
+        "total": page.total,
+        "page": query.page_number,
+        "per_page": query.limit,
+    }
+
+
+def _stored(warehouse_id, product_name):
+    """The quantity of a product as stored, after clamping to the
+    capacities, or None."""
+    products = _manager().get_products(warehouse_id) or {}
+    return _optional_number(products.get(product_name))
+
+
+def _products_json(warehouse_id):
+    """The JSON encoder needs a dict, not the read-only products view."""
+    products = _manager().get_products(warehouse_id) or {}
+    return {name: _number(quantity) for name, quantity in products.items()}
+
+
+@api.get("/warehouses")
+def list_warehouses():
+    query = WarehouseQuery.from_args(request.args)
+
+    def build():
+        return page_json(_index("listing").page(query), query)
+
+    version = _index("versions").version()
+    return _cached_json(("warehouses", version, query), build)
+
+
+@api.post("/warehouses")
+def create_warehouse():
+    name = _name()
+    if name is None:
+        return error("Warehouse name cannot be empty.", 400)
+    warehouse_id = _manager().create_warehouse(name)
+    return jsonify(id=warehouse_id, name=name), 201
+
+
+@api.get("/warehouses/<int:warehouse_id>")
+def get_warehouse(warehouse_id):
+    warehouse = _manager().get_warehouse(warehouse_id)
+    if warehouse is None:
+        return not_found()
+
+    def build():
+        body = warehouse_json(warehouse_id, warehouse)
+        body["products"] = _products_json(warehouse_id)
+        return body
+
+    version = _index("versions").version(warehouse_id)
+    return _cached_json(("warehouse", warehouse_id, version), build)
+
+
+@api.route("/warehouses/<int:warehouse_id>", methods=["PUT", "PATCH"])
+def rename_warehouse(warehouse_id):
+    name = _name()
+    if name is None:
+        return error("Warehouse name cannot be empty.", 400)
+    if not _manager().update_warehouse_name(warehouse_id, name):
+        return not_found()
+    return jsonify(id=warehouse_id, name=name)
+
+
+@api.delete("/warehouses/<int:warehouse_id>")
+def delete_warehouse(warehouse_id):
+    if not _manager().delete_warehouse(warehouse_id):
+        return not_found()
+    return "", 204
+
+
+@api.get("/warehouses/<int:warehouse_id>/products")
+def get_products(warehouse_id):
+    if _manager().get_warehouse(warehouse_id) is None:
+        return not_found()
+    version = _index("versions").version(warehouse_id)
+    return _cached_json(
+        ("products", warehouse_id, version),
+        lambda: {"products": _products_json(warehouse_id)},
+    )
+
+
+@api.post("/warehouses/<int:warehouse_id>/products")
+def add_product(warehouse_id):
+    name = _name()
+    quantity = _quantity(product=name)
+    if name is None or quantity is None:
+        return error("Invalid product name or quantity.", 400)
+    if not _manager().add_product(warehouse_id, name, quantity):
+        return not_found()
+    return jsonify(name=name, quantity=_stored(warehouse_id, name))
+
+
+@api.put("/warehouses/<int:warehouse_id>/capacity")
+def set_capacity(warehouse_id):
+    """Set {"capacity": n} or {"capacity": n, "product": name}; null
+    removes the limit."""
+    capacity, product = _json_field("capacity"), _json_field("product")
+    if capacity is not None:
+        capacity = _quantity("capacity", product)
+        if capacity is None:
+            return error("Invalid capacity.", 400)
+    if product is not None and not isinstance(product, str):
+        return error("Invalid product name.", 400)
+    if not _manager().set_capacity(warehouse_id, capacity, product):
+        return not_found()
+    return jsonify(
+        capacity=_number(capacity), product=product,
+        free_space=finite(_number(
+            _index("capacity").free_space(warehouse_id)
+        )),
+    )
+
+
+@api.delete("/warehouses/<int:warehouse_id>/products")
+def clear_warehouse(warehouse_id):
+    if not _manager().clear_warehouse(warehouse_id):
+        return not_found()
+    return "", 204
+
+
+@api.put("/warehouses/<int:warehouse_id>/products/<product_name>")
+def update_product(warehouse_id, product_name):
+    quantity = _quantity(product=product_name)
+    if quantity is None:
+        return error("Invalid quantity.", 400)
+    updated = _manager().update_product_quantity(
+        warehouse_id, product_name, quantity
+    )
+    if not updated:
+        return error("Warehouse or product not found.", 404)
+    return jsonify(
+        name=product_name, quantity=_stored(warehouse_id, product_name)
+    )
+
+
+@api.delete("/warehouses/<int:warehouse_id>/products/<product_name>")
+def remove_product(warehouse_id, product_name):
+    if not _manager().remove_product(warehouse_id, product_name):
+        return error("Warehouse or product not found.", 404)
+    return "", 204
+
+
+@api.get("/warehouses/<int:warehouse_id>/products/<product_name>/history")
+def product_history(warehouse_id, product_name):
+    """The quantity ?at= a Unix time, or the samples from ?start= to
+    ?end= (by default the last hour)."""
+    if _manager().get_warehouse(warehouse_id) is None:
+        return not_found()
+    at = request.args.get("at", type=float)
+    if at is not None:
+        quantity = _index("history").at(warehouse_id, product_name, at)
+        return jsonify(at=at, quantity=_optional_number(quantity))
+    end = request.args.get("end", time.time(), type=float)
+    start = request.args.get("start", end - 3600, type=float)
+    samples = _index("history").samples(
+        warehouse_id, product_name, start, end
+    )
+    number = _manager().quantities.number
+    return jsonify(samples=[sample_json(sample, number) for sample in samples])
+
+
+def sample_json(sample, number):
+    """A ``history.Sample`` with its quantities converted by ``number``."""
+    return dict(sample._asdict(), low=number(sample.low),
+                high=number(sample.high), close=number(sample.close))
+
+
+@api.get("/products")
+def search_products():
+    """Products whose name contains ?q=, at most ?limit= of them."""
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    names = _index("search").search(request.args.get("q", ""), limit)
+    products = _index("products")
+    return jsonify(products=[
+        {"name": name, "total": _number(products.total(name))}
+        for name in names
+    ])
+
+
+@api.get("/products/<product_name>")
+def get_product(product_name):
+    products = _index("products")
+    return jsonify(
+        name=product_name,
+        total=_number(products.total(product_name)),
+        warehouses=[
+            {"id": wid, "quantity": _number(quantity)}
+            for wid, quantity in products.holdings(product_name).items()
+        ],
+    )
+
+
+@api.get("/products/<product_name>/room")
+def find_room(product_name):
+    """Warehouses with room for ?quantity= more units of a product."""
+    quantity = _manager().quantities.parse(
+        request.args.get("quantity", "0"), product_name
+    ) or 0
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    rooms = _index("capacity").with_room(product_name, quantity, limit)
+    return jsonify(warehouses=[
+        {"id": wid, "room": finite(_number(room))} for wid, room in rooms
+    ])
+
+
+@api.put("/products/<product_name>/reorder-point")
+def set_reorder_point(product_name):
+    """Set {"level": n} for every warehouse, or {"level": n,
+    "warehouse_id": id} for one; a null level removes the rule."""
+    level, warehouse_id = _json_field("level"), _json_field("warehouse_id")
+    if isinstance(warehouse_id, bool) or not isinstance(
+        warehouse_id, (int, type(None))
+    ):
+        return error("Invalid warehouse ID.", 400)
+    if level is not None:
+        level = _quantity("level", product_name)
+        if not level:
+            return error("Invalid level.", 400)
+    alerts = _index("alerts")
+    if not alerts.set_reorder_point(product_name, level, warehouse_id):
+        return not_found()
+    return jsonify(product=product_name, level=_optional_number(level),
+                   warehouse_id=warehouse_id)
+
+
+@api.put("/warehouses/<int:warehouse_id>/fill-alert")
+def set_fill_alert(warehouse_id):
+    """Set {"ratio": r}, 0 < r, of the capacity; null removes it."""
+    ratio = _json_field("ratio")
+    if ratio is not None and (
+        isinstance(ratio, bool) or not isinstance(ratio, (int, float))
+        or not ratio > 0
+    ):
+        return error("Invalid ratio.", 400)
+    if not _index("alerts").set_fill_alert(warehouse_id, ratio):
+        return not_found()
+    return jsonify(ratio=ratio)
+
+
+@api.get("/low-stock")
+def low_stock():
+    """The products furthest below their reorder points, at most ?limit=."""
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    return jsonify(items=[
+        {"warehouse_id": wid, "product": name,
+         "quantity": _number(quantity), "level": _number(level)}
+        for wid, name, quantity, level in _index("alerts").low_stock(limit)
+    ])
+
+
+@api.post("/transfers")
+def transfer_order():
+    """Move stock by a {"lines": [...]} transfer order, all or nothing."""
+    lines = _json_field("lines")
+    if not isinstance(lines, list):
+        return error("Expected an object with a lines list.", 400)
+    moved, errors = _manager().transfer_order(
+        parse_lines(_manager().quantities, lines)
+    )
+    if moved is None:
+        return jsonify(errors=errors), 422
+    return jsonify(moved=[_number(quantity) for quantity in moved])
+
+
+def _format():
+    fmt = request.args.get("format", "csv")
+    return fmt if fmt in inventory.FORMATS else None
+
+
+def _export(warehouse_ids, filename):
+    """Stream the inventory of some warehouses as a chunked download."""
+    fmt = _format()
+    if fmt is None:
+        return error("Unknown format.", 400)
+    rows = inventory.export_rows(_manager(), warehouse_ids)
+    return current_app.response_class(
+        inventory.WRITERS[fmt](rows),
+        mimetype=inventory.MIMETYPES[fmt],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}.{fmt}"
+        },
+    )
+
+
+def _import_report(rejected, **counts):
+    return jsonify(
+        rejected=rejected.count, errors=rejected.report(), **counts
+    )
+
+
+@api.get("/export")
+def export_inventory():
+    """Download every warehouse as ?format=csv or jsonl."""
+    return _export(None, "inventory")
+
+
+@api.post("/import")
+def restore_inventory():
+    """Create the warehouses and products of a full export sent as the
+    request body."""
+    fmt = _format()
+    if fmt is None:
+        return error("Unknown format.", 400)
+    rejected = inventory.Rejected()
+    rows = inventory.READERS[fmt](
+        inventory.text_lines(request.stream, rejected)
+    )
+    created = inventory.restore(_manager(), rows, rejected)
+    return _import_report(rejected, created=created)
+
+
+@api.get("/warehouses/<int:warehouse_id>/export")
+def export_warehouse(warehouse_id):
+    if _manager().get_warehouse(warehouse_id) is None:
+        return not_found()
+    return _export([warehouse_id], f"warehouse-{warehouse_id}")
+
+
+@api.post("/warehouses/<int:warehouse_id>/import")
+def import_warehouse(warehouse_id):
+    """Add the products of a CSV or JSON Lines request body; only the
+    product and quantity columns are used."""
+    fmt = _format()
+    if fmt is None:
+        return error("Unknown format.", 400)
+    if _manager().get_warehouse(warehouse_id) is None:
+        return not_found()
+    rejected = inventory.Rejected()
+    rows = inventory.READERS[fmt](
+        inventory.text_lines(request.stream, rejected)
+    )
+    imported = inventory.import_products(
+        _manager(), warehouse_id, rows, rejected
+    )
+    if imported is None:
+        return not_found()
+    return _import_report(rejected, imported=imported)
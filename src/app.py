@@ -1,14 +1,57 @@
 """Flask web application for warehouse management."""
 
+import json
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
+from itertools import islice
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, flash,
+    jsonify, session, stream_template
+)
+import api
+import metrics
+import startup
+from cache import cached_response
+from indexes import WarehouseQuery
 from ohtuvarasto import Ohtuvarasto
+from quantities import parse_lines, quantities_from_env
+from storage import storage_from_env
+
+# Only the import form uses it.
+inventory = startup.lazy_import("inventory")
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", os.urandom(24))
+app.config.setdefault("EVENTS_KEEPALIVE", 15)
+
+# Products per page of the warehouse view; ?per_page=all streams them all.
+PRODUCTS_PER_PAGE = 100
+# Quotes product names in URLs built without url_for, as url_for would.
+_default_converter = app.url_map.converters["default"](app.url_map)
+
+# Global warehouse manager instance, persisted when OHTUVARASTO_DATA_DIR is set
+warehouse_manager = Ohtuvarasto(storage_from_env(), quantities_from_env())
+api.init_app(app, warehouse_manager)
+metrics.init_app(app, warehouse_manager)
+
+
+@app.template_filter("quantity")
+def _text(quantity):
+    """A stored quantity as text, e.g. ``{{ quantity|quantity }}``."""
+    return warehouse_manager.quantities.text(quantity)
+
+
+def _log_alerts(alerts):
+    """Log the alerts of the manager; quantities as in the templates."""
+    for kind, warehouse_id, product, value, threshold in alerts:
+        if kind == "low_stock":
+            value, threshold = _text(value), _text(threshold)
+        app.logger.warning(
+            "%s alert: warehouse %s, product %s at %s (threshold %s)",
+            kind, warehouse_id, product, value, threshold,
+        )
 
-# Global warehouse manager instance
-warehouse_manager = Ohtuvarasto()
+
+warehouse_manager.index("alerts").add_listener(_log_alerts)
 
 
 def get_warehouse_or_redirect(warehouse_id):
@@ -22,9 +65,17 @@ def get_warehouse_or_redirect(warehouse_id):
 
 @app.route("/")
 def index():
-    """Display list of all warehouses."""
-    warehouses = warehouse_manager.get_all_warehouses()
-    return render_template("index.html", warehouses=warehouses)
+    """Display one sorted and filtered page of warehouses."""
+    query = WarehouseQuery.from_args(request.args)
+
+    def render():
+        page = warehouse_manager.index("listing").page(query)
+        return render_template(
+            "index.html", warehouses=page.items, page=page, query=query
+        )
+
+    key = ("index", warehouse_manager.index("versions").version(), query)
+    return cached_response(key, render)
 
 
 @app.route("/warehouse/new", methods=["GET", "POST"])
@@ -42,16 +93,99 @@ def create_warehouse():
 
 @app.route("/warehouse/<int:warehouse_id>")
 def view_warehouse(warehouse_id):
-    """View a specific warehouse and its products."""
+    """View a warehouse and one ?page= of its products; ?per_page=all
+    streams every product instead."""
     warehouse, redirect_response = get_warehouse_or_redirect(warehouse_id)
     if redirect_response:
         return redirect_response
+    if request.args.get("per_page") == "all":
+        return _stream_warehouse(warehouse_id, warehouse)
+    page = max(request.args.get("page", 1, type=int), 1)
+
+    def render():
+        return render_template(
+            "view_warehouse.html",
+            **_warehouse_context(warehouse_id, warehouse, page),
+        )
+
+    version = warehouse_manager.index("versions").version(warehouse_id)
+    key = ("warehouse", warehouse_id, version, page)
+    return cached_response(key, render)
+
+
+def _warehouse_context(warehouse_id, warehouse, page=None):
+    """Template variables for one page of products, or all of them when
+    ``page`` is None."""
     products = warehouse_manager.get_products(warehouse_id)
+    rows = products.items()
+    if page is not None:
+        start = (page - 1) * PRODUCTS_PER_PAGE
+        rows = list(islice(rows, start, start + PRODUCTS_PER_PAGE))
+    return {
+        "warehouse_id": warehouse_id, "warehouse": warehouse,
+        "products": rows, "product_count": len(products), "page": page,
+        "page_count": max(1, -(-len(products) // PRODUCTS_PER_PAGE)),
+        "free_space": warehouse_manager.index("capacity").free_space(
+            warehouse_id
+        ),
+        "update_url": _product_url("update_product", warehouse_id),
+        "remove_url": _product_url("remove_product", warehouse_id),
+    }
+
+
+def _product_url(endpoint, warehouse_id):
+    """(prefix, suffix) of a product route's URL around the product name,
+    built once per page instead of once per row with ``url_for``."""
+    url = url_for(endpoint, warehouse_id=warehouse_id, product_name="PRODUCT")
+    prefix, _, suffix = url.rpartition("PRODUCT")
+    return prefix, suffix
+
+
+@app.template_filter("path_segment")
+def _path_segment(name):
+    """Quote a name for a URL path as ``url_for`` does."""
+    return _default_converter.to_url(name)
+
+
+def _stream_warehouse(warehouse_id, warehouse):
+    """Render every product while sending, so that neither the time to
+    the first byte nor memory grows with the number of products."""
+    context = _warehouse_context(warehouse_id, warehouse)
+    if "_flashes" in session:
+        # The session is saved before a stream starts, so it could not
+        # record that the messages were shown.
+        return render_template("view_warehouse.html", **context)
+    return Response(
+        _chunks(stream_template("view_warehouse.html", **context)),
+        mimetype="text/html",
+    )
+
+
+def _chunks(parts, size=16384):
+    """Join the small pieces of a template stream into larger chunks."""
+    buffer, length = [], 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    yield "".join(buffer)
+
+
+@app.route("/product/<product_name>")
+def view_product(product_name):
+    """Show which warehouses hold a product and the total quantity."""
+    products = warehouse_manager.index("products")
+    holdings = [
+        (wid, warehouse_manager.get_warehouse(wid), quantity)
+        for wid, quantity in products.holdings(product_name).items()
+    ]
     return render_template(
-        "view_warehouse.html",
-        warehouse_id=warehouse_id,
-        warehouse=warehouse,
-        products=products,
+        "view_product.html",
+        product_name=product_name,
+        holdings=[row for row in holdings if row[1] is not None],
+        total=products.total(product_name),
     )
 
 
@@ -91,14 +225,13 @@ def delete_warehouse(warehouse_id):
 def add_product(warehouse_id):
     """Add a product to a warehouse."""
     name = request.form.get("product_name", "").strip()
-    try:
-        quantity = float(request.form.get("quantity", 0))
-    except ValueError:
-        quantity = 0
+    quantity = warehouse_manager.quantities.parse(
+        request.form.get("quantity", "0"), name
+    )
 
-    if name and quantity >= 0:
+    if name and quantity is not None:
         if warehouse_manager.add_product(warehouse_id, name, quantity):
-            flash(f"Product '{name}' added with quantity {quantity}.", "success")
+            flash(f"Product '{name}' added with quantity {_text(quantity)}.", "success")
         else:
             flash("Failed to add product.", "error")
     else:
@@ -120,16 +253,19 @@ def remove_product(warehouse_id, product_name):
 @app.route("/warehouse/<int:warehouse_id>/product/<product_name>/update", methods=["POST"])
 def update_product(warehouse_id, product_name):
     """Update product quantity."""
-    try:
-        new_quantity = float(request.form.get("quantity", 0))
-    except ValueError:
-        new_quantity = -1
+    new_quantity = warehouse_manager.quantities.parse(
+        request.form.get("quantity", "0"), product_name
+    )
 
-    if new_quantity >= 0:
+    if new_quantity is not None:
         if warehouse_manager.update_product_quantity(
             warehouse_id, product_name, new_quantity
         ):
-            flash(f"Product '{product_name}' quantity updated to {new_quantity}.", "success")
+            # The capacities may have clamped the quantity.
+            stored = (warehouse_manager.get_products(warehouse_id) or {}).get(
+                product_name, new_quantity
+            )
+            flash(f"Product '{product_name}' quantity updated to {_text(stored)}.", "success")
         else:
             flash("Failed to update product quantity.", "error")
     else:
@@ -138,6 +274,25 @@ def update_product(warehouse_id, product_name):
     return redirect(url_for("view_warehouse", warehouse_id=warehouse_id))
 
 
+@app.route("/warehouse/<int:warehouse_id>/transfer", methods=["POST"])
+def transfer_product(warehouse_id):
+    """Move stock of a product to another warehouse."""
+    name = request.form.get("product_name", "").strip()
+    target_id = request.form.get("target_id", 0, type=int)
+    quantity = warehouse_manager.quantities.parse(
+        request.form.get("quantity", ""), name
+    )
+    moved = None if quantity is None else warehouse_manager.transfer(
+        warehouse_id, target_id, name, quantity
+    )
+    if moved is None:
+        flash("Invalid transfer.", "error")
+    else:
+        flash(f"Moved {_text(moved)} of '{name}' to warehouse {target_id}.",
+              "success")
+    return redirect(url_for("view_warehouse", warehouse_id=warehouse_id))
+
+
 @app.route("/warehouse/<int:warehouse_id>/clear", methods=["POST"])
 def clear_warehouse(warehouse_id):
     """Clear all products from a warehouse."""
@@ -148,5 +303,93 @@ def clear_warehouse(warehouse_id):
     return redirect(url_for("view_warehouse", warehouse_id=warehouse_id))
 
 
+@app.route("/warehouse/<int:warehouse_id>/import", methods=["POST"])
+def import_products(warehouse_id):
+    """Add the products of an uploaded CSV or JSON Lines file."""
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        flash("Choose a file to import.", "error")
+        return redirect(url_for("view_warehouse", warehouse_id=warehouse_id))
+    read = inventory.READERS[inventory.format_of(upload.filename)]
+    rejected = inventory.Rejected()
+    imported = inventory.import_products(
+        warehouse_manager, warehouse_id,
+        read(inventory.text_lines(upload.stream, rejected)), rejected,
+    )
+    _flash_import(imported, rejected)
+    return redirect(url_for("view_warehouse", warehouse_id=warehouse_id))
+
+
+def _flash_import(imported, rejected):
+    if imported is None:
+        flash("Failed to import products.", "error")
+    else:
+        flash(f"Imported {imported} products.", "success")
+    if rejected.count:
+        flash(f"Skipped {rejected.count} invalid rows.", "warning")
+
+
+@app.route("/batch", methods=["POST"])
+def apply_batch():
+    """Apply a JSON list of product operations atomically."""
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        operations = payload.get("operations")
+    else:
+        operations = None
+    if not isinstance(operations, list):
+        return jsonify(error="Expected an object with an operations list."), 400
+    applied, errors = warehouse_manager.apply_batch(
+        parse_lines(warehouse_manager.quantities, operations)
+    )
+    results = [
+        {"ok": True} if error is None else {"ok": False, "error": error}
+        for error in errors
+    ]
+    return jsonify(applied=applied, results=results), 200 if applied else 422
+
+
+@app.route("/events")
+def events():
+    """Stream change events as Server-Sent Events.
+
+    The stream starts after the sequence number in ``?since=`` or in the
+    Last-Event-ID header of a reconnecting client, else at the latest
+    change. A ``reset`` event means that some changes were missed: the
+    client should reload what it shows and continue from its ``seq``.
+    """
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    if since is None:
+        since = warehouse_manager.index("feed").latest
+    keepalive = app.config["EVENTS_KEEPALIVE"]
+    return Response(
+        _event_stream(since, keepalive), mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _event_stream(since, keepalive):
+    while True:
+        # Asking for the index each time catches up with other processes.
+        feed = warehouse_manager.index("feed")
+        changes = feed.since(since, timeout=keepalive)
+        if changes is None:
+            since = feed.latest
+            yield _sse("reset", since, {"seq": since})
+        elif not changes:
+            yield ": keepalive\n\n"
+        for change in changes or ():
+            since = change["seq"]
+            yield _sse(change["type"], since, change)
+
+
+def _sse(event, seq, data):
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+startup.init_app(app)
+
 if __name__ == "__main__":
     app.run(debug=os.environ.get("FLASK_DEBUG", "false").lower() == "true")
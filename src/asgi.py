@@ -0,0 +1,363 @@
+"""Asyncio (ASGI) front end serving the JSON API of ``api``.
+
+Run it with any ASGI server, for example ``uvicorn asgi:app`` from
+``src``. The warehouse, product and capacity routes take the same
+requests and give the same responses as the Flask blueprint under
+/api/v1; streaming import and export are only served by Flask.
+
+No handler touches the manager on the event loop, as any call may
+wait: for a warehouse or index lock, or, with a shared SQLite store,
+for replaying the records of other processes. Reads are answered by a
+small pool of reader threads; their handlers are the plain functions
+among the routes. Mutations may also wait for an fsync, so they are
+handed to a single writer thread, which serializes the writes of this
+process.
+"""
+
+import asyncio
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import NamedTuple
+from urllib.parse import parse_qsl
+from werkzeug.datastructures import MultiDict
+from api import finite, page_json, sample_json, warehouse_json
+from indexes import WarehouseQuery
+from ohtuvarasto import Ohtuvarasto
+import payloads
+from payloads import error, not_found
+from quantities import quantities_from_env
+from storage import storage_from_env
+
+PREFIX = "/api/v1"
+
+
+class Request(NamedTuple):
+    method: str
+    args: MultiDict  # query string arguments
+    payload: object  # decoded JSON body, or None
+
+
+class WarehouseApp:
+    """An ASGI application serving one Ohtuvarasto."""
+
+    MAX_BODY = 1 << 20
+    READERS = 4
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.quantities = manager.quantities
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ohtuvarasto-writer"
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=self.READERS, thread_name_prefix="ohtuvarasto-reader"
+        )
+        warehouse = r"/warehouses/(?P<warehouse_id>\d+)"
+        self._routes = [
+            (re.compile(pattern + "$"), handlers) for pattern, handlers in (
+                (r"/warehouses", {
+                    "GET": self._list_warehouses,
+                    "POST": self._create_warehouse,
+                }),
+                (warehouse, {
+                    "GET": self._get_warehouse,
+                    "PUT": self._rename_warehouse,
+                    "PATCH": self._rename_warehouse,
+                    "DELETE": self._delete_warehouse,
+                }),
+                (warehouse + "/products", {
+                    "GET": self._get_products,
+                    "POST": self._add_product,
+                    "DELETE": self._clear_warehouse,
+                }),
+                (warehouse + "/products/(?P<product_name>[^/]+)", {
+                    "PUT": self._update_product,
+                    "DELETE": self._remove_product,
+                }),
+                (warehouse + "/products/(?P<product_name>[^/]+)/history", {
+                    "GET": self._product_history,
+                }),
+                (warehouse + "/capacity", {"PUT": self._set_capacity}),
+                (r"/products", {"GET": self._search_products}),
+                (r"/products/(?P<product_name>[^/]+)", {
+                    "GET": self._get_product,
+                }),
+                (r"/products/(?P<product_name>[^/]+)/room", {
+                    "GET": self._find_room,
+                }),
+            )
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            body, status = await self._respond(scope, receive)
+            await _send_json(send, status, body)
+
+    def close(self):
+        """Finish the pending requests and flush the manager's log."""
+        self._readers.shutdown()
+        self._writer.shutdown()
+        self.manager.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.close
+                )
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _respond(self, scope, receive):
+        handler, params = self._route(scope["method"], scope["path"])
+        if not callable(handler):
+            return handler
+        body = await _read_body(receive, self.MAX_BODY)
+        if body is None:
+            return error("Request body too large.", 413)
+        request = Request(
+            scope["method"],
+            MultiDict(parse_qsl(scope.get("query_string", b"").decode())),
+            _decode(body),
+        )
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(request, **params)
+        return await self._read(handler, request, **params)
+
+    def _route(self, method, path):
+        """The handler and path parameters of a request, or the
+        (body, status) of an error response."""
+        if not path.startswith(PREFIX):
+            return error("Not found.", 404), None
+        for pattern, handlers in self._routes:
+            match = pattern.match(path[len(PREFIX):])
+            if match is None:
+                continue
+            if method not in handlers:
+                return error("Method not allowed.", 405), None
+            params = match.groupdict()
+            if "warehouse_id" in params:
+                params["warehouse_id"] = int(params["warehouse_id"])
+            return handlers[method], params
+        return error("Not found.", 404), None
+
+    async def _mutate(self, method, *args):
+        """Run a manager method on the writer thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._writer, partial(getattr(self.manager, method), *args)
+        )
+
+    async def _read(self, function, *args, **kwargs):
+        """Run ``function`` on a reader thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._readers, partial(function, *args, **kwargs)
+        )
+
+    def _list_warehouses(self, request):
+        query = WarehouseQuery.from_args(request.args)
+        page = self.manager.index("listing").page(query)
+        return page_json(page, query), 200
+
+    async def _create_warehouse(self, request):
+        name = payloads.name(request.payload)
+        if name is None:
+            return error("Warehouse name cannot be empty.", 400)
+        warehouse_id = await self._mutate("create_warehouse", name)
+        return {"id": warehouse_id, "name": name}, 201
+
+    def _get_warehouse(self, _request, warehouse_id):
+        warehouse = self.manager.get_warehouse(warehouse_id)
+        products = self.manager.get_products(warehouse_id)
+        if warehouse is None or products is None:
+            return not_found()
+        body = warehouse_json(warehouse_id, warehouse)
+        body["products"] = self._products_json(products)
+        return body, 200
+
+    async def _rename_warehouse(self, request, warehouse_id):
+        name = payloads.name(request.payload)
+        if name is None:
+            return error("Warehouse name cannot be empty.", 400)
+        if not await self._mutate("update_warehouse_name", warehouse_id, name):
+            return not_found()
+        return {"id": warehouse_id, "name": name}, 200
+
+    async def _delete_warehouse(self, _request, warehouse_id):
+        if not await self._mutate("delete_warehouse", warehouse_id):
+            return not_found()
+        return None, 204
+
+    def _get_products(self, _request, warehouse_id):
+        products = self.manager.get_products(warehouse_id)
+        if products is None:
+            return not_found()
+        return {"products": self._products_json(products)}, 200
+
+    def _quantity(self, request, key="quantity", product=None):
+        return payloads.quantity(request.payload, self.quantities, key, product)
+
+    def _stored(self, warehouse_id, product_name):
+        """The quantity of a product as stored, after clamping to the
+        capacities, or None."""
+        products = self.manager.get_products(warehouse_id) or {}
+        quantity = products.get(product_name)
+        return None if quantity is None else self.quantities.number(quantity)
+
+    def _products_json(self, products):
+        number = self.quantities.number
+        return {name: number(quantity) for name, quantity in products.items()}
+
+    async def _add_product(self, request, warehouse_id):
+        name = payloads.name(request.payload)
+        quantity = self._quantity(request, product=name)
+        if name is None or quantity is None:
+            return error("Invalid product name or quantity.", 400)
+        if not await self._mutate("add_product", warehouse_id, name, quantity):
+            return not_found()
+        added = await self._read(self._stored, warehouse_id, name)
+        return {"name": name, "quantity": added}, 200
+
+    async def _clear_warehouse(self, _request, warehouse_id):
+        if not await self._mutate("clear_warehouse", warehouse_id):
+            return not_found()
+        return None, 204
+
+    async def _update_product(self, request, warehouse_id, product_name):
+        quantity = self._quantity(request, product=product_name)
+        if quantity is None:
+            return error("Invalid quantity.", 400)
+        updated = await self._mutate(
+            "update_product_quantity", warehouse_id, product_name, quantity
+        )
+        if not updated:
+            return error("Warehouse or product not found.", 404)
+        stored = await self._read(self._stored, warehouse_id, product_name)
+        return {"name": product_name, "quantity": stored}, 200
+
+    async def _remove_product(self, _request, warehouse_id, product_name):
+        if not await self._mutate("remove_product", warehouse_id, product_name):
+            return error("Warehouse or product not found.", 404)
+        return None, 204
+
+    def _product_history(self, request, warehouse_id, product_name):
+        if self.manager.get_warehouse(warehouse_id) is None:
+            return not_found()
+        number = self.quantities.number
+        at = request.args.get("at", type=float)
+        if at is not None:
+            quantity = self.manager.index("history").at(
+                warehouse_id, product_name, at
+            )
+            return {"at": at, "quantity": (
+                None if quantity is None else number(quantity)
+            )}, 200
+        end = request.args.get("end", time.time(), type=float)
+        start = request.args.get("start", end - 3600, type=float)
+        samples = self.manager.index("history").samples(
+            warehouse_id, product_name, start, end
+        )
+        return {"samples": [
+            sample_json(sample, number) for sample in samples
+        ]}, 200
+
+    async def _set_capacity(self, request, warehouse_id):
+        capacity = payloads.field(request.payload, "capacity")
+        product = payloads.field(request.payload, "product")
+        if capacity is not None:
+            capacity = self._quantity(request, "capacity", product)
+            if capacity is None:
+                return error("Invalid capacity.", 400)
+        if product is not None and not isinstance(product, str):
+            return error("Invalid product name.", 400)
+        if not await self._mutate(
+            "set_capacity", warehouse_id, capacity, product
+        ):
+            return not_found()
+        number = self.quantities.number
+        free_space = await self._read(
+            lambda: self.manager.index("capacity").free_space(warehouse_id)
+        )
+        return {
+            "capacity": number(capacity), "product": product,
+            "free_space": finite(number(free_space)),
+        }, 200
+
+    def _search_products(self, request):
+        limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+        query = request.args.get("q", "")
+        names = self.manager.index("search").search(query, limit)
+        products = self.manager.index("products")
+        number = self.quantities.number
+        return {"products": [
+            {"name": name, "total": number(products.total(name))}
+            for name in names
+        ]}, 200
+
+    def _get_product(self, _request, product_name):
+        products = self.manager.index("products")
+        number = self.quantities.number
+        return {
+            "name": product_name,
+            "total": number(products.total(product_name)),
+            "warehouses": [
+                {"id": wid, "quantity": number(quantity)}
+                for wid, quantity in products.holdings(product_name).items()
+            ],
+        }, 200
+
+    def _find_room(self, request, product_name):
+        quantity = self.quantities.parse(
+            request.args.get("quantity", "0"), product_name
+        ) or 0
+        limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+        rooms = self.manager.index("capacity").with_room(
+            product_name, quantity, limit
+        )
+        number = self.quantities.number
+        return {"warehouses": [
+            {"id": wid, "room": finite(number(room))} for wid, room in rooms
+        ]}, 200
+
+
+async def _read_body(receive, limit):
+    """The whole request body, or None if it is longer than ``limit``."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def _decode(body):
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def _send_json(send, status, body):
+    content = b"" if body is None else json.dumps(body).encode()
+    headers = [(b"content-length", str(len(content)).encode())]
+    if body is not None:
+        headers.append((b"content-type", b"application/json"))
+    await send({"type": "http.response.start", "status": status,
+                "headers": headers})
+    await send({"type": "http.response.body", "body": content})
+
+
+app = WarehouseApp(Ohtuvarasto(storage_from_env(), quantities_from_env()))
@@ -0,0 +1,173 @@
+"""Atomic batches of product operations for Ohtuvarasto.
+
+A batch is a list of operation dicts, for example::
+
+    {"op": "add", "warehouse_id": 1, "product": "Apple", "quantity": 5}
+    {"op": "update", "warehouse_id": 1, "product": "Apple", "quantity": 2}
+    {"op": "remove", "warehouse_id": 1, "product": "Apple"}
+    {"op": "clear", "warehouse_id": 1}
+
+``StagedBatch`` validates each operation against the current products
+plus the changes staged by the earlier operations of the same batch,
+without copying any warehouse. Nothing is written by the batch itself:
+the caller applies ``cleared`` and then ``changes()``.
+
+A transfer order is a list of lines moving stock between warehouses::
+
+    {"from": 1, "to": 2, "product": "Apple", "quantity": 5}
+
+``transfer_error`` checks one line against the existing warehouses.
+``SingleTransfers`` gives both managers their one-line ``transfer``.
+"""
+
+_MISSING = object()
+
+
+def _product_name(operation):
+    name = operation["product"]
+    if not isinstance(name, str) or not name:
+        raise KeyError("product")
+    return name
+
+
+def _valid_quantity(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) \
+        and value >= 0
+
+
+class StagedBatch:
+    """An overlay of pending product changes on top of the warehouses."""
+
+    def __init__(self, warehouses):
+        self._warehouses = warehouses
+        self._changes = {}  # {(warehouse_id, product_name): quantity}
+        self._cleared = set()
+
+    def stage(self, operation):
+        """Stage one operation. Returns an error message, or None if valid."""
+        try:
+            kind = operation["op"]
+            warehouse_id = operation["warehouse_id"]
+        except (KeyError, TypeError):
+            return "malformed operation"
+        if not isinstance(warehouse_id, int) \
+                or warehouse_id not in self._warehouses:
+            return "warehouse not found"
+        handler = getattr(self, "_stage_" + str(kind), self._unknown)
+        try:
+            return handler(warehouse_id, operation)
+        except KeyError:
+            return "malformed operation"
+
+    @property
+    def cleared(self):
+        """Warehouses whose products are cleared before the changes apply."""
+        return self._cleared
+
+    def changes(self):
+        """Yield (warehouse_id, product_name, quantity); None removes."""
+        for (warehouse_id, name), quantity in self._changes.items():
+            if quantity is _MISSING:
+                quantity = None
+            yield warehouse_id, name, quantity
+
+    def _quantity(self, warehouse_id, name):
+        key = (warehouse_id, name)
+        if key in self._changes:
+            return self._changes[key]
+        if warehouse_id in self._cleared:
+            return _MISSING
+        products = self._warehouses[warehouse_id]["products"]
+        return products.get(name, _MISSING)
+
+    @staticmethod
+    def _unknown(_warehouse_id, _operation):
+        return "unknown operation"
+
+    def _stage_add(self, warehouse_id, operation):
+        quantity = operation["quantity"]
+        if not _valid_quantity(quantity):
+            return "invalid quantity"
+        name = _product_name(operation)
+        current = self._quantity(warehouse_id, name)
+        if current is not _MISSING:
+            quantity += current
+        self._changes[(warehouse_id, name)] = quantity
+        return None
+
+    def _stage_update(self, warehouse_id, operation):
+        quantity = operation["quantity"]
+        if not _valid_quantity(quantity):
+            return "invalid quantity"
+        name = _product_name(operation)
+        if self._quantity(warehouse_id, name) is _MISSING:
+            return "product not found"
+        self._changes[(warehouse_id, name)] = quantity
+        return None
+
+    def _stage_remove(self, warehouse_id, operation):
+        name = _product_name(operation)
+        if self._quantity(warehouse_id, name) is _MISSING:
+            return "product not found"
+        self._changes[(warehouse_id, name)] = _MISSING
+        return None
+
+    def _stage_clear(self, warehouse_id, _operation):
+        self._changes = {
+            key: quantity for key, quantity in self._changes.items()
+            if key[0] != warehouse_id
+        }
+        self._cleared.add(warehouse_id)
+
+
+def transfer_line(source_id, target_id, product_name, quantity):
+    return {"from": source_id, "to": target_id, "product": product_name,
+            "quantity": quantity}
+
+
+class SingleTransfers:
+    """``transfer`` for a manager in terms of its ``transfer_order``."""
+
+    def transfer_order(self, lines):
+        """Apply a list of transfer lines atomically; returns (moved,
+        errors) as ``Ohtuvarasto.transfer_order`` does."""
+        raise NotImplementedError
+
+    def transfer(self, source_id, target_id, product_name, quantity):
+        """Move up to ``quantity`` of a product to another warehouse, as a
+        ``transfer_order`` of one line.
+
+        Returns the quantity moved, or None if the transfer is invalid.
+        """
+        moved, _ = self.transfer_order(
+            [transfer_line(source_id, target_id, product_name, quantity)]
+        )
+        return None if moved is None else moved[0]
+
+
+def transfer_warehouses(lines):
+    """The IDs of the warehouses named by well-formed transfer lines."""
+    return {
+        warehouse_id for line in lines if isinstance(line, dict)
+        for warehouse_id in (line.get("from"), line.get("to"))
+        if isinstance(warehouse_id, int)
+    }
+
+
+def transfer_error(line, warehouses):
+    """An error message for an invalid transfer line, else None."""
+    try:
+        source_id, target_id = line["from"], line["to"]
+        _product_name(line)
+        quantity = line["quantity"]
+    except (KeyError, TypeError):
+        return "malformed line"
+    if not _valid_quantity(quantity):
+        return "invalid quantity"
+    for warehouse_id in (source_id, target_id):
+        if not isinstance(warehouse_id, int) \
+                or warehouse_id not in warehouses:
+            return "warehouse not found"
+    if source_id == target_id:
+        return "source and target are the same"
+    return None
@@ -0,0 +1 @@
+"""Performance benchmarks for Ohtuvarasto. Run them from the src directory."""
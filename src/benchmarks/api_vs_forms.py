@@ -0,0 +1,60 @@
+"""Compare write and read throughput of the JSON API and the HTML routes.
+
+Usage: ``python -m benchmarks.api_vs_forms [requests]`` from ``src``.
+"""
+
+import sys
+import time
+from app import app, warehouse_manager
+
+
+def _reset():
+    for warehouse_id, _ in warehouse_manager.get_all_warehouses():
+        warehouse_manager.delete_warehouse(warehouse_id)
+    return warehouse_manager.create_warehouse("Benchmark")
+
+
+def _rate(label, count, send):
+    started = time.perf_counter()
+    for index in range(count):
+        send(index)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{count / elapsed:>10.0f} req/s")
+
+
+def bench_writes(client, count):
+    warehouse_id = _reset()
+    _rate("form add_product", count, lambda i: client.post(
+        f"/warehouse/{warehouse_id}/product/add",
+        data={"product_name": f"P{i % 100}", "quantity": "1"},
+        follow_redirects=True,
+    ))
+    warehouse_id = _reset()
+    _rate("api add_product", count, lambda i: client.post(
+        f"/api/v1/warehouses/{warehouse_id}/products",
+        json={"name": f"P{i % 100}", "quantity": 1},
+    ))
+
+
+def bench_reads(client, count):
+    warehouse_id = _reset()
+    for index in range(100):
+        warehouse_manager.add_product(warehouse_id, f"P{index}", index)
+    _rate("html view_warehouse", count, lambda i: client.get(
+        f"/warehouse/{warehouse_id}"
+    ))
+    _rate("api get_products", count, lambda i: client.get(
+        f"/api/v1/warehouses/{warehouse_id}/products"
+    ))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    app.config["TESTING"] = True
+    client = app.test_client()
+    bench_writes(client, count)
+    bench_reads(client, count)
+
+
+if __name__ == "__main__":
+    main()
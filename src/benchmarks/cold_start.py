@@ -0,0 +1,68 @@
+"""Time to the first responses of a new app process.
+
+Usage: ``python -m benchmarks.cold_start [runs]`` from ``src``.
+
+Starts ``runs`` fresh processes for each setting of ``startup``: none,
+a template bytecode cache filled beforehand, and the cache with the
+warm-up. Each process imports ``app`` and requests the warehouse list
+and a warehouse page once; the medians of the import (including any
+warm-up) and of those first two requests are printed.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import sys, time
+start = time.perf_counter()
+from app import app, warehouse_manager
+ready = time.perf_counter()
+warehouse_id = warehouse_manager.create_warehouse("Main")
+warehouse_manager.add_product(warehouse_id, "Apple", 1)
+client = app.test_client()
+timings = [ready - start]
+for path in ("/", f"/warehouse/{warehouse_id}"):
+    before = time.perf_counter()
+    client.get(path)
+    timings.append(time.perf_counter() - before)
+print(*timings)
+"""
+
+
+def _run(env, runs):
+    """Median (ready, first list, first page) seconds over ``runs``."""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD], env=env, check=True,
+            capture_output=True, text=True,
+        ).stdout
+        samples.append([float(value) for value in output.split()])
+    return [statistics.median(column) for column in zip(*samples)]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as directory:
+        cached = dict(os.environ, OHTUVARASTO_TEMPLATE_CACHE=directory)
+        subprocess.run(
+            [sys.executable, "-m", "flask", "--app", "app",
+             "compile-templates"], env=cached, check=True,
+        )
+        settings = {
+            "default": dict(os.environ),
+            "template cache": cached,
+            "cache + warm-up": dict(cached, OHTUVARASTO_WARM_UP="true"),
+        }
+        print(f"{'':16} {'ready':>9} {'first /':>9} {'first page':>11}")
+        for name, env in settings.items():
+            ready, listing, page = _run(env, runs)
+            print(f"{name:16} {ready * 1e3:7.1f}ms {listing * 1e3:7.1f}ms "
+                  f"{page * 1e3:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
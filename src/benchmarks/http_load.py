@@ -0,0 +1,164 @@
+"""Load test one or more running servers and report requests/s and latency.
+
+Start the servers to compare first, from ``src``, for example::
+
+    flask --app app run --port 5000 --with-threads
+    uvicorn asgi:app --port 8000
+
+and then run::
+
+    python -m benchmarks.http_load http://127.0.0.1:5000 http://127.0.0.1:8000
+
+Each URL gets a warehouse with some products, and then ``--concurrency``
+clients repeatedly GET it over keep-alive connections, until
+``--requests`` responses have been received. Every ``--write-every``
+request is a POST that adds a product instead.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+
+class Connection:
+    """A minimal HTTP/1.1 client connection that reconnects as needed."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self._streams = None
+
+    async def request(self, method, path, body=None):
+        """Send one request; returns (status, body bytes)."""
+        if self._streams is None:
+            self._streams = await asyncio.open_connection(self.host, self.port)
+        reader, writer = self._streams
+        content = b"" if body is None else json.dumps(body).encode()
+        writer.write(self._head(method, path, len(content)) + content)
+        status, headers = await _read_head(reader)
+        payload = await reader.readexactly(
+            int(headers.get("content-length", 0))
+        )
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, payload
+
+    def _head(self, method, path, length):
+        return (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {length}\r\n\r\n"
+        ).encode()
+
+    async def close(self):
+        if self._streams is not None:
+            self._streams[1].close()
+            self._streams = None
+
+
+async def _read_head(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *lines = head.decode("latin-1").split("\r\n")
+    version, status = status_line.split(" ")[:2]
+    headers = {
+        name.strip().lower(): value.strip()
+        for name, _, value in (line.partition(":") for line in lines if line)
+    }
+    if version == "HTTP/1.0" and "keep-alive" not in headers.get(
+            "connection", "").lower():
+        headers["connection"] = "close"
+    return int(status), headers
+
+
+class LoadRun:
+    """Many clients sharing one queue of requests to one server."""
+
+    def __init__(self, url, options):
+        parts = urlsplit(url)
+        self.url, self.options = url, options
+        self.address = parts.hostname, parts.port or 80
+        self.jobs = list(range(options.requests))
+        self.latencies = []
+        self.errors = 0
+        self.path = None
+
+    async def prepare(self):
+        """Create a warehouse with 100 products to load test."""
+        connection = Connection(*self.address)
+        _, body = await connection.request(
+            "POST", "/api/v1/warehouses", {"name": "Load test"}
+        )
+        self.path = f"/api/v1/warehouses/{json.loads(body)['id']}"
+        for number in range(100):
+            await connection.request(
+                "POST", self.path + "/products",
+                {"name": f"P{number}", "quantity": number},
+            )
+        await connection.close()
+
+    async def client(self):
+        connection = Connection(*self.address)
+        while self.jobs:
+            number = self.jobs.pop()
+            start = time.perf_counter()
+            status = await self._request(connection, number)
+            self.latencies.append(time.perf_counter() - start)
+            self.errors += status != 200
+        await connection.close()
+
+    async def _request(self, connection, number):
+        """Send request ``number``; returns its status, None on failure."""
+        write_every = self.options.write_every
+        if write_every and number % write_every == 0:
+            request = ("POST", self.path + "/products",
+                       {"name": f"P{number % 100}", "quantity": 1})
+        else:
+            request = ("GET", self.path)
+        try:
+            status, _ = await connection.request(*request)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            await connection.close()
+            return None
+        return status
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        print(
+            f"{self.url:<28}{len(latencies) / elapsed:>10,.0f} req/s"
+            f"  p50 {_percentile(latencies, 50):7.1f} ms"
+            f"  p99 {_percentile(latencies, 99):7.1f} ms"
+            f"  errors {self.errors}"
+        )
+
+
+async def _run(url, options):
+    run = LoadRun(url, options)
+    await run.prepare()
+    start = time.perf_counter()
+    await asyncio.gather(*(run.client() for _ in range(options.concurrency)))
+    run.report(time.perf_counter() - start)
+
+
+def _percentile(ordered, percent):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, len(ordered) * percent // 100)
+    return ordered[index] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n", maxsplit=1)[0]
+    )
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--write-every", type=int, default=10)
+    options = parser.parse_args()
+    for url in options.urls:
+        asyncio.run(_run(url, options))
+
+
+if __name__ == "__main__":
+    main()
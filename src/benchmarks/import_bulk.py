@@ -0,0 +1,49 @@
+"""Compare importing products one add_product call at a time with the
+chunked bulk path used by CSV and JSON Lines imports.
+
+Usage: ``python -m benchmarks.import_bulk [rows]`` from ``src``.
+"""
+
+import io
+import sys
+import tempfile
+import time
+import inventory
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage
+
+
+def _csv(count):
+    lines = (f"SKU-{number:07},{number % 100}\n" for number in range(count))
+    return io.StringIO("product,quantity\n" + "".join(lines))
+
+
+def _per_row(manager, warehouse_id, rows):
+    for name, quantity in inventory.valid_products(rows, inventory.Rejected()):
+        manager.add_product(warehouse_id, name, quantity)
+
+
+def _bulk(manager, warehouse_id, rows):
+    inventory.import_products(manager, warehouse_id, rows, inventory.Rejected())
+
+
+def _measure(label, count, load):
+    with tempfile.TemporaryDirectory() as directory:
+        manager = Ohtuvarasto(FileStorage(directory))
+        warehouse_id = manager.create_warehouse("Import")
+        rows = inventory.read_csv(_csv(count))
+        start = time.perf_counter()
+        load(manager, warehouse_id, rows)
+        manager.close()
+        elapsed = time.perf_counter() - start
+    print(f"{label:<20}{count / elapsed:>12,.0f} rows/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    _measure("add_product per row", count, _per_row)
+    _measure("bulk import", count, _bulk)
+
+
+if __name__ == "__main__":
+    main()
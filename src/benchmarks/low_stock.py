@@ -0,0 +1,74 @@
+"""Time the low-stock index against a scan of every warehouse.
+
+Usage: ``python -m benchmarks.low_stock [warehouses] [products]`` from
+``src``. Every product has a reorder point of 50 and a random quantity
+below 200, so about a quarter of the rows are low. Times listing the 10
+lowest, and the cost of the index on writes.
+"""
+
+import heapq
+import sys
+import time
+from random import Random
+from ohtuvarasto import Ohtuvarasto
+
+POINT = 50
+
+
+def _time(function, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def _scan(manager, limit):
+    """What a client had to do before: check every product of every
+    warehouse."""
+    return heapq.nsmallest(limit, (
+        (quantity / POINT, wid, name)
+        for wid, warehouse in manager.get_all_warehouses()
+        for name, quantity in warehouse["products"].items()
+        if quantity < POINT
+    ))
+
+
+def _fill(manager, warehouses, products):
+    random = Random(0)
+    names = [f"Product {number}" for number in range(products)]
+    alerts = manager.index("alerts")
+    for name in names:
+        alerts.set_reorder_point(name, POINT)
+    for number in range(warehouses):
+        wid = manager.create_warehouse(f"Warehouse {number}")
+        manager.import_products(
+            wid, [(name, random.randrange(200)) for name in names]
+        )
+    return names
+
+
+def _writes(manager, names, repeat=10_000):
+    random = Random(1)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        manager.update_product_quantity(
+            1, random.choice(names), random.randrange(200)
+        )
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    warehouses = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    products = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    manager = Ohtuvarasto()
+    names = _fill(manager, warehouses, products)
+    scan = _time(lambda: _scan(manager, 10), repeat=3)
+    alerts = manager.index("alerts")
+    index = _time(lambda: alerts.low_stock(10), repeat=1000)
+    print(f"{warehouses * products} rows: scan {scan * 1e3:.1f} ms, "
+          f"index {index * 1e6:.1f} µs, "
+          f"update with rules {_writes(manager, names) * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
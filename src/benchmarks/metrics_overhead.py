@@ -0,0 +1,35 @@
+"""Measure what the instrumentation of ``metrics`` adds to manager calls.
+
+Usage: ``python -m benchmarks.metrics_overhead [calls]`` from ``src``.
+"""
+
+import sys
+import time
+import metrics
+from ohtuvarasto import Ohtuvarasto
+
+
+def _measure(label, count, instrument):
+    manager = Ohtuvarasto()
+    if instrument:
+        metrics.instrument_manager(manager, metrics.Registry())
+    warehouse_id = manager.create_warehouse("Timed")
+    start = time.perf_counter()
+    for number in range(count):
+        manager.add_product(warehouse_id, f"P{number % 100}", 1)
+        manager.get_products(warehouse_id)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16}{elapsed / (2 * count) * 1e6:>8.2f} µs/call")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    plain = _measure("plain", count, False)
+    timed = _measure("instrumented", count, True)
+    overhead = (timed - plain) / (2 * count)
+    print(f"{'overhead':<16}{overhead * 1e6:>8.2f} µs/call")
+
+
+if __name__ == "__main__":
+    main()
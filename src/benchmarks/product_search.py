@@ -0,0 +1,74 @@
+"""Time product search against a scan of every warehouse.
+
+Usage: ``python -m benchmarks.product_search [warehouses] [products]``
+from ``src``. Each warehouse holds ``products`` products drawn from a
+catalog of 100 * ``products`` names, a million rows by default.
+"""
+
+import sys
+import time
+from functools import partial
+from random import Random
+from ohtuvarasto import Ohtuvarasto
+
+QUERIES = ("SKU-0421", "red", "7-blu", "bolt", "zz", "nothing-like-this")
+COLOURS = ("red", "green", "blue", "black", "white")
+KINDS = ("bolt", "nut", "screw", "washer", "hinge", "bracket")
+
+
+def _catalog(size):
+    random = Random(0)
+    return [
+        f"SKU-{number:06}-{random.choice(COLOURS)}-{random.choice(KINDS)}"
+        for number in range(size)
+    ]
+
+
+def _scan(manager, query, limit):
+    """What a client had to do before: check every product of every
+    warehouse."""
+    query = query.casefold()
+    found = set()
+    for _, warehouse in manager.get_all_warehouses():
+        found.update(
+            name for name in warehouse["products"] if query in name.casefold()
+        )
+    return sorted(found)[:limit]
+
+
+def _time(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def _load(warehouses, products):
+    catalog = _catalog(100 * products)
+    random = Random(1)
+    manager = Ohtuvarasto()
+    start = time.perf_counter()
+    for number in range(warehouses):
+        manager.import_products(
+            manager.create_warehouse(f"W{number}"),
+            ((name, 1) for name in random.sample(catalog, products)),
+        )
+    print(f"{warehouses * products} rows loaded and indexed in "
+          f"{time.perf_counter() - start:.1f} s")
+    return manager
+
+
+def main():
+    warehouses = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    products = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    manager = _load(warehouses, products)
+    search = manager.index("search").search
+    for query in QUERIES:
+        indexed = _time(partial(search, query, 20), 20)
+        scanned = _time(partial(_scan, manager, query, 20), 1)
+        print(f"{query!r:<22}{indexed * 1e3:>9.3f} ms indexed"
+              f"{scanned * 1e3:>11.1f} ms scanned")
+
+
+if __name__ == "__main__":
+    main()
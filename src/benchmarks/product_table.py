@@ -0,0 +1,87 @@
+"""Time to first byte and peak memory of the warehouse page.
+
+Usage: ``python -m benchmarks.product_table [products...]`` from
+``src``. For each size, renders a warehouse holding that many products
+as one page of ``PRODUCTS_PER_PAGE`` products, as the whole table
+streamed with ``?per_page=all``, and as the whole table rendered at
+once like the page did before; then times building the row URLs with
+``url_for`` against the precomputed prefixes.
+"""
+
+import sys
+import time
+import tracemalloc
+from flask import render_template, url_for
+from app import (
+    _path_segment, _product_url, _warehouse_context, app, warehouse_manager,
+)
+
+
+def _measure(respond):
+    """(time to first chunk, total time, peak traced MiB) of a body."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = iter(respond())
+    next(chunks)
+    first = time.perf_counter() - start
+    for _ in chunks:
+        pass
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def _report(name, first, total, peak):
+    print(f"  {name:12} first byte {first * 1e3:7.1f} ms, "
+          f"total {total * 1e3:7.1f} ms, peak {peak:6.1f} MiB")
+
+
+def _table(client, warehouse_id):
+    path = f"/warehouse/{warehouse_id}"
+    for name, query in (("page", ""), ("streamed", "?per_page=all")):
+        _report(name, *_measure(
+            lambda query=query: client.get(path + query, buffered=False)
+            .response
+        ))
+    warehouse = warehouse_manager.get_warehouse(warehouse_id)
+    with app.test_request_context(path):
+        _report("all at once", *_measure(lambda: [render_template(
+            "view_warehouse.html",
+            **_warehouse_context(warehouse_id, warehouse),
+        )]))
+
+
+def _urls(warehouse_id, names):
+    with app.test_request_context():
+        start = time.perf_counter()
+        for name in names:
+            url_for("update_product", warehouse_id=warehouse_id,
+                    product_name=name)
+        slow = time.perf_counter() - start
+        start = time.perf_counter()
+        prefix, suffix = _product_url("update_product", warehouse_id)
+        for name in names:
+            _ = prefix + _path_segment(name) + suffix
+        fast = time.perf_counter() - start
+    print(f"  row URLs: url_for {slow * 1e3:.1f} ms, "
+          f"prefixes {fast * 1e3:.1f} ms")
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 20_000]
+    client = app.test_client()
+    for size in sizes:
+        names = [f"Product {number}" for number in range(size)]
+        warehouse_id = warehouse_manager.create_warehouse(f"{size} products")
+        warehouse_manager.import_products(
+            warehouse_id, [(name, 1) for name in names]
+        )
+        client.get(f"/warehouse/{warehouse_id}?page=2")  # compile templates
+        print(f"{size} products:")
+        _table(client, warehouse_id)
+        _urls(warehouse_id, names)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Measure the memory allocated per get_products call on a large warehouse.
+
+Compares copying the products dict on every read, as get_products used
+to do, with the read-only views it returns now.
+
+Usage: ``python -m benchmarks.products_view [products] [reads]`` from ``src``.
+"""
+
+import sys
+import tracemalloc
+from ohtuvarasto import Ohtuvarasto
+
+
+def _copying_read(manager, warehouse_id):
+    with manager._lock_for(warehouse_id):  # pylint: disable=protected-access
+        return manager.get_warehouse(warehouse_id)["products"].copy()
+
+
+def _measure(label, reads, read):
+    tracemalloc.start()
+    for _ in range(reads):
+        tracemalloc.reset_peak()
+        view = read()
+        _, peak = tracemalloc.get_traced_memory()
+        del view
+    tracemalloc.stop()
+    print(f"{label:<24}{peak / 1024:>10.1f} KiB/read")
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    manager = Ohtuvarasto()
+    warehouse_id = manager.create_warehouse("Large")
+    for number in range(products):
+        manager.add_product(warehouse_id, f"SKU-{number:06}", number)
+    print(f"{products} products, {reads} reads")
+    _measure("dict copy per read", reads,
+             lambda: _copying_read(manager, warehouse_id))
+    _measure("read-only view", reads,
+             lambda: manager.get_products(warehouse_id))
+
+
+if __name__ == "__main__":
+    main()
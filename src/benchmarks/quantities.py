@@ -0,0 +1,42 @@
+"""Compare float, Decimal and integer fixed-point quantities.
+
+Usage: ``python -m benchmarks.quantities [operations]`` from ``src``.
+
+Times a ``Varasto`` taking in and giving out a hundredth at a time with
+each representation, and shows how far the float total drifts from the
+exact one.
+"""
+
+import sys
+import time
+from decimal import Decimal
+from quantities import FixedQuantities
+from varasto import Varasto
+
+
+def _measure(label, count, step, show=repr):
+    varasto = Varasto(step * count * 2)
+    start = time.perf_counter()
+    for _ in range(count):
+        varasto.lisaa_varastoon(step)
+        varasto.lisaa_varastoon(step)
+        varasto.ota_varastosta(step)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16}{elapsed / (3 * count) * 1e9:>8.1f} ns/operation"
+          f"   total {show(varasto.saldo)}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    fixed = FixedQuantities(digits=2)
+    print(f"{count} x (+0.01 +0.01 -0.01), exact total {count / 100:g}")
+    _measure("float", count, 0.01)
+    _measure("Decimal", count, Decimal("0.01"))
+    _measure("fixed-point", count, fixed.parse("0.01"), fixed.text)
+    total = sum(0.1 for _ in range(count))
+    print(f"sum of {count} x 0.1: float {total!r}, fixed-point "
+          f"{fixed.text(sum(fixed.parse('0.1') for _ in range(count)))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measure how reads scale with the number of processes sharing one
+SQLite-backed inventory, as gunicorn workers would.
+
+Usage: ``python -m benchmarks.shared_reads [seconds] [max processes]``
+from ``src``.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from ohtuvarasto import Ohtuvarasto
+from storage import SqliteStorage
+
+
+def _reader(path, seconds, results):
+    manager = Ohtuvarasto(SqliteStorage(path))
+    reads = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            manager.get_products(1)
+            manager.index("products").total("P1")
+        reads += 200
+    manager.close()
+    results.put(reads)
+
+
+def _measure(path, processes, seconds):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [
+        context.Process(target=_reader, args=(path, seconds, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    total = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    print(f"{processes:>3} processes{total / seconds:>14,.0f} reads/s")
+
+
+def _prepare(path):
+    """Create warehouse 1 with 1000 products."""
+    manager = Ohtuvarasto(SqliteStorage(path))
+    warehouse_id = manager.create_warehouse("Shared")
+    manager.import_products(
+        warehouse_id, ((f"P{number}", number) for number in range(1000))
+    )
+    manager.close()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    most = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ohtuvarasto.db")
+        _prepare(path)
+        processes = 1
+        while processes <= most:
+            _measure(path, processes, seconds)
+            processes *= 2
+
+
+if __name__ == "__main__":
+    main()
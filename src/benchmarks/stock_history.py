@@ -0,0 +1,48 @@
+"""Memory and query time of a long stock history.
+
+Usage: ``python -m benchmarks.stock_history [days]`` from ``src``.
+
+Records one product changing every 10 seconds for ``days`` simulated
+days, then times a point query and a range query over the whole period.
+"""
+
+import sys
+import time
+import tracemalloc
+from history import StockHistory
+
+
+def _time(function, repeat=100):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def _record(changes):
+    """A history of ``changes`` changes 10 seconds apart, and its end."""
+    now = [0.0]
+    tracemalloc.start()
+    history = StockHistory(lambda: now[0])
+    for number in range(changes):
+        now[0] += 10
+        history.product_changed(1, "Apple", None, number % 1000)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples = history.samples(1, "Apple", 0, now[0] + 1)
+    print(f"{changes} changes kept as {len(samples)} samples "
+          f"in {current / 1024:.0f} KiB")
+    return history, now[0]
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    history, end = _record(days * 24 * 360)
+    point = _time(lambda: history.at(1, "Apple", end / 2))
+    span = _time(lambda: history.samples(1, "Apple", 0, end + 1))
+    print(f"point query {point * 1e6:.1f} µs, "
+          f"{days}-day range {span * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""A reproducible benchmark suite with JSON results and regression checks.
+
+Usage, from ``src``::
+
+    python -m benchmarks.suite run --output results.json
+    python -m benchmarks.suite compare baseline.json results.json
+
+``run`` times micro-benchmarks of ``Varasto`` and of every public
+``Ohtuvarasto`` method and index query, the latter at several inventory
+sizes, and macro-benchmarks that drive the Flask app through mixed
+workloads with its test client. Every benchmark is timed in
+``--repeat`` rounds of enough calls to last ``--min-time`` seconds; the
+best round is the result, as it is the least disturbed by the rest of
+the machine. Data comes from a fixed random seed, so runs on one machine
+are comparable.
+
+``compare`` prints the change of every benchmark and exits with status
+1 if any is slower than the baseline by more than ``--threshold``.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from functools import lru_cache, partial
+from random import Random
+from typing import Callable, NamedTuple
+from indexes import WarehouseQuery
+from ohtuvarasto import Ohtuvarasto
+from varasto import Varasto
+
+# (warehouses, products per warehouse) of the inventories benchmarked.
+SIZES = ((10, 10), (1000, 100))
+
+
+class Benchmark(NamedTuple):
+    """A named benchmark; ``setup()`` builds its data and returns the
+    function to time, which does one operation per call."""
+
+    name: str
+    setup: Callable[[], Callable[[], object]]
+
+
+def _varasto_benchmarks():
+    def adding():
+        varasto = Varasto(float("inf"))
+        return lambda: varasto.lisaa_varastoon(1.5)
+
+    def taking():
+        varasto = Varasto(float("inf"), float("inf"))
+        return lambda: varasto.ota_varastosta(1.5)
+
+    return [
+        Benchmark("varasto.lisaa_varastoon", adding),
+        Benchmark("varasto.ota_varastosta", taking),
+    ]
+
+
+def populated(warehouses, products, seed=0):
+    """An Ohtuvarasto with ``warehouses`` warehouses of ``products``
+    products each, drawn from a catalog of 10 * ``products`` names."""
+    random = Random(seed)
+    manager = Ohtuvarasto()
+    catalog = [f"SKU-{number:06}" for number in range(10 * products)]
+    for number in range(warehouses):
+        warehouse_id = manager.create_warehouse(f"Warehouse {number:05}")
+        manager.import_products(warehouse_id, (
+            (name, random.randint(1, 100))
+            for name in random.sample(catalog, products)
+        ))
+        manager.set_capacity(warehouse_id, 200 * products)
+    return manager
+
+
+@lru_cache(maxsize=None)
+def _inventory(warehouses, products):
+    """One shared inventory per size; the cases below leave it as is."""
+    return populated(warehouses, products)
+
+
+def _manager_cases(manager):
+    """{method: function doing one call} for every public method and
+    index query.
+
+    Methods that would change the inventory are paired with their
+    inverse, so that every call, and every benchmark sharing the
+    manager, sees the same inventory.
+    """
+    warehouse_ids = [wid for wid, _ in manager.get_all_warehouses()]
+    wid = warehouse_ids[len(warehouse_ids) // 2]
+    name = manager.get_warehouse(wid)["name"]
+    contents = list(manager.get_products(wid).items())
+    product = contents[0][0]
+    query = WarehouseQuery("name", "Warehouse 0", 0, 20)
+    alerts = manager.index("alerts")
+    history, now = manager.index("history"), time.time()
+    batch = [
+        {"op": "add", "warehouse_id": warehouse_id, "quantity": 0,
+         "product": next(iter(manager.get_products(warehouse_id)))}
+        for warehouse_id in warehouse_ids[:10]
+    ]
+    return {
+        "get_warehouse": lambda: manager.get_warehouse(wid),
+        "get_all_warehouses": manager.get_all_warehouses,
+        "listing.page": lambda: manager.index("listing").page(query),
+        "products.holdings":
+            lambda: manager.index("products").holdings(product),
+        "products.total": lambda: manager.index("products").total(product),
+        "capacity.free_space":
+            lambda: manager.index("capacity").free_space(wid),
+        "capacity.with_room":
+            lambda: manager.index("capacity").with_room(product, 1),
+        "versions.version": lambda: manager.index("versions").version(wid),
+        "search.search":
+            lambda: manager.index("search").search(product[4:7], 20),
+        "alerts.set_reorder_point+low_stock": lambda: (
+            alerts.set_reorder_point(product, 1e9),
+            alerts.low_stock(),
+            alerts.set_reorder_point(product, None),
+        ),
+        "history.at": lambda: history.at(wid, product, now),
+        "history.samples":
+            lambda: history.samples(wid, product, now - 3600, now),
+        "get_products": lambda: manager.get_products(wid),
+        "set_capacity": lambda: manager.set_capacity(wid, 1e9, "Extra"),
+        "update_warehouse_name":
+            lambda: manager.update_warehouse_name(wid, name),
+        "add_product": lambda: manager.add_product(wid, product, 0),
+        "update_product_quantity": lambda: manager.update_product_quantity(
+            wid, product, contents[0][1]
+        ),
+        "remove_product+add_product": lambda: (
+            manager.remove_product(wid, "Extra"),
+            manager.add_product(wid, "Extra", 1),
+        ),
+        "create_warehouse+delete_warehouse": lambda: manager.delete_warehouse(
+            manager.create_warehouse("Temporary")
+        ),
+        "clear_warehouse+import_products": lambda: (
+            manager.clear_warehouse(wid),
+            manager.import_products(wid, contents),
+        ),
+        "apply_batch": lambda: manager.apply_batch(batch),
+        "transfer_order": _round_trip(manager, wid, product),
+    }
+
+
+def _round_trip(manager, wid, product):
+    """A call moving one of a product from ``wid`` to another warehouse
+    and back in one transfer order.
+
+    The product is one that another warehouse holds too, if there is
+    one; otherwise the other warehouse removes ``product`` again after
+    the order, as the order leaves it there at 0.
+    """
+    products = manager.index("products")
+    shared = [
+        (name, other) for name in manager.get_products(wid)
+        for other in products.holdings(name) if other != wid
+    ]
+    name, other = shared[0] if shared else (product, next(
+        (w for w, _ in manager.get_all_warehouses() if w != wid), wid
+    ))
+    lines = [
+        {"from": wid, "to": other, "product": name, "quantity": 1},
+        {"from": other, "to": wid, "product": name, "quantity": 1},
+    ]
+    if shared:
+        return partial(manager.transfer_order, lines)
+    return lambda: (
+        manager.transfer_order(lines), manager.remove_product(other, name)
+    )
+
+
+def _manager_benchmarks():
+    benchmarks = []
+    methods = sorted(_manager_cases(populated(1, 1)))
+    for warehouses, products in SIZES:
+        size = f"{warehouses}x{products}"
+        for method in methods:
+            benchmarks.append(Benchmark(
+                f"ohtuvarasto.{method}[{size}]",
+                _manager_setup(method, warehouses, products),
+            ))
+    return benchmarks
+
+
+def _manager_setup(method, warehouses, products):
+    return lambda: _manager_cases(_inventory(warehouses, products))[method]
+
+
+def _flask_workload(write_share):
+    """Requests of a user browsing the HTML pages, with ``write_share``
+    of them posting a product change."""
+    def setup():
+        # Imported here: importing the app creates its global manager.
+        from app import app, warehouse_manager  # pylint: disable=C0415
+        app.config["TESTING"] = True
+        client = app.test_client()
+        random = Random(0)
+        warehouse_ids = [
+            warehouse_manager.create_warehouse(f"Shop {number}")
+            for number in range(50)
+        ]
+        for warehouse_id in warehouse_ids:
+            warehouse_manager.import_products(
+                warehouse_id, [(f"SKU-{n}", n) for n in range(20)]
+            )
+        return lambda: _browse(client, random, warehouse_ids, write_share)
+    return setup
+
+
+def _browse(client, random, warehouse_ids, write_share):
+    warehouse_id = random.choice(warehouse_ids)
+    if random.random() < write_share:
+        client.post(f"/warehouse/{warehouse_id}/product/add",
+                    data={"product_name": "SKU-1", "quantity": "1"})
+        return
+    path = random.choice((
+        "/", f"/warehouse/{warehouse_id}", "/product/SKU-3",
+        f"/api/v1/warehouses/{warehouse_id}",
+    ))
+    client.get(path)
+
+
+def all_benchmarks():
+    return _varasto_benchmarks() + _manager_benchmarks() + [
+        Benchmark("flask.browse", _flask_workload(0.0)),
+        Benchmark("flask.mixed", _flask_workload(0.2)),
+    ]
+
+
+def measure(function, min_time, repeat):
+    """Seconds per call of ``function``: the best and the median round."""
+    number = _calibrate(function, min_time)
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - start) / number)
+    return {"best": min(rounds), "median": statistics.median(rounds),
+            "number": number}
+
+
+def _calibrate(function, min_time):
+    """The number of calls, a power of two, that lasts ``min_time``."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - start >= min_time:
+            return number
+        number *= 2
+
+
+def run(options):
+    results = {}
+    for benchmark in all_benchmarks():
+        if options.filter not in benchmark.name:
+            continue
+        results[benchmark.name] = measure(
+            benchmark.setup(), options.min_time, options.repeat
+        )
+        print(f"{benchmark.name:<58}"
+              f"{results[benchmark.name]['best'] * 1e6:>12.2f} µs")
+    report = {"environment": _environment(), "results": results}
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    return 0
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(),
+            "machine": platform.platform(), "commit": commit}
+
+
+def compare(baseline, current, threshold):
+    """(name, baseline, current, verdict) of the benchmarks in both,
+    where verdict is "slower", "faster" or "" within the threshold."""
+    rows = []
+    for name in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[name]["best"], current[name]["best"]
+        change = after / before - 1
+        verdict = ""
+        if change > threshold:
+            verdict = "slower"
+        elif change < -threshold:
+            verdict = "faster"
+        rows.append((name, before, after, verdict))
+    return rows
+
+
+def _compare(options):
+    rows = compare(
+        _results(options.baseline), _results(options.current),
+        options.threshold,
+    )
+    for name, before, after, verdict in rows:
+        print(f"{name:<58}{before * 1e6:>10.2f} →{after * 1e6:>10.2f} µs"
+              f"{after / before - 1:>+9.1%}  {verdict.upper()}")
+    slower = sum(verdict == "slower" for *_, verdict in rows)
+    print(f"{slower} of {len(rows)} benchmarks slower than the baseline")
+    return 1 if slower else 0
+
+
+def _results(path):
+    with open(path, encoding="utf-8") as report:
+        return json.load(report)["results"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n", maxsplit=1)[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    _add_run_command(commands)
+    _add_compare_command(commands)
+    options = parser.parse_args(argv)
+    return options.handler(options)
+
+
+def _add_run_command(commands):
+    parser = commands.add_parser("run", help="run the benchmarks")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks whose name has this")
+    parser.add_argument("--min-time", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.set_defaults(handler=run)
+
+
+def _add_compare_command(commands):
+    parser = commands.add_parser(
+        "compare", help="compare results against a baseline"
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.set_defaults(handler=_compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""Compare a pick wave done bin by bin against the bulk operations.
+
+Usage: ``python -m benchmarks.varasto_bulk [picks]`` from ``src``.
+"""
+
+import sys
+import time
+from random import Random
+from varasto import Varasto
+from varasto_array import VarastoArray
+
+BINS = 10_000
+
+
+def _timed(label, run):
+    started = time.perf_counter()
+    run()
+    print(f"{label:<28}{time.perf_counter() - started:>8.3f} s")
+
+
+def main():
+    picks = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random = Random(0)
+    indexes = [random.randrange(BINS) for _ in range(picks)]
+    amounts = [random.uniform(0, 3) for _ in range(picks)]
+    bins = [Varasto(100.0, 100.0) for _ in range(BINS)]
+    array = VarastoArray([100.0] * BINS, [100.0] * BINS)
+
+    def loop():
+        for index, amount in zip(indexes, amounts):
+            bins[index].ota_varastosta(amount)
+
+    _timed("Varasto.ota_varastosta loop", loop)
+    _timed("ota_varastosta_many", lambda: array.ota_varastosta_many(
+        indexes, amounts
+    ))
+
+
+if __name__ == "__main__":
+    main()
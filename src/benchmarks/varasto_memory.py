@@ -0,0 +1,37 @@
+"""Compare the memory used by many bins stored in different ways.
+
+Usage: ``python -m benchmarks.varasto_memory [bins]`` from ``src``.
+"""
+
+import sys
+import tracemalloc
+from varasto import Varasto
+from varasto_array import VarastoArray
+
+
+class DictVarasto(Varasto):
+    """Varasto with a per-instance __dict__, as it was before __slots__."""
+
+
+def _measure(label, count, build):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    built = build(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28}{current / count:>8.1f} bytes/bin")
+    return built
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    _measure("list of dict Varasto", count,
+             lambda n: [DictVarasto(100.0, 10.0) for _ in range(n)])
+    _measure("list of slotted Varasto", count,
+             lambda n: [Varasto(100.0, 10.0) for _ in range(n)])
+    _measure("VarastoArray", count,
+             lambda n: VarastoArray([100.0] * n, [10.0] * n))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Caching of rendered responses, keyed on Ohtuvarasto data versions.
+
+A cache key names a view together with the data versions it was built
+from, so a mutation makes the old key unreachable instead of having to
+invalidate it. The same key gives the ETag, letting clients revalidate
+with If-None-Match and get a 304 without anything being rendered.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from flask import current_app, request, session
+
+
+class ResponseCache:
+    """A thread-safe LRU map from cache keys to (body, mimetype)."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Versions restart from zero with the process, so ETags also
+        # carry a per-process token to stay unique across restarts.
+        self._epoch = os.urandom(8).hex()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def etag(self, key):
+        return hashlib.sha1(f"{self._epoch}{key!r}".encode()).hexdigest()
+
+
+def response_cache():
+    """The cache of the current Flask app."""
+    return current_app.extensions.setdefault("response_cache", ResponseCache())
+
+
+def cached_response(key, render, mimetype="text/html"):
+    """Answer with the body for ``key``, calling ``render`` only on a miss.
+
+    Pages with pending flash messages are user specific, so they are
+    rendered normally and neither cached nor given an ETag.
+    """
+    if "_flashes" in session:
+        return current_app.response_class(render(), mimetype=mimetype)
+    cache = response_cache()
+    etag = cache.etag(key)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        body, mimetype = _cached_entry(cache, key, render, mimetype)
+        response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    return response
+
+
+def _cached_entry(cache, key, render, mimetype):
+    entry = cache.get(key)
+    if entry is None:
+        entry = (render(), mimetype)
+        cache.put(key, entry)
+    return entry
@@ -0,0 +1,135 @@
+"""Warehouse and product capacities for Ohtuvarasto.
+
+Capacities are enforced with the clamping rules of ``varasto.Varasto``:
+adding more than fits fills up to the capacity, and setting a quantity
+above the capacity stores the capacity. Lowering a capacity below the
+current stock keeps the stock but leaves no free space.
+"""
+
+import threading
+from itertools import islice
+from indexes import SortedIndex
+from observers import WarehouseObserver
+from varasto import Varasto
+
+UNLIMITED = float("inf")
+
+
+def clamp_add(room, quantity):
+    """How much of ``quantity`` fits in ``room``, as in lisaa_varastoon."""
+    if room == UNLIMITED:
+        return quantity
+    varasto = Varasto(room)
+    varasto.lisaa_varastoon(quantity)
+    return varasto.saldo
+
+
+def clamp_set(limit, quantity):
+    """``quantity`` limited to ``limit``, as in the Varasto constructor."""
+    if limit == UNLIMITED:
+        return quantity
+    return Varasto(limit, quantity).saldo
+
+
+class CapacityIndex(WarehouseObserver):
+    """Running free space per warehouse, sorted for room-for-N queries.
+
+    Free space is ``capacity - total quantity`` and is updated from each
+    product change, so it is never recomputed by summing a warehouse.
+    Warehouses without a capacity have unlimited free space.
+    """
+
+    def __init__(self, quantity_of):
+        self._lock = threading.Lock()
+        self._quantity_of = quantity_of  # (warehouse_id, product) -> quantity
+        self._totals = {}  # {warehouse_id: total quantity}
+        self._capacities = {}  # {warehouse_id: capacity}
+        self._limits = {}  # {(warehouse_id, product): [capacity, quantity]}
+        self._by_free = SortedIndex()  # (free space, warehouse_id)
+
+    def warehouse_created(self, warehouse_id, name):
+        with self._lock:
+            self._totals[warehouse_id] = 0
+            self._capacities[warehouse_id] = UNLIMITED
+            self._by_free.add((UNLIMITED, warehouse_id))
+
+    def warehouse_deleted(self, warehouse_id, name):
+        with self._lock:
+            self._by_free.remove(self._key(warehouse_id))
+            del self._totals[warehouse_id]
+            del self._capacities[warehouse_id]
+            self._limits = {
+                key: limit for key, limit in self._limits.items()
+                if key[0] != warehouse_id
+            }
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        with self._lock:
+            limit = self._limits.get((warehouse_id, product_name))
+            if limit is not None:
+                limit[1] = new or 0
+            if self._capacities[warehouse_id] == UNLIMITED:
+                self._totals[warehouse_id] += (new or 0) - (old or 0)
+                return
+            self._by_free.remove(self._key(warehouse_id))
+            self._totals[warehouse_id] += (new or 0) - (old or 0)
+            self._by_free.add(self._key(warehouse_id))
+
+    def capacity_changed(self, warehouse_id, product_name, capacity):
+        capacity = UNLIMITED if capacity is None else max(0, capacity)
+        with self._lock:
+            if product_name is None:
+                self._by_free.remove(self._key(warehouse_id))
+                self._capacities[warehouse_id] = capacity
+                self._by_free.add(self._key(warehouse_id))
+            else:
+                self._set_limit(warehouse_id, product_name, capacity)
+
+    def free_space(self, warehouse_id):
+        """The unused capacity of a warehouse (inf when unlimited), or
+        None if there is no such warehouse."""
+        with self._lock:
+            if warehouse_id not in self._capacities:
+                return None
+            return self._free(warehouse_id)
+
+    def room_for(self, warehouse_id, product_name):
+        """How much more of a product fits in a warehouse."""
+        with self._lock:
+            return self._room(warehouse_id, product_name)
+
+    def with_room(self, product_name, quantity, limit=10):
+        """Up to ``limit`` (warehouse_id, room) pairs with room for
+        ``quantity`` of a product, the most free space first."""
+        with self._lock:
+            start, end = self._by_free.bounds((quantity,))
+            rooms = (
+                (wid, self._room(wid, product_name))
+                for _, wid in self._by_free.descending(start, end)
+            )
+            return list(islice(
+                ((wid, room) for wid, room in rooms if room >= quantity), limit
+            ))
+
+    def _free(self, warehouse_id):
+        capacity = self._capacities[warehouse_id]
+        if capacity == UNLIMITED:
+            return UNLIMITED
+        return max(0, capacity - self._totals[warehouse_id])
+
+    def _room(self, warehouse_id, product_name):
+        room = self._free(warehouse_id)
+        limit = self._limits.get((warehouse_id, product_name))
+        if limit is not None:
+            room = min(room, max(0, limit[0] - limit[1]))
+        return room
+
+    def _set_limit(self, warehouse_id, product_name, capacity):
+        key = (warehouse_id, product_name)
+        if capacity == UNLIMITED:
+            self._limits.pop(key, None)
+        else:
+            self._limits[key] = [capacity, self._quantity_of(*key) or 0]
+
+    def _key(self, warehouse_id):
+        return self._free(warehouse_id), warehouse_id
@@ -0,0 +1,110 @@
+"""A sequenced feed of the changes made to an Ohtuvarasto.
+
+``ChangeFeed`` is an observer that numbers every hook call with a
+``seq``, one higher than the previous call's, and keeps the latest
+``size`` calls in a ring buffer. Calls become event dicts only when
+read, and waiting readers are only woken if there are any, so changes
+nobody follows cost the feed little. Consumers remember the last ``seq``
+they saw and ask for the events after it, optionally waiting for new
+ones; if the buffer has already dropped some of those, they must reload
+the full state and continue from ``latest``.
+
+Sequence numbers belong to one process: they restart from 1 and differ
+between worker processes sharing a database. Quantities and capacities
+are reported as the numbers of the manager's ``quantities`` (see
+``quantities``), not as the values it stores.
+"""
+
+import threading
+from collections import deque
+from itertools import islice
+from observers import WarehouseObserver
+
+# The fields of each event type after "warehouse_id", in hook order.
+_FIELDS = {
+    "warehouse_created": ("name",),
+    "warehouse_renamed": ("name",),
+    "warehouse_deleted": (),
+    "product_changed": ("product", "old", "quantity"),
+    "capacity_changed": ("product", "capacity"),
+}
+# Fields holding stored quantities, converted by ``number``.
+_QUANTITIES = frozenset(("old", "quantity", "capacity"))
+
+
+class ChangeFeed(WarehouseObserver):
+    """The latest ``size`` changes, numbered from 1; ``number`` converts
+    the stored quantities for the events."""
+
+    def __init__(self, size=10000, number=None):
+        self._number = number
+        self._events = deque(maxlen=size)
+        self._latest = 0
+        self._waiting = 0
+        self._changed = threading.Condition()
+
+    @property
+    def latest(self):
+        """The ``seq`` of the latest event, 0 before the first one."""
+        return self._latest
+
+    def warehouse_created(self, warehouse_id, name):
+        self._emit("warehouse_created", warehouse_id, name)
+
+    def warehouse_renamed(self, warehouse_id, old_name, new_name):
+        self._emit("warehouse_renamed", warehouse_id, new_name)
+
+    def warehouse_deleted(self, warehouse_id, name):
+        self._emit("warehouse_deleted", warehouse_id)
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        self._emit("product_changed", warehouse_id, product_name, old, new)
+
+    def capacity_changed(self, warehouse_id, product_name, capacity):
+        self._emit("capacity_changed", warehouse_id, product_name, capacity)
+
+    def since(self, seq, timeout=None):
+        """Get the events after ``seq``, oldest first.
+
+        Waits up to ``timeout`` seconds (forever if None) for a new event
+        when there is none yet; a timeout of 0 does not wait. Returns
+        None if events after ``seq`` were already dropped, or if ``seq``
+        is ahead of ``latest`` (it came from another process).
+        """
+        with self._changed:
+            if seq > self._latest:
+                return None
+            if timeout != 0:
+                self._wait(seq, timeout)
+            first = self._latest - len(self._events) + 1
+            if seq + 1 < first:
+                return None
+            calls = list(islice(self._events, seq + 1 - first, None))
+        return [self._event(*call) for call in calls]
+
+    def _wait(self, seq, timeout):
+        """Wait for an event after ``seq``; must hold ``_changed``."""
+        self._waiting += 1
+        try:
+            self._changed.wait_for(lambda: self._latest > seq, timeout=timeout)
+        finally:
+            self._waiting -= 1
+
+    def _event(self, seq, kind, warehouse_id, values):
+        event = {"seq": seq, "type": kind, "warehouse_id": warehouse_id}
+        for key, value in zip(_FIELDS[kind], values):
+            event[key] = self._as_number(value) if key in _QUANTITIES \
+                else value
+        return event
+
+    def _as_number(self, stored):
+        if stored is None or self._number is None:
+            return stored
+        return self._number(stored)
+
+    def _emit(self, kind, warehouse_id, *values):
+        with self._changed:
+            self._latest += 1
+            self._events.append((self._latest, kind, warehouse_id, values))
+            if self._waiting:
+                self._changed.notify_all()
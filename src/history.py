@@ -0,0 +1,247 @@
+"""Stock history of every (warehouse, product), with rollups.
+
+``StockHistory`` is an observer that appends the new quantity of a
+product to its series on every change; a removed product is recorded as
+0. Each series keeps three tiers, oldest data in the coarsest:
+
+* raw changes, in chunks of ``CHUNK`` (time, quantity) pairs stored as
+  two arrays, of which the last is being filled;
+* per-minute buckets; and
+* per-hour buckets,
+
+each bucket holding the lowest, highest and last quantity recorded in
+it, again one array per column. Whenever a series starts a new chunk,
+the raw chunks older than ``Retention.raw`` (or beyond
+``Retention.raw_chunks``) are rolled up into minutes, minutes older than
+``Retention.minutes`` into hours, and hours older than
+``Retention.hours`` are dropped, so memory per series is bounded
+whatever the rate of changes.
+
+The history lives in memory only. Times are the Unix timestamps of the
+changes, which the manager stores in its log (see
+``observers.change_time``), so on startup the history is rebuilt from
+the latest snapshot onwards.
+"""
+
+import copy
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple, Optional
+from observers import WarehouseObserver, change_time
+
+CHUNK = 256
+MINUTE = 60
+HOUR = 3600
+
+
+class Retention(NamedTuple):
+    """How long, in seconds, each tier of a series is kept."""
+
+    raw: float = HOUR
+    minutes: float = 24 * HOUR
+    hours: Optional[float] = 90 * 24 * HOUR  # None keeps hours forever
+    raw_chunks: int = 16
+
+
+class Sample(NamedTuple):
+    """The quantities recorded from ``time`` for ``width`` seconds; a
+    width of 0 is a single change."""
+
+    time: float
+    width: int
+    low: float
+    high: float
+    close: float
+
+
+class _Raw:
+    """Individual changes, in chunks of at most ``CHUNK``."""
+
+    __slots__ = ("chunks", "typecode")
+
+    def __init__(self, typecode):
+        self.typecode = typecode
+        self.chunks = [(array("d"), array(typecode))]
+
+    def append(self, when, quantity):
+        """Record a change; returns True if it started a new chunk."""
+        times, quantities = self.chunks[-1]
+        full = len(times) == CHUNK
+        if full:
+            times, quantities = array("d"), array(self.typecode)
+            self.chunks.append((times, quantities))
+        times.append(when)
+        quantities.append(quantity)
+        return full
+
+    def pop_chunk(self, before, keep):
+        """Remove and return the oldest chunk if it ends before
+        ``before`` or there are more than ``keep``, else None."""
+        if len(self.chunks) > 1 and (
+            len(self.chunks) > keep or self.chunks[0][0][-1] < before
+        ):
+            return self.chunks.pop(0)
+        return None
+
+    def at(self, when):
+        for times, quantities in reversed(self.chunks):
+            position = bisect_right(times, when)
+            if position:
+                return quantities[position - 1]
+        return None
+
+    def samples(self, start, end):
+        for times, quantities in self.chunks:
+            low, high = bisect_left(times, start), bisect_left(times, end)
+            for position in range(low, high):
+                quantity = quantities[position]
+                yield Sample(times[position], 0, quantity, quantity, quantity)
+
+
+class _Buckets:
+    """Fixed-width time buckets with their low, high and last quantity."""
+
+    __slots__ = ("width", "starts", "columns")
+
+    def __init__(self, width, typecode):
+        self.width = width
+        self.starts = array("d")
+        self.columns = (array(typecode), array(typecode), array(typecode))
+
+    def add(self, when, low, high, close):
+        start = when - when % self.width
+        if not self.starts or self.starts[-1] != start:
+            self.starts.append(start)
+            for column, quantity in zip(self.columns, (low, high, close)):
+                column.append(quantity)
+            return
+        lows, highs, closes = self.columns
+        lows[-1] = min(lows[-1], low)
+        highs[-1] = max(highs[-1], high)
+        closes[-1] = close
+
+    def pop_before(self, before):
+        """Remove the buckets that end before ``before`` and return their
+        (start, low, high, close)."""
+        count = bisect_right(self.starts, before - self.width)
+        if not count:
+            return []
+        rows = list(zip(
+            self.starts[:count], *(column[:count] for column in self.columns)
+        ))
+        del self.starts[:count]
+        for column in self.columns:
+            del column[:count]
+        return rows
+
+    def at(self, when):
+        position = bisect_right(self.starts, when)
+        return self.columns[2][position - 1] if position else None
+
+    def samples(self, start, end):
+        low = bisect_right(self.starts, start - self.width)
+        high = bisect_left(self.starts, end)
+        for position in range(low, high):
+            yield Sample(self.starts[position], self.width,
+                         *(column[position] for column in self.columns))
+
+
+class _Series:
+    """The tiers of one (warehouse, product); buckets are made on first
+    rollup."""
+
+    __slots__ = ("raw", "minutes", "hours")
+
+    def __init__(self, typecode):
+        self.raw = _Raw(typecode)
+        self.minutes = self.hours = None
+
+    def tiers(self):
+        """The tiers that exist, newest first."""
+        return [tier for tier in (self.raw, self.minutes, self.hours) if tier]
+
+    def roll(self, now, retention):
+        self._roll_raw(now - retention.raw, retention.raw_chunks)
+        if self.minutes is None:
+            return
+        for row in self.minutes.pop_before(now - retention.minutes):
+            self.hours = self.hours or _Buckets(HOUR, self.raw.typecode)
+            self.hours.add(*row)
+        if self.hours is not None and retention.hours is not None:
+            self.hours.pop_before(now - retention.hours)
+
+    def _roll_raw(self, before, keep):
+        chunk = self.raw.pop_chunk(before, keep)
+        while chunk is not None:
+            self.minutes = self.minutes or _Buckets(MINUTE, self.raw.typecode)
+            for when, quantity in zip(*chunk):
+                self.minutes.add(when, quantity, quantity, quantity)
+            chunk = self.raw.pop_chunk(before, keep)
+
+
+class StockHistory(WarehouseObserver):
+    """Quantities of every product over time, by (warehouse, product).
+
+    ``typecode`` is the ``array`` type of the quantities: "d" for floats,
+    "q" for the integers of ``FixedQuantities``. ``clock`` gives the time
+    of each change.
+    """
+
+    def __init__(self, clock=change_time, retention=Retention(), typecode="d"):
+        self._clock = clock
+        self._retention = retention
+        self._typecode = typecode
+        self._series = {}  # {warehouse_id: {product_name: _Series}}
+        self._lock = threading.Lock()
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        now = self._clock()
+        with self._lock:
+            products = self._series.setdefault(warehouse_id, {})
+            series = products.get(product_name)
+            if series is None:
+                series = products[product_name] = _Series(self._typecode)
+            if series.raw.append(now, 0 if new is None else new):
+                series.roll(now, self._retention)
+
+    def warehouse_deleted(self, warehouse_id, name):
+        with self._lock:
+            self._series.pop(warehouse_id, None)
+
+    def export(self, warehouse_id):
+        """The series of a warehouse, for ``adopt`` on a history with the
+        same typecode, as when the warehouse moves to another manager."""
+        with self._lock:
+            return copy.deepcopy(self._series.get(warehouse_id, {}))
+
+    def adopt(self, warehouse_id, series):
+        """Replace the series of a warehouse with ``export``ed ones."""
+        with self._lock:
+            self._series[warehouse_id] = dict(series)
+
+    def _get(self, warehouse_id, product_name):
+        return self._series.get(warehouse_id, {}).get(product_name)
+
+    def at(self, warehouse_id, product_name, when):
+        """The quantity at Unix time ``when``, or None if it is older
+        than the history. From a rollup it is the last quantity of the
+        bucket holding ``when``."""
+        with self._lock:
+            series = self._get(warehouse_id, product_name)
+            for tier in series.tiers() if series else ():
+                quantity = tier.at(when)
+                if quantity is not None:
+                    return quantity
+        return None
+
+    def samples(self, warehouse_id, product_name, start, end):
+        """The ``Sample``s overlapping [start, end), oldest first, each
+        from the finest tier that holds its time."""
+        with self._lock:
+            series = self._get(warehouse_id, product_name)
+            tiers = reversed(series.tiers()) if series else ()
+            return [
+                sample for tier in tiers
+                for sample in tier.samples(start, end)
+            ]
@@ -0,0 +1,291 @@
+"""Incrementally maintained indexes over Ohtuvarasto warehouses."""
+
+import threading
+from bisect import bisect_left, insort
+from typing import NamedTuple
+from observers import WarehouseObserver
+
+
+class SortedIndex:
+    """A list of keys kept sorted, with O(log n) range lookups."""
+
+    def __init__(self):
+        self._keys = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def add(self, key):
+        insort(self._keys, key)
+
+    def remove(self, key):
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+
+    def bounds(self, low=None, high=None):
+        """Positions of the keys in [low, high); None means unbounded."""
+        start = 0 if low is None else bisect_left(self._keys, low)
+        end = len(self._keys) if high is None else bisect_left(self._keys, high)
+        return start, max(start, end)
+
+    def slice(self, start, end):
+        return self._keys[start:end]
+
+    def descending(self, start, end):
+        """Iterate the keys in positions [start, end) from last to first."""
+        for position in range(end - 1, start - 1, -1):
+            yield self._keys[position]
+
+
+def prefix_bounds(prefix):
+    """Keys (low, high) covering every tuple whose first item has ``prefix``."""
+    if not prefix:
+        return None, None
+    return (prefix,), (prefix[:-1] + chr(ord(prefix[-1]) + 1),)
+
+
+class WarehouseQuery(NamedTuple):
+    """One page of the warehouse listing.
+
+    ``sort`` is "id", "name" or "products" (product count). Name filtering
+    is a case-insensitive prefix match.
+    """
+
+    sort: str = "id"
+    name_prefix: str = ""
+    offset: int = 0
+    limit: int = 20
+    descending: bool = False
+
+    MAX_LIMIT = 100
+
+    @classmethod
+    def from_args(cls, args):
+        """Build a query from the sort, q, order, page and per_page args."""
+        limit = min(max(args.get("per_page", 20, type=int), 1), cls.MAX_LIMIT)
+        page_number = max(args.get("page", 1, type=int), 1)
+        sort = args.get("sort", "id")
+        return cls(
+            sort=sort if sort in WarehouseListing.SORTS else "id",
+            name_prefix=args.get("q", "").strip(),
+            offset=(page_number - 1) * limit,
+            limit=limit,
+            descending=args.get("order") == "desc",
+        )
+
+    @property
+    def page_number(self):
+        return self.offset // self.limit + 1
+
+
+class WarehousePage(NamedTuple):
+    items: list  # [(warehouse_id, warehouse_data)]
+    total: int  # number of warehouses matching the filter
+
+    def page_count(self, query):
+        return max(1, -(-self.total // query.limit))
+
+
+class WarehouseListing(WarehouseObserver):
+    """Sorted indexes by ID, name and product count for paged listings.
+
+    ``lookup`` returns the data of a warehouse by ID (None if it is gone)
+    for the items of a page.
+
+    A page sorted by name, or sorted by anything without a filter, costs
+    O(log n + page size). Filtering while sorting by ID or product count
+    has to sort the matching warehouses, so it costs O(m log m) in the
+    number of matches m.
+    """
+
+    SORTS = ("id", "name", "products")
+
+    def __init__(self, lookup):
+        self._lock = threading.Lock()
+        self._lookup = lookup
+        self._counts = {}  # {warehouse_id: product count}
+        self._by = {sort: SortedIndex() for sort in self.SORTS}
+
+    def warehouse_created(self, warehouse_id, name):
+        with self._lock:
+            self._counts[warehouse_id] = 0
+            self._by["id"].add((warehouse_id,))
+            self._by["name"].add((name.casefold(), warehouse_id))
+            self._by["products"].add((0, warehouse_id))
+
+    def warehouse_renamed(self, warehouse_id, old_name, new_name):
+        with self._lock:
+            self._by["name"].remove((old_name.casefold(), warehouse_id))
+            self._by["name"].add((new_name.casefold(), warehouse_id))
+
+    def warehouse_deleted(self, warehouse_id, name):
+        with self._lock:
+            count = self._counts.pop(warehouse_id)
+            self._by["id"].remove((warehouse_id,))
+            self._by["name"].remove((name.casefold(), warehouse_id))
+            self._by["products"].remove((count, warehouse_id))
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        if (old is None) == (new is None):
+            return
+        with self._lock:
+            count = self._counts[warehouse_id]
+            self._counts[warehouse_id] = count + (1 if old is None else -1)
+            self._by["products"].remove((count, warehouse_id))
+            self._by["products"].add((self._counts[warehouse_id], warehouse_id))
+
+    def page(self, query=WarehouseQuery()):
+        """Get one sorted, filtered page of warehouses as a WarehousePage."""
+        warehouse_ids, total = self._page_ids(query)
+        items = []
+        for warehouse_id in warehouse_ids:
+            warehouse = self._lookup(warehouse_id)
+            if warehouse is not None:
+                items.append((warehouse_id, warehouse))
+        return WarehousePage(items, total)
+
+    def _page_ids(self, query):
+        """Return (warehouse IDs of the page, total matching count)."""
+        if query.sort not in self.SORTS:
+            raise ValueError(f"unknown sort: {query.sort}")
+        with self._lock:
+            if query.name_prefix and query.sort != "name":
+                return self._filtered_page(query)
+            index = self._by[query.sort]
+            start, end = index.bounds(
+                *prefix_bounds(query.name_prefix.casefold())
+            )
+            keys = _page_of(index, start, end, query)
+        return [key[-1] for key in keys], end - start
+
+    def _filtered_page(self, query):
+        start, end = self._by["name"].bounds(
+            *prefix_bounds(query.name_prefix.casefold())
+        )
+        matches = [key[-1] for key in self._by["name"].slice(start, end)]
+        if query.sort == "products":
+            matches.sort(key=lambda wid: (self._counts[wid], wid))
+        else:
+            matches.sort()
+        if query.descending:
+            matches.reverse()
+        return matches[query.offset:query.offset + query.limit], len(matches)
+
+
+def _page_of(index, start, end, query):
+    """Slice one page out of positions [start, end) of a sorted index."""
+    if query.descending:
+        high = end - query.offset
+        low = max(start, high - query.limit)
+        return index.slice(low, max(low, high))[::-1]
+    low = start + query.offset
+    return index.slice(low, min(end, low + query.limit))
+
+
+class ProductIndex(WarehouseObserver):
+    """Inverted index from product name to the warehouses holding it.
+
+    Keeps ``{product: {warehouse_id: quantity}}`` plus a running total
+    per product, so totals are O(1) and breakdowns O(k) in the number of
+    warehouses holding the product.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._holdings = {}
+        self._totals = {}
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        with self._lock:
+            holdings = self._holdings.setdefault(product_name, {})
+            if new is None:
+                holdings.pop(warehouse_id, None)
+            else:
+                holdings[warehouse_id] = new
+            self._update_total(product_name, (new or 0) - (old or 0))
+
+    def _update_total(self, product_name, delta):
+        if self._holdings[product_name]:
+            total = self._totals.get(product_name, 0)
+            self._totals[product_name] = total + delta
+        else:
+            del self._holdings[product_name]
+            self._totals.pop(product_name, None)
+
+    def holdings(self, product_name):
+        """Return {warehouse_id: quantity} for one product."""
+        with self._lock:
+            return dict(self._holdings.get(product_name, {}))
+
+    def total(self, product_name):
+        return self._totals.get(product_name, 0)
+
+
+class IdAllocator(WarehouseObserver):
+    """Hands out increasing warehouse IDs, starting from ``next_id``.
+
+    As an observer it moves past the ID of every warehouse created, so
+    IDs restored or replayed from a log are never handed out again.
+    """
+
+    def __init__(self, next_id=1):
+        self.next_id = next_id
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        with self._lock:
+            warehouse_id = self.next_id
+            self.next_id += 1
+            return warehouse_id
+
+    def warehouse_created(self, warehouse_id, name):
+        self.skip_to(warehouse_id + 1)
+
+    def skip_to(self, next_id):
+        """Never hand out IDs below ``next_id``."""
+        with self._lock:
+            self.next_id = max(self.next_id, next_id)
+
+
+class Versions(WarehouseObserver):
+    """Change counters: one per warehouse and one for all warehouses.
+
+    Every change bumps the counter of the affected warehouse and the
+    global counter, so equal versions mean equal data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global = 0
+        self._warehouses = {}
+
+    def warehouse_created(self, warehouse_id, name):
+        self._bump(warehouse_id)
+
+    def warehouse_renamed(self, warehouse_id, old_name, new_name):
+        self._bump(warehouse_id)
+
+    def warehouse_deleted(self, warehouse_id, name):
+        with self._lock:
+            self._global += 1
+            self._warehouses.pop(warehouse_id, None)
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        self._bump(warehouse_id)
+
+    def capacity_changed(self, warehouse_id, product_name, capacity):
+        self._bump(warehouse_id)
+
+    def version(self, warehouse_id=None):
+        if warehouse_id is None:
+            return self._global
+        return self._warehouses.get(warehouse_id, 0)
+
+    def _bump(self, warehouse_id):
+        with self._lock:
+            self._global += 1
+            self._warehouses[warehouse_id] = self._global
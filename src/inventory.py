@@ -0,0 +1,214 @@
+"""Streaming import and export of warehouse inventory as CSV or JSON Lines.
+
+Every row is one product of one warehouse::
+
+    warehouse_id,warehouse,product,quantity
+    1,Helsinki,Apple,10
+    1,Helsinki,Pear,2.5
+
+and in JSON Lines ``{"warehouse_id": 1, "warehouse": "Helsinki",
+"product": "Apple", "quantity": 10}``. An empty warehouse is exported as
+one row without a product, so a full export can be restored as is.
+
+Rows are read and written one at a time with generators, so files of
+any size are handled in constant memory. Imports into one warehouse
+only need the product and quantity columns.
+"""
+
+import csv
+import io
+import json
+from itertools import groupby, islice
+from quantities import FLOAT
+
+FORMATS = ("csv", "jsonl")
+MIMETYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+FIELDS = ("warehouse_id", "warehouse", "product", "quantity")
+CHUNK_ROWS = 1000
+
+
+def export_rows(manager, warehouse_ids=None):
+    """Yield a row dict for every product of the given warehouses (all
+    warehouses by default). Each warehouse is read as a snapshot."""
+    if warehouse_ids is None:
+        warehouse_ids = [wid for wid, _ in manager.get_all_warehouses()]
+    for warehouse_id in warehouse_ids:
+        yield from _warehouse_rows(manager, warehouse_id)
+
+
+def _warehouse_rows(manager, warehouse_id):
+    warehouse = manager.get_warehouse(warehouse_id)
+    stock = manager.get_products(warehouse_id)
+    if warehouse is None or stock is None:
+        return
+    row = {"warehouse_id": warehouse_id, "warehouse": warehouse["name"]}
+    if not stock:
+        yield dict(row, product=None, quantity=None)
+    number = manager.quantities.number
+    for name, quantity in stock.items():
+        yield dict(row, product=name, quantity=number(quantity))
+
+
+def write_csv(rows):
+    """Yield CSV text in chunks of CHUNK_ROWS rows, header first."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield _drain(buffer)
+    if buffer.tell():
+        yield _drain(buffer)
+
+
+def write_jsonl(rows):
+    """Yield JSON Lines text in chunks of CHUNK_ROWS rows."""
+    for chunk in _chunks(rows):
+        yield "".join(json.dumps(row) + "\n" for row in chunk)
+
+
+def _chunks(rows):
+    rows = iter(rows)
+    while chunk := list(islice(rows, CHUNK_ROWS)):
+        yield chunk
+
+
+def _drain(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+
+def text_lines(binary, rejected):
+    """Decode a binary stream lazily into lines; a UTF-8 BOM is dropped.
+
+    Lines that are not valid UTF-8 are skipped and recorded in
+    ``rejected``, so a file in another encoding imports its readable
+    rows instead of failing halfway through.
+    """
+    encoding = "utf-8-sig"
+    for line_number, line in enumerate(binary, 1):
+        try:
+            yield line.decode(encoding)
+        except UnicodeDecodeError:
+            rejected.add(line_number, "not valid UTF-8")
+        encoding = "utf-8"
+
+
+def format_of(filename, default="csv"):
+    """Guess the format of an uploaded file from its extension."""
+    extension = filename.rsplit(".", 1)[-1].lower() if filename else ""
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    return extension if extension in FORMATS else default
+
+
+def read_csv(lines):
+    """Yield (line number, row dict) for each CSV record after the header."""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(lines):
+    """Yield (line number, row) for each non-blank line; rows that are
+    not valid JSON are yielded as None."""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+class Rejected:
+    """Rows skipped by an import: a count plus the first few reasons."""
+
+    MAX_REPORTED = 100
+
+    def __init__(self):
+        self.count = 0
+        self.errors = []  # [(line number, message)]
+
+    def add(self, line_number, message):
+        self.count += 1
+        if len(self.errors) < self.MAX_REPORTED:
+            self.errors.append((line_number, message))
+
+    def report(self):
+        """The reported errors as [{"line": n, "error": message}]."""
+        return [
+            {"line": line_number, "error": message}
+            for line_number, message in self.errors
+        ]
+
+
+def parse_product(row, quantities=FLOAT):
+    """Return (product name, stored quantity) of a row, or raise
+    ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError("malformed row")
+    name = row.get("product")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("missing product")
+    name = name.strip()
+    quantity = quantities.parse(row.get("quantity"), name)
+    if quantity is None:
+        raise ValueError("invalid quantity")
+    return name, quantity
+
+
+def valid_products(rows, rejected, quantities=FLOAT):
+    """Yield (product name, stored quantity) of the valid rows; the
+    others are recorded in ``rejected``."""
+    for line_number, row in rows:
+        try:
+            yield parse_product(row, quantities)
+        except ValueError as error:
+            rejected.add(line_number, str(error))
+
+
+def import_products(manager, warehouse_id, rows, rejected):
+    """Add the products of ``rows`` to one warehouse. Returns the number
+    of rows imported, or None if the warehouse does not exist."""
+    return manager.import_products(
+        warehouse_id, valid_products(rows, rejected, manager.quantities)
+    )
+
+
+def restore(manager, rows, rejected):
+    """Create a warehouse for each warehouse of a full export and import
+    its products. Returns the number of warehouses created."""
+    created = 0
+    for (source_id, name), group in groupby(rows, key=_warehouse_of):
+        if source_id is None or not name:
+            _reject_all(group, rejected, "missing warehouse")
+            continue
+        warehouse_id = manager.create_warehouse(name)
+        stocked = (item for item in group if item[1].get("product"))
+        manager.import_products(
+            warehouse_id, valid_products(stocked, rejected, manager.quantities)
+        )
+        created += 1
+    return created
+
+
+def _reject_all(rows, rejected, message):
+    for line_number, _ in rows:
+        rejected.add(line_number, message)
+
+
+def _warehouse_of(numbered_row):
+    row = numbered_row[1]
+    if not isinstance(row, dict):
+        return None, None
+    name = row.get("warehouse")
+    if not isinstance(name, str):
+        return row.get("warehouse_id"), None
+    return row.get("warehouse_id"), name.strip()
@@ -0,0 +1,283 @@
+"""Call counts and latency histograms, served in Prometheus text format.
+
+``init_app`` times every public ``Ohtuvarasto`` method, the queries of
+the indexes it serves, every Flask route and every template render,
+counts warehouses and products with an observer, and serves it all on
+``/metrics``. Recording one call costs
+two clock reads, a bisect and a short lock, so it can stay on in
+production. Set ``OHTUVARASTO_METRICS=false`` to leave it out entirely:
+nothing is wrapped or registered then, and ``/metrics`` is a 404.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from itertools import groupby
+from flask import (
+    Response, before_render_template, current_app, g, request,
+    template_rendered,
+)
+from observers import WarehouseObserver
+
+# Upper bounds in seconds, from 50 µs to 2.5 s.
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# Manager methods that are not timed: a context manager, and the
+# lookup of an index, whose queries are timed instead.
+UNTIMED = ("staged_batch", "index")
+
+
+def enabled():
+    """Whether metrics are on; OHTUVARASTO_METRICS=false turns them off."""
+    return os.environ.get("OHTUVARASTO_METRICS", "true").lower() != "false"
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus their count and sum."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # the last is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[position] += 1
+            self._sum += value
+
+    def collect(self):
+        """(cumulative bucket counts ending with +Inf, count, sum)."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, total
+
+
+class Registry:
+    """Histograms by metric name and labels, and gauges read at scrape."""
+
+    def __init__(self):
+        self._help = {}  # {name: (type, help text)}
+        self._histograms = {}  # {(name, labels): Histogram}
+        self._gauges = {}  # {name: function returning a number}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, **labels):
+        """The histogram of ``name`` with ``labels``, created on first use."""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                self._help.setdefault(name, ("histogram", help_text))
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def gauge(self, name, help_text, read):
+        with self._lock:
+            self._help[name] = ("gauge", help_text)
+            self._gauges[name] = read
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            gauges = sorted(self._gauges.items())
+        lines = []
+        for name, read in gauges:
+            lines += self._header(name) + [f"{name} {read()}"]
+        for name, group in groupby(histograms, key=lambda item: item[0][0]):
+            lines += self._header(name)
+            for (_, labels), histogram in group:
+                lines += _histogram_lines(name, labels, histogram)
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name):
+        kind, help_text = self._help[name]
+        return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _histogram_lines(name, labels, histogram):
+    cumulative, count, total = histogram.collect()
+    bounds = [repr(bound) for bound in histogram.buckets] + ["+Inf"]
+    lines = [
+        f"{name}_bucket{_labels(labels + (('le', bound),))} {running}"
+        for bound, running in zip(bounds, cumulative)
+    ]
+    lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+    lines.append(f"{name}_count{_labels(labels)} {count}")
+    return lines
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{key}="{_escape(str(value))}"' for key, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class InventoryCounts(WarehouseObserver):
+    """The number of warehouses and of (warehouse, product) entries."""
+
+    def __init__(self):
+        self.warehouses = 0
+        self.products = 0
+        self._lock = threading.Lock()
+
+    def warehouse_created(self, warehouse_id, name):
+        with self._lock:
+            self.warehouses += 1
+
+    def warehouse_deleted(self, warehouse_id, name):
+        with self._lock:
+            self.warehouses -= 1
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        change = (new is not None) - (old is not None)
+        if change:
+            with self._lock:
+                self.products += change
+
+
+def instrument_manager(manager, registry):
+    """Time every public method of ``manager`` by wrapping it in place."""
+    for name in dir(type(manager)):
+        method = getattr(type(manager), name)
+        if name.startswith("_") or name in UNTIMED or not callable(method):
+            continue
+        histogram = registry.histogram(
+            "ohtuvarasto_manager_seconds",
+            "Time spent in Ohtuvarasto methods.", method=name,
+        )
+        setattr(manager, name, _timed(getattr(manager, name), histogram))
+    manager.index = _timed_indexes(manager.index, registry)
+    _count_inventory(manager, registry)
+
+
+def _count_inventory(manager, registry):
+    counts = InventoryCounts()
+    manager.add_observer(counts)
+    registry.gauge("ohtuvarasto_warehouses", "Number of warehouses.",
+                   lambda: counts.warehouses)
+    registry.gauge("ohtuvarasto_products",
+                   "Number of products, counted once per warehouse.",
+                   lambda: counts.products)
+
+
+def _timed(function, histogram):
+    @wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return timed
+
+
+class _TimedIndex:  # pylint: disable=too-few-public-methods
+    """An index whose public methods are timed; other attributes are
+    read and set on the index itself."""
+
+    def __init__(self, index, histogram):
+        object.__setattr__(self, "_index", index)
+        # method name -> Histogram
+        object.__setattr__(self, "_histogram", histogram)
+
+    def __getattr__(self, name):
+        value = getattr(self._index, name)
+        if name.startswith("_") or not callable(value):
+            return value
+        timed = _timed(value, self._histogram(name))
+        object.__setattr__(self, name, timed)  # not asked for again
+        return timed
+
+    def __setattr__(self, name, value):
+        setattr(self._index, name, value)
+
+
+def _timed_indexes(index, registry):
+    """Wrap ``manager.index`` to return indexes with timed queries."""
+    wrapped = {}  # {name: (index, _TimedIndex)}
+
+    @wraps(index)
+    def timed_index(name):
+        target = index(name)
+        cached = wrapped.get(name)
+        if cached is None or cached[0] is not target:
+            cached = wrapped[name] = (target, _TimedIndex(
+                target, lambda method: registry.histogram(
+                    "ohtuvarasto_index_seconds",
+                    "Time spent in index queries.", index=name, method=method,
+                ),
+            ))
+        return cached[1]
+    return timed_index
+
+
+def init_app(app, manager):
+    """Instrument ``app`` and ``manager`` and serve ``/metrics``, unless
+    metrics are disabled."""
+    if not enabled():
+        return
+    registry = app.extensions["metrics"] = Registry()
+    instrument_manager(manager, registry)
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_record_render, app)
+    app.add_url_rule(
+        "/metrics", "metrics",
+        lambda: Response(registry.render(), mimetype="text/plain"),
+    )
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _record_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        _registry().histogram(
+            "ohtuvarasto_request_seconds", "Time spent handling requests.",
+            route=rule, method=request.method, status=response.status_code,
+        ).observe(time.perf_counter() - start)
+    return response
+
+
+def _start_render(_app, template, **_context):
+    g.setdefault("metrics_renders", []).append(
+        (template.name, time.perf_counter())
+    )
+
+
+def _record_render(_app, template, **_context):
+    renders = g.get("metrics_renders")
+    if not renders:
+        return
+    name, start = renders.pop()
+    _registry().histogram(
+        "ohtuvarasto_template_seconds", "Time spent rendering templates.",
+        template=name or template.name,
+    ).observe(time.perf_counter() - start)
+
+
+def _registry():
+    return current_app.extensions["metrics"]
@@ -0,0 +1,80 @@
+"""Observer hooks for keeping derived data in step with Ohtuvarasto.
+
+Indexes, caches and feeds subclass ``WarehouseObserver`` and register
+themselves with ``Ohtuvarasto.add_observer``. The manager calls the
+hooks after every change, while still holding the lock of the affected
+warehouse, so observers see the changes of one warehouse in order.
+Observers that span warehouses must guard their own state.
+
+The manager keeps its observers in ``Observers``. Its built-in indexes
+are registered there by name, and clients query them through
+``Ohtuvarasto.index``.
+
+Hooks are called inside ``changed_at``, so ``change_time`` gives the
+time of the change that is being reported. For changes replayed from a
+log, that is the time recorded with them, not the time of the replay.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+_change = threading.local()
+
+
+@contextmanager
+def changed_at(when=None):
+    """Make ``change_time`` return ``when``, or the current time if it is
+    None, on this thread inside the block; yields that time."""
+    previous = getattr(_change, "time", None)
+    _change.time = time.time() if when is None else when
+    try:
+        yield _change.time
+    finally:
+        _change.time = previous
+
+
+def change_time():
+    """The time of the change being applied on this thread, or the
+    current time outside of one."""
+    when = getattr(_change, "time", None)
+    return time.time() if when is None else when
+
+
+class WarehouseObserver:
+    """Receives every change made to an Ohtuvarasto. All hooks are no-ops."""
+
+    def warehouse_created(self, warehouse_id, name):
+        """A warehouse was created (or restored) with no products."""
+
+    def warehouse_renamed(self, warehouse_id, old_name, new_name):
+        """A warehouse was renamed."""
+
+    def warehouse_deleted(self, warehouse_id, name):
+        """A warehouse was deleted, after all of its products were removed."""
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        """A product quantity changed. None means the product is absent."""
+
+    def capacity_changed(self, warehouse_id, product_name, capacity):
+        """A warehouse capacity (product_name None) or a product capacity
+        was set. A capacity of None means unlimited."""
+
+
+class Observers:
+    """The observers of a manager in the order they are notified; the
+    built-in indexes among them can also be looked up by name."""
+
+    def __init__(self, indexes):
+        self._named = dict(indexes)
+        self.all = list(self._named.values())
+
+    def add(self, observer, name=None):
+        """Notify ``observer`` too, after the ones added before it."""
+        if name is not None:
+            self._named[name] = observer
+        self.all.append(observer)
+
+    def get(self, name):
+        """The index registered as ``name``; KeyError if there is none."""
+        return self._named[name]
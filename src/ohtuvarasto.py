@@ -1,87 +1,591 @@
 """Ohtuvarasto - A warehouse manager for managing multiple warehouses with products."""
 
+import threading
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from types import MappingProxyType
+from batch import (
+    SingleTransfers, StagedBatch, transfer_error, transfer_warehouses
+)
+from alerts import StockAlerts
+from capacity import CapacityIndex, clamp_add, clamp_set
+from feed import ChangeFeed
+from history import StockHistory
+from quantities import FLOAT
+from search import ProductSearch
+from indexes import IdAllocator, ProductIndex, Versions, WarehouseListing
+from observers import Observers, change_time, changed_at
 
-class Ohtuvarasto:
-    """Manages multiple warehouses, each containing products with quantities."""
 
-    def __init__(self):
-        self._warehouses = {}  # {warehouse_id: {"name": str, "products": {product_name: quantity}}}
-        self._next_id = 1
+class Ohtuvarasto(SingleTransfers):
+    """Manages multiple warehouses, each containing products with quantities.
+
+    Every mutation goes through ``_mutate``, which applies it with the
+    matching ``_apply_<operation>`` method and, when a storage backend is
+    given, records it in the backend's write-ahead log. On startup the
+    latest snapshot is loaded and only the log tail after it is replayed.
+
+    The manager is safe to share between threads. Each warehouse is
+    guarded by one of ``LOCK_STRIPES`` locks chosen by its ID, so writes
+    to different warehouses rarely wait for each other; only snapshots
+    and observer registration take every lock.
+
+    With a storage shared by several processes (``SqliteStorage``) every
+    mutation runs in a storage transaction after catching up with the
+    other processes, and every read first replays their new records.
+
+    Derived data is kept up to date by observers (see ``observers``);
+    every product change is reported to them through ``_set_product``
+    and ``_unset_product``. The built-in ones are indexes that clients
+    read through ``index(name)``:
+
+    * "ids": the ``IdAllocator`` of warehouse IDs (``next_id``);
+    * "listing": sorted, filtered pages of warehouses;
+    * "products": the warehouses holding a product and its total;
+    * "capacity": free space and the warehouses with room;
+    * "versions": change counters, for caches;
+    * "feed": numbered change events, to follow updates incrementally;
+    * "search": product names by prefix and substring;
+    * "history": the quantities over time, at the times of the changes,
+      which the log records keep for replays;
+    * "alerts": reorder points and fill-ratio rules, which raise alerts
+      on every change (see ``alerts``).
+
+    ``get_products`` hands out read-only views instead of copies. The
+    products dict behind a view is never written again: the next write
+    to that warehouse copies it first, so a view stays a consistent
+    snapshot and the copy is paid once per write after a read rather
+    than on every read.
+
+    ``quantities`` tells the front ends how quantities are represented
+    (see ``quantities``). The manager never converts them, and with
+    ``FixedQuantities`` all of its arithmetic is on integers.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, storage=None, quantities=FLOAT):
+        # {warehouse_id: {"name": str, "products": {product_name: quantity},
+        #                 "capacity": float or None,
+        #                 "product_capacities": {product_name: float}}}
+        self._warehouses = {}
+        self._ids = IdAllocator()
+        self._shared = set()  # warehouses whose products dict has a view
+        self._storage, self.quantities = storage, quantities
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._observers = Observers(self._built_in_indexes())
+        self._recover()
 
     def create_warehouse(self, name):
         """Create a new warehouse with the given name. Returns warehouse ID."""
-        warehouse_id = self._next_id
-        self._warehouses[warehouse_id] = {"name": name, "products": {}}
-        self._next_id += 1
+        with self._writing():
+            warehouse_id = self._ids.allocate()
+            self._mutate("create_warehouse", warehouse_id, name)
         return warehouse_id
 
+    def restore_warehouse(self, warehouse_id, warehouse):
+        """Create a warehouse with a given ID and the name, products and
+        capacities of ``warehouse``, a dict as returned by
+        ``get_warehouse``. Products are stored as is, without clamping.
+
+        Returns False if a warehouse with the ID already exists.
+        """
+        return self._mutate(
+            "restore_warehouse", warehouse_id, warehouse["name"],
+            dict(warehouse.get("products", {})),
+            [list(capacity) for capacity in _capacities(warehouse)],
+        )
+
     def get_warehouse(self, warehouse_id):
         """Get warehouse details by ID. Returns None if not found."""
+        self._refresh()
         return self._warehouses.get(warehouse_id)
 
     def get_all_warehouses(self):
         """Get all warehouses as a list of (id, warehouse_data) tuples."""
-        return [(wid, data) for wid, data in self._warehouses.items()]
+        self._refresh()
+        return list(self._warehouses.items())
+
+    def index(self, name):
+        """Get a built-in index by name, caught up with the data; see the
+        class docstring for the names. KeyError if there is none."""
+        self._refresh()
+        return self._observers.get(name)
+
+    def set_capacity(self, warehouse_id, capacity, product_name=None):
+        """Limit a warehouse's total stock, or one product's stock in it.
+
+        A capacity of None removes the limit. Returns True if successful.
+        """
+        return self._mutate(
+            "set_capacity", warehouse_id, capacity, product_name
+        )
 
     def update_warehouse_name(self, warehouse_id, new_name):
         """Update the name of a warehouse. Returns True if successful."""
-        if warehouse_id in self._warehouses:
-            self._warehouses[warehouse_id]["name"] = new_name
-            return True
-        return False
+        return self._mutate("update_warehouse_name", warehouse_id, new_name)
 
     def delete_warehouse(self, warehouse_id):
         """Delete a warehouse. Returns True if successful."""
-        if warehouse_id in self._warehouses:
-            del self._warehouses[warehouse_id]
-            return True
-        return False
+        return self._mutate("delete_warehouse", warehouse_id)
 
     def add_product(self, warehouse_id, product_name, quantity):
         """Add a product to a warehouse. Returns True if successful."""
+        return self._mutate("add_product", warehouse_id, product_name, quantity)
+
+    def import_products(self, warehouse_id, products, chunk_size=1000):
+        """Add many (product_name, quantity) pairs to a warehouse.
+
+        A bulk form of ``add_product`` for imports: the pairs must already
+        be validated, and are applied in chunks that each take the lock
+        and write a log record once. ``products`` may be any iterable and
+        is consumed lazily. Returns the number of pairs added, or None if
+        the warehouse does not exist.
+        """
+        products = iter(products)
+        added = 0
+        while True:
+            chunk = list(islice(products, chunk_size))
+            if not chunk:
+                return added
+            if not self._mutate("add_products", warehouse_id, chunk):
+                return None
+            added += len(chunk)
+
+    def get_products(self, warehouse_id):
+        """Get all products in a warehouse as a read-only mapping of
+        {name: quantity}. Later changes do not show up in it."""
+        self._refresh()
+        with self._lock_for(warehouse_id):
+            warehouse = self._warehouses.get(warehouse_id)
+            if warehouse:
+                self._shared.add(warehouse_id)
+                return MappingProxyType(warehouse["products"])
+        return None
+
+    def remove_product(self, warehouse_id, product_name):
+        """Remove a product from a warehouse. Returns True if successful."""
+        return self._mutate("remove_product", warehouse_id, product_name)
+
+    def update_product_quantity(self, warehouse_id, product_name, new_quantity):
+        """Update the quantity of a product. Returns True if successful."""
+        return self._mutate(
+            "update_product_quantity", warehouse_id, product_name, new_quantity
+        )
+
+    def clear_warehouse(self, warehouse_id):
+        """Clear all products from a warehouse. Returns True if successful."""
+        return self._mutate("clear_warehouse", warehouse_id)
+
+    def apply_batch(self, operations):
+        """Apply a list of product operations atomically.
+
+        Returns (applied, errors): errors has one entry per operation,
+        None when it was valid. If any operation is invalid nothing is
+        applied. See the ``batch`` module for the operation format.
+        """
+        with self.staged_batch(operations) as (errors, commit):
+            if any(errors):
+                return False, errors
+            commit()
+        self._maybe_snapshot()
+        return True, errors
+
+    @contextmanager
+    def staged_batch(self, operations):
+        """Validate a batch while holding the locks of its warehouses.
+
+        Yields (errors, commit) as in ``apply_batch``; calling ``commit()``
+        inside the block applies the batch. This lets a caller apply
+        several batches, on several managers, only if all are valid.
+        """
+        operations = list(operations)
+        warehouse_ids = {
+            op.get("warehouse_id") for op in operations
+            if isinstance(op, dict) and isinstance(op.get("warehouse_id"), int)
+        }
+        with self._writing(), self._locked(warehouse_ids):
+            batch = StagedBatch(self._warehouses)
+            errors = [batch.stage(operation) for operation in operations]
+
+            def commit():
+                with changed_at() as when:
+                    self._commit_batch(batch)
+                    self._log("batch", (operations,), when)
+
+            yield errors, commit
+
+    def transfer_order(self, lines):
+        """Apply a list of transfers atomically, in order.
+
+        Returns (moved, errors): errors has one entry per line, None when
+        it was valid. If any line is invalid nothing moves and moved is
+        None, else moved has the quantity each line moved. See the
+        ``batch`` module for the line format.
+
+        As in ``Varasto.ota_varastosta``, asking for more than the source
+        holds moves all of it, leaving the product there at 0; each move
+        is also limited to the room for the product in the target.
+        """
+        lines = list(lines)
+        with self._writing(), self._locked(transfer_warehouses(lines)), \
+                changed_at() as when:
+            errors = [transfer_error(line, self._warehouses) for line in lines]
+            if any(errors):
+                return None, errors
+            moved = self._apply_transfers(lines)
+            self._log("transfers", ([
+                dict(line, quantity=quantity)
+                for line, quantity in zip(lines, moved)
+            ],), when)
+        self._maybe_snapshot()
+        return moved, errors
+
+    def add_observer(self, observer):
+        """Register an observer and feed it the current state."""
+        self._add_observer(observer)
+
+    def snapshot(self):
+        """Write a compacted snapshot of all warehouses to the storage."""
+        if self._storage is None:
+            return
+        with self._writing(), self._all_locked():
+            self._storage.write_snapshot(self._dump_state())
+
+    def close(self):
+        """Flush any log records that are still waiting for fsync."""
+        if self._storage is not None:
+            self._storage.close()
+
+    def _built_in_indexes(self):
+        products = ProductIndex()
+        return {
+            "ids": self._ids,
+            "listing": WarehouseListing(self._warehouses.get),
+            "products": products,
+            "capacity": CapacityIndex(self._quantity_of),
+            "versions": Versions(),
+            "search": ProductSearch(),
+            "feed": ChangeFeed(number=self.quantities.number),
+            "alerts": StockAlerts(products, self._mutate),
+            "history": StockHistory(typecode=self.quantities.typecode),
+        }
+
+    def _add_observer(self, observer, index_name=None):
+        with self._all_locked():
+            self._observers.add(observer, index_name)
+            for warehouse_id, warehouse in self._warehouses.items():
+                observer.warehouse_created(warehouse_id, warehouse["name"])
+                for name, quantity in warehouse["products"].items():
+                    observer.product_changed(warehouse_id, name, None, quantity)
+                for name, capacity in _capacities(warehouse):
+                    observer.capacity_changed(warehouse_id, name, capacity)
+
+    def _lock_for(self, warehouse_id):
+        return self._locks[hash(warehouse_id) % self.LOCK_STRIPES]
+
+    @contextmanager
+    def _locked(self, warehouse_ids):
+        """Hold the locks of several warehouses, in a deadlock-free order."""
+        stripes = {hash(wid) % self.LOCK_STRIPES for wid in warehouse_ids}
+        with ExitStack() as stack:
+            for stripe in sorted(stripes):
+                stack.enter_context(self._locks[stripe])
+            yield
+
+    @contextmanager
+    def _all_locked(self):
+        """Hold every warehouse lock, always acquired in the same order."""
+        with ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
+
+    @contextmanager
+    def _writing(self):
+        """Hold the storage's write transaction, caught up with the log."""
+        if self._storage is None:
+            yield
+            return
+        with self._storage.transaction():
+            self._storage.catch_up(self._replay)
+            yield
+
+    def _refresh(self):
+        """Replay what other processes sharing the storage have written."""
+        if self._storage is not None:
+            self._storage.catch_up(self._replay)
+
+    def _mutate(self, operation, warehouse_id, *args):
+        """Apply a mutation under its warehouse lock and log it."""
+        with self._writing(), self._lock_for(warehouse_id), \
+                changed_at() as when:
+            apply = getattr(self, "_apply_" + operation)
+            if not apply(warehouse_id, *args):
+                return False
+            self._log(operation, (warehouse_id, *args), when)
+        self._maybe_snapshot()
+        return True
+
+    def _log(self, operation, args, when):
+        if self._storage is not None:
+            self._storage.append(operation, args, when)
+
+    def _maybe_snapshot(self):
+        if self._storage is not None and self._storage.needs_snapshot():
+            self.snapshot()
+
+    def _recover(self):
+        """Load the latest snapshot and replay the log written after it."""
+        if self._storage is not None:
+            self._replay(*self._storage.load())
+
+    def _replay(self, state, records):
+        """Load a snapshot, if given, and apply log records after it.
+
+        The records already raised their alerts where they were made, so
+        alerts are muted meanwhile. Each change is reported to the
+        observers at the time stored with it; records of older logs have
+        none and get the current time.
+        """
+        alerts = self._observers.get("alerts")
+        with self._all_locked(), alerts.debouncer.muted():
+            if state is not None:
+                for warehouse_id in list(self._warehouses):
+                    self._apply_delete_warehouse(warehouse_id)
+                with changed_at(state.get("time")):
+                    self._load_state(state)
+            for record in records:
+                with changed_at(record.get("time")):
+                    getattr(self, "_apply_" + record["op"])(*record["args"])
+
+    def _dump_state(self):
+        warehouses = [
+            [wid, data["name"], data["products"], list(_capacities(data))]
+            for wid, data in self._warehouses.items()
+        ]
+        return {
+            "next_id": self._ids.next_id, "warehouses": warehouses,
+            "rules": self._observers.get("alerts").rules(),
+            "time": change_time(),
+        }
+
+    def _load_state(self, state):
+        self._ids.skip_to(state["next_id"])
+        for warehouse_id, name, products, *limits in state["warehouses"]:
+            self._apply_restore_warehouse(
+                warehouse_id, name, products, limits[0] if limits else ()
+            )
+        self._load_rules(state.get("rules", ()))
+
+    def _load_rules(self, rules):
+        """Replace the alert rules with those of a snapshot. The rules of
+        single warehouses went with them; this removes the others."""
+        for operation, warehouse_id, *args in (
+            self._observers.get("alerts").rules()
+        ):
+            getattr(self, "_apply_" + operation)(warehouse_id, *args[:-1], None)
+        for operation, *args in rules:
+            getattr(self, "_apply_" + operation)(*args)
+
+    def _quantity_of(self, warehouse_id, product_name):
+        return self._warehouses[warehouse_id]["products"].get(product_name)
+
+    def _room_for(self, warehouse_id, product_name):
+        return self._observers.get("capacity").room_for(
+            warehouse_id, product_name
+        )
+
+    def _limited(self, warehouse_id, product_name, quantity):
+        """Clamp a new quantity of a product to the capacities."""
+        current = self._quantity_of(warehouse_id, product_name) or 0
+        room = self._room_for(warehouse_id, product_name)
+        return clamp_set(current + room, quantity)
+
+    def _notify(self, hook, *args):
+        for observer in self._observers.all:
+            getattr(observer, hook)(*args)
+
+    def _writable_products(self, warehouse_id):
+        """The products dict of a warehouse, copied first if it has a view."""
+        warehouse = self._warehouses[warehouse_id]
+        if warehouse_id in self._shared:
+            self._shared.discard(warehouse_id)
+            warehouse["products"] = dict(warehouse["products"])
+        return warehouse["products"]
+
+    def _set_product(self, warehouse_id, product_name, quantity):
+        products = self._writable_products(warehouse_id)
+        old = products.get(product_name)
+        products[product_name] = quantity
+        self._notify(
+            "product_changed", warehouse_id, product_name, old, quantity
+        )
+
+    def _unset_product(self, warehouse_id, product_name):
+        if product_name not in self._warehouses[warehouse_id]["products"]:
+            return
+        old = self._writable_products(warehouse_id).pop(product_name)
+        self._notify("product_changed", warehouse_id, product_name, old, None)
+
+    def _clear_products(self, warehouse_id):
+        warehouse = self._warehouses[warehouse_id]
+        products, warehouse["products"] = warehouse["products"], {}
+        self._shared.discard(warehouse_id)
+        for product_name, old in products.items():
+            self._notify(
+                "product_changed", warehouse_id, product_name, old, None
+            )
+
+    def _commit_batch(self, batch):
+        for warehouse_id in batch.cleared:
+            self._clear_products(warehouse_id)
+        for warehouse_id, product_name, quantity in batch.changes():
+            if quantity is None:
+                self._unset_product(warehouse_id, product_name)
+            else:
+                quantity = self._limited(warehouse_id, product_name, quantity)
+                self._set_product(warehouse_id, product_name, quantity)
+
+    def _apply_batch(self, operations):
+        batch = StagedBatch(self._warehouses)
+        for operation in operations:
+            batch.stage(operation)
+        self._commit_batch(batch)
+        return True
+
+    def _apply_transfers(self, lines):
+        return [self._transfer(line) for line in lines]
+
+    def _transfer(self, line):
+        source_id, target_id = line["from"], line["to"]
+        name = line["product"]
+        available = self._quantity_of(source_id, name) or 0
+        room = self._room_for(target_id, name)
+        moved = min(line["quantity"], available, room)
+        if moved > 0:
+            self._set_product(source_id, name, available - moved)
+            self._add(target_id, name, moved)
+        return moved
+
+    def _apply_create_warehouse(self, warehouse_id, name):
+        self._warehouses[warehouse_id] = {
+            "name": name, "products": {},
+            "capacity": None, "product_capacities": {},
+        }
+        self._notify("warehouse_created", warehouse_id, name)
+        return True
+
+    def _apply_restore_warehouse(self, warehouse_id, name, products,
+                                 capacities):
+        if warehouse_id in self._warehouses:
+            return False
+        self._apply_create_warehouse(warehouse_id, name)
+        for product_name, quantity in products.items():
+            self._set_product(warehouse_id, product_name, quantity)
+        for product_name, capacity in capacities:
+            self._apply_set_capacity(warehouse_id, capacity, product_name)
+        return True
+
+    def _apply_update_warehouse_name(self, warehouse_id, new_name):
+        warehouse = self._warehouses.get(warehouse_id)
+        if warehouse is None:
+            return False
+        old_name, warehouse["name"] = warehouse["name"], new_name
+        self._notify("warehouse_renamed", warehouse_id, old_name, new_name)
+        return True
+
+    def _apply_delete_warehouse(self, warehouse_id):
+        if warehouse_id not in self._warehouses:
+            return False
+        self._clear_products(warehouse_id)
+        warehouse = self._warehouses.pop(warehouse_id)
+        self._notify("warehouse_deleted", warehouse_id, warehouse["name"])
+        return True
+
+    def _apply_add_product(self, warehouse_id, product_name, quantity):
         if warehouse_id not in self._warehouses:
             return False
         if quantity < 0:
             return False
-        products = self._warehouses[warehouse_id]["products"]
-        if product_name in products:
-            products[product_name] += quantity
-        else:
-            products[product_name] = quantity
+        self._add(warehouse_id, product_name, quantity)
         return True
 
-    def get_products(self, warehouse_id):
-        """Get all products in a warehouse. Returns dict of {name: quantity}."""
-        warehouse = self._warehouses.get(warehouse_id)
-        if warehouse:
-            return warehouse["products"].copy()
-        return None
+    def _apply_add_products(self, warehouse_id, products):
+        if warehouse_id not in self._warehouses:
+            return False
+        for product_name, quantity in products:
+            self._add(warehouse_id, product_name, quantity)
+        return True
 
-    def remove_product(self, warehouse_id, product_name):
-        """Remove a product from a warehouse. Returns True if successful."""
+    def _add(self, warehouse_id, product_name, quantity):
+        room = self._room_for(warehouse_id, product_name)
+        added = clamp_add(room, quantity)
+        current = self._quantity_of(warehouse_id, product_name)
+        if current is not None:
+            added += current
+        self._set_product(warehouse_id, product_name, added)
+
+    def _apply_remove_product(self, warehouse_id, product_name):
         if warehouse_id not in self._warehouses:
             return False
         products = self._warehouses[warehouse_id]["products"]
         if product_name in products:
-            del products[product_name]
+            self._unset_product(warehouse_id, product_name)
             return True
         return False
 
-    def update_product_quantity(self, warehouse_id, product_name, new_quantity):
-        """Update the quantity of a product. Returns True if successful."""
+    def _apply_update_product_quantity(
+        self, warehouse_id, product_name, new_quantity
+    ):
         if warehouse_id not in self._warehouses:
             return False
         if new_quantity < 0:
             return False
         products = self._warehouses[warehouse_id]["products"]
         if product_name in products:
-            products[product_name] = new_quantity
+            quantity = self._limited(warehouse_id, product_name, new_quantity)
+            self._set_product(warehouse_id, product_name, quantity)
             return True
         return False
 
-    def clear_warehouse(self, warehouse_id):
-        """Clear all products from a warehouse. Returns True if successful."""
+    def _apply_clear_warehouse(self, warehouse_id):
         if warehouse_id in self._warehouses:
-            self._warehouses[warehouse_id]["products"] = {}
+            self._clear_products(warehouse_id)
             return True
         return False
+
+    def _apply_set_reorder_point(self, warehouse_id, product_name, level):
+        if warehouse_id is not None and warehouse_id not in self._warehouses:
+            return False
+        self._observers.get("alerts").low.set_point(
+            product_name, level, warehouse_id
+        )
+        return True
+
+    def _apply_set_fill_alert(self, warehouse_id, ratio):
+        if warehouse_id not in self._warehouses:
+            return False
+        self._observers.get("alerts").fill.set_ratio(warehouse_id, ratio)
+        return True
+
+    def _apply_set_capacity(self, warehouse_id, capacity, product_name):
+        warehouse = self._warehouses.get(warehouse_id)
+        if warehouse is None:
+            return False
+        if product_name is None:
+            warehouse["capacity"] = capacity
+        elif capacity is None:
+            warehouse["product_capacities"].pop(product_name, None)
+        else:
+            warehouse["product_capacities"][product_name] = capacity
+        self._notify("capacity_changed", warehouse_id, product_name, capacity)
+        return True
+
+
+def _capacities(warehouse):
+    """(product_name, capacity) pairs of a warehouse; None names the
+    warehouse's own capacity."""
+    if warehouse.get("capacity") is not None:
+        yield None, warehouse["capacity"]
+    yield from warehouse.get("product_capacities", {}).items()
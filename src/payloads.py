@@ -0,0 +1,39 @@
+"""Checks of JSON request bodies, shared by the API front ends.
+
+``api`` (Flask) and ``asgi`` take the same requests and must reject the
+same ones in the same way. Both pass the decoded body to these
+functions, and both answer with the (body, status) pairs of ``error``,
+which a Flask view can return as is.
+"""
+
+
+def field(payload, key):
+    """A field of a JSON object body, or None."""
+    if isinstance(payload, dict):
+        return payload.get(key)
+    return None
+
+
+def quantity(payload, quantities, key="quantity", product=None):
+    """Read a non-negative number from the body as a stored quantity of
+    ``quantities``, or None."""
+    value = field(payload, key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return quantities.parse(value, product)
+
+
+def name(payload):
+    """The stripped, non-empty "name" of the body, or None."""
+    value = field(payload, "name")
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+
+def error(message, status):
+    return {"error": message}, status
+
+
+def not_found():
+    return error("Warehouse not found.", 404)
@@ -0,0 +1,126 @@
+"""How Ohtuvarasto quantities are represented.
+
+By default quantities are floats. ``FixedQuantities`` stores them as
+integers counting units of ``10 ** -digits`` instead, so that sums,
+clamps and comparisons in ``Varasto`` and ``Ohtuvarasto`` are integer
+operations: exact however many there are, and about as cheap as float
+ones (see ``benchmarks.quantities``). A product may be given fewer
+digits, and its quantities are then rounded to that precision.
+
+The manager itself never converts. The front ends read input with
+``parse`` and show stored values with ``number`` (JSON) or ``text``
+(HTML). Stored values are logged as they are, so a data directory must
+keep the representation it was created with.
+"""
+
+import math
+import os
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+
+
+class FloatQuantities:
+    """Quantities as plain numbers, the default."""
+
+    typecode = "d"  # of an ``array`` holding quantities
+
+    def parse(self, value, product=None):  # pylint: disable=unused-argument
+        """A non-negative, finite quantity from a number or text, else None."""
+        if isinstance(value, str):
+            try:
+                value = float(value)
+            except ValueError:
+                return None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return value if math.isfinite(value) and value >= 0 else None
+
+    def number(self, stored):
+        return stored
+
+    def text(self, stored):
+        return str(stored)
+
+
+class FixedQuantities:
+    """Quantities as integer units of ``10 ** -digits``.
+
+    ``product_digits`` maps product names to fewer digits; input for
+    those products is rounded to that many, half to even.
+    """
+
+    typecode = "q"
+
+    def __init__(self, digits=3, product_digits=None):
+        self.digits = digits
+        self.product_digits = dict(product_digits or {})
+        if any(d > digits or d < 0 for d in self.product_digits.values()):
+            raise ValueError(f"product digits must be within 0..{digits}")
+        self._unit = 10 ** digits
+
+    def parse(self, value, product=None):
+        """The units of a non-negative quantity given as a number or
+        text, or None if it is not one."""
+        if isinstance(value, bool) \
+                or not isinstance(value, (int, float, str, Decimal)):
+            return None
+        try:
+            exact = Decimal(repr(value) if isinstance(value, float) else value)
+            if not exact.is_finite() or exact < 0:
+                return None
+            digits = self.product_digits.get(product, self.digits)
+            rounded = exact.scaleb(digits).to_integral_value(ROUND_HALF_EVEN)
+        except InvalidOperation:
+            return None
+        return int(rounded) * 10 ** (self.digits - digits)
+
+    def number(self, stored):
+        """Units as the nearest float, which prints as the exact decimal
+        for up to 15 significant digits."""
+        if not isinstance(stored, int):
+            return stored  # unlimited room is infinity
+        return stored if self.digits == 0 else stored / self._unit
+
+    def text(self, stored):
+        """Units as an exact decimal, without trailing zeros."""
+        if not isinstance(stored, int) or self.digits == 0:
+            return str(stored)
+        whole, fraction = divmod(stored, self._unit)
+        fraction = f"{fraction:0{self.digits}d}".rstrip("0")
+        return f"{whole}.{fraction}" if fraction else str(whole)
+
+
+FLOAT = FloatQuantities()
+
+
+def parse_lines(quantities, lines):
+    """JSON batch operations or transfer lines with their numeric
+    "quantity" parsed; an invalid one becomes None, and anything else is
+    left as it is for the validators of the ``batch`` module to reject."""
+    parsed = []
+    for line in lines:
+        value = line.get("quantity") if isinstance(line, dict) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            product = line.get("product")
+            line = dict(line, quantity=quantities.parse(
+                value, product if isinstance(product, str) else None
+            ))
+        parsed.append(line)
+    return parsed
+
+
+def quantities_from_env():
+    """The representation configured by the environment.
+
+    OHTUVARASTO_QUANTITY_DIGITS turns on fixed-point quantities with that
+    many decimal digits; OHTUVARASTO_PRODUCT_DIGITS lists products with
+    fewer, e.g. "Screws=0,Paint=2".
+    """
+    digits = os.environ.get("OHTUVARASTO_QUANTITY_DIGITS")
+    if not digits:
+        return FLOAT
+    product_digits = {}
+    for item in os.environ.get("OHTUVARASTO_PRODUCT_DIGITS", "").split(","):
+        name, _, value = item.rpartition("=")
+        if name.strip():
+            product_digits[name.strip()] = int(value)
+    return FixedQuantities(int(digits), product_digits)
@@ -0,0 +1,138 @@
+"""Search of product names by prefix and by substring.
+
+``ProductSearch`` is an observer that keeps the names of the products
+held by any warehouse in two indexes, ignoring case:
+
+* a ``SortedIndex`` of the names, where the names starting with a
+  prefix are one bisected range, and
+* an inverted index from every bigram and trigram (two and three
+  consecutive characters) to the names containing it. A substring of
+  three or more characters can only occur in the names holding all of
+  its trigrams, so only those are checked; two characters are a bigram.
+
+Results list the names starting with the query first, then the other
+names containing it, each group in alphabetical order. A query whose
+rarest n-gram is common would gather most of the names, so it walks the
+sorted names instead and stops at ``limit`` matches; so do queries of
+one character.
+"""
+
+import heapq
+import threading
+from itertools import islice
+from indexes import SortedIndex, prefix_bounds
+from observers import WarehouseObserver
+
+GRAMS = (2, 3)
+
+# An n-gram held by more than this share of the names is not selective:
+# scanning the names in order finds ``limit`` matches sooner.
+COMMON = 1 / 16
+
+
+def fold(text):
+    return text.casefold()
+
+
+def rank(query, name):
+    """The sort key of a matching name: prefix matches first."""
+    folded = fold(name)
+    return not folded.startswith(fold(query)), folded, name
+
+
+def _grams(folded, size):
+    return {folded[i:i + size] for i in range(len(folded) - size + 1)}
+
+
+def _all_grams(folded):
+    return set().union(*(_grams(folded, size) for size in GRAMS))
+
+
+class ProductSearch(WarehouseObserver):
+    """Prefix and substring search over the names of held products."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._holders = {}  # {product_name: number of warehouses}
+        self._sorted = SortedIndex()  # (folded name, name)
+        self._postings = {}  # {n-gram: {(folded name, name)}}
+
+    def __len__(self):
+        return len(self._holders)
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        change = (new is not None) - (old is not None)
+        if not change:
+            return
+        with self._lock:
+            holders = self._count(product_name, change)
+            if holders == 1 and change == 1:
+                self._add(product_name)
+            elif not holders:
+                self._remove(product_name)
+
+    def _count(self, name, change):
+        """Add ``change`` to the holders of ``name``; returns the new count."""
+        holders = self._holders.pop(name, 0) + change
+        if holders:
+            self._holders[name] = holders
+        return holders
+
+    def _add(self, name):
+        key = (fold(name), name)
+        self._sorted.add(key)
+        for gram in _all_grams(key[0]):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, name):
+        key = (fold(name), name)
+        self._sorted.remove(key)
+        for gram in _all_grams(key[0]):
+            postings = self._postings[gram]
+            postings.discard(key)
+            if not postings:
+                del self._postings[gram]
+
+    def search(self, query, limit=20):
+        """Up to ``limit`` product names containing ``query``, ignoring
+        case, in ``rank`` order."""
+        query = fold(query)
+        if not query or limit <= 0:
+            return []
+        with self._lock:
+            start, end = self._sorted.bounds(*prefix_bounds(query))
+            found = [name for _, name in self._sorted.slice(
+                start, min(end, start + limit)
+            )]
+            if len(found) < limit:
+                found += self._containing(query, limit - len(found))
+        return found
+
+    def _containing(self, query, limit):
+        """Names containing, but not starting with, ``query``."""
+        candidates = self._candidates(query)
+        if candidates is None:
+            found = islice(_matches(query, self._sorted), limit)
+        else:
+            found = heapq.nsmallest(limit, _matches(query, candidates))
+        return [name for _, name in found]
+
+    def _candidates(self, query):
+        """The keys of the rarest n-gram of ``query``, or None if there
+        is none or it is common."""
+        if len(query) < GRAMS[0]:
+            return None
+        candidates = min(
+            (self._postings.get(gram, ())
+             for gram in _grams(query, min(len(query), GRAMS[-1]))),
+            key=len,
+        )
+        if len(candidates) > COMMON * len(self._holders):
+            return None
+        return candidates
+
+
+def _matches(query, keys):
+    for key in keys:
+        if query in key[0] and not key[0].startswith(query):
+            yield key
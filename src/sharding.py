@@ -0,0 +1,685 @@
+"""Spreading warehouses over several Ohtuvarasto shards.
+
+``ShardedOhtuvarasto`` has the public API of ``Ohtuvarasto``, except
+``staged_batch``, and routes every warehouse to one shard by consistent
+hashing of its ID, so adding a shard only moves the warehouses that the
+new shard takes over. IDs come from one ``IdAllocator`` and never
+collide between shards.
+
+Shards are ``Ohtuvarasto`` instances, each with its own storage, so data
+size and write throughput grow with the number of shards.
+"""
+
+import hashlib
+import heapq
+import threading
+from bisect import bisect
+from contextlib import ExitStack, contextmanager
+from functools import partial
+from itertools import islice
+from typing import Callable, NamedTuple
+from batch import SingleTransfers, transfer_error, transfer_warehouses
+from capacity import UNLIMITED
+from indexes import IdAllocator, WarehousePage, WarehouseQuery
+from observers import WarehouseObserver
+from search import rank
+
+
+def _hash(key):
+    digest = hashlib.md5(str(key).encode(), usedforsecurity=False).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing with ``replicas`` virtual points per node."""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self._points = []  # sorted [(hash, node)]
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        points = [(_hash(f"{node}#{i}"), node) for i in range(self.replicas)]
+        self._points = sorted(self._points + points)
+
+    def node_for(self, key):
+        """The node owning ``key``: the first point clockwise from it."""
+        if not self._points:
+            raise LookupError("the ring has no nodes")
+        position = bisect(self._points, (_hash(key),))
+        return self._points[position % len(self._points)][1]
+
+
+class _MoveGate:
+    """Lets operations run concurrently, but not while a warehouse moves
+    between shards. Waiting moves go before new operations. ``moving`` is
+    the ID of the warehouse being moved, and ``moves`` counts the moved
+    warehouses, for the versions."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._active = 0
+        self._holding = False
+        self.moving = None
+        self.moves = 0
+
+    @contextmanager
+    def operation(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._holding)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def move(self, warehouse_id=None):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._holding)
+            self._holding = True
+            self._condition.wait_for(lambda: self._active == 0)
+        self.moving = warehouse_id
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._condition:
+            self.moving = None
+            self._holding = False
+            self._condition.notify_all()
+
+
+class _ShardObserver(WarehouseObserver):
+    """Passes the hooks of one shard on to an observer of the sharded
+    manager, except those of the warehouse moving between shards: its
+    restore on the new shard and delete from the old one do not change
+    the sharded manager's data."""
+
+    def __init__(self, observer, gate):
+        self._observer = observer
+        self._gate = gate
+
+    def warehouse_created(self, warehouse_id, name):
+        if warehouse_id != self._gate.moving:
+            self._observer.warehouse_created(warehouse_id, name)
+
+    def warehouse_renamed(self, warehouse_id, old_name, new_name):
+        if warehouse_id != self._gate.moving:
+            self._observer.warehouse_renamed(warehouse_id, old_name, new_name)
+
+    def warehouse_deleted(self, warehouse_id, name):
+        if warehouse_id != self._gate.moving:
+            self._observer.warehouse_deleted(warehouse_id, name)
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        if warehouse_id != self._gate.moving:
+            self._observer.product_changed(warehouse_id, product_name, old, new)
+
+    def capacity_changed(self, warehouse_id, product_name, capacity):
+        if warehouse_id != self._gate.moving:
+            self._observer.capacity_changed(
+                warehouse_id, product_name, capacity
+            )
+
+
+def _call_all(functions):
+    for function in functions:
+        function()
+
+
+def _copy_warehouse(source, target, warehouse_id):
+    """Restore a warehouse of ``source`` on ``target``, with its alert
+    rules and history; False if there is no such warehouse. The alerts
+    it already raised on ``source`` are not raised again."""
+    warehouse = source.get_warehouse(warehouse_id)
+    if warehouse is None:
+        return False
+    with target.index("alerts").debouncer.muted():
+        target.restore_warehouse(warehouse_id, warehouse)
+        _copy_rules(source, target, warehouse_id)
+    target.index("history").adopt(
+        warehouse_id, source.index("history").export(warehouse_id)
+    )
+    return True
+
+
+def _copy_rules(source, target, warehouse_id):
+    source, target = source.index("alerts"), target.index("alerts")
+    for name, point, wid in source.low.rules():
+        if wid == warehouse_id:
+            target.set_reorder_point(name, point, wid)
+    for wid, ratio in source.fill.rules():
+        if wid == warehouse_id:
+            target.set_fill_alert(wid, ratio)
+
+
+class _TransferPlan:
+    """What transfer lines do to their warehouses, worked out from
+    ``{warehouse_id: (get_warehouse dict, get_products mapping)}`` of
+    each; the mappings are never written, so reading them is safe.
+
+    ``move`` and ``plan`` move stock as ``Ohtuvarasto.transfer_order``
+    would.
+    """
+
+    def __init__(self, warehouses):
+        self._warehouses = warehouses
+        self._quantities = {}  # {(warehouse_id, product_name): quantity}
+        self._added = {}  # {warehouse_id: change of its total quantity}
+
+    def plan(self, lines):
+        """Plan valid lines; returns (the quantity each line moves, the
+        batch operations that store the new quantities)."""
+        moved = [self.move(line) for line in lines]
+        return moved, [
+            {
+                "op": "update" if name in self._warehouses[wid][1] else "add",
+                "warehouse_id": wid, "product": name, "quantity": quantity,
+            }
+            for (wid, name), quantity in self._quantities.items()
+        ]
+
+    def move(self, line):
+        """Plan one valid line; returns the quantity it moves."""
+        source_id, target_id = line["from"], line["to"]
+        name = line["product"]
+        available = self._quantity(source_id, name) or 0
+        moved = min(line["quantity"], available, self._room(target_id, name))
+        if moved > 0:
+            self._set(source_id, name, available - moved)
+            self._set(target_id, name, (self._quantity(target_id, name) or 0)
+                      + moved)
+        return moved
+
+    def _quantity(self, warehouse_id, name):
+        key = (warehouse_id, name)
+        if key in self._quantities:
+            return self._quantities[key]
+        return self._warehouses[warehouse_id][1].get(name)
+
+    def _set(self, warehouse_id, name, quantity):
+        old = self._quantity(warehouse_id, name) or 0
+        self._added[warehouse_id] = \
+            self._added.get(warehouse_id, 0) + quantity - old
+        self._quantities[(warehouse_id, name)] = quantity
+
+    def _room(self, warehouse_id, name):
+        """Room for a product, as ``capacity.CapacityIndex`` counts it."""
+        warehouse, products = self._warehouses[warehouse_id]
+        room = UNLIMITED
+        if warehouse["capacity"] is not None:
+            total = sum(products.values()) + self._added.get(warehouse_id, 0)
+            room = max(0, warehouse["capacity"] - total)
+        limit = warehouse["product_capacities"].get(name)
+        if limit is not None:
+            room = min(room, max(0, limit - (self._quantity(
+                warehouse_id, name
+            ) or 0)))
+        return room
+
+
+_SORT_KEYS = {
+    "id": lambda item: item[0],
+    "name": lambda item: (item[1]["name"].casefold(), item[0]),
+    "products": lambda item: (len(item[1]["products"]), item[0]),
+}
+
+
+class _Shards(NamedTuple):
+    """What the merged indexes need of a ``ShardedOhtuvarasto``."""
+
+    shards: dict  # {shard name: Ohtuvarasto}
+    gate: _MoveGate
+    owner: Callable  # warehouse_id -> the name of its shard
+    setup: list  # setup(shard) calls for the shards added later
+
+
+class _MergedIndex:
+    """An index of a ``ShardedOhtuvarasto``, answered by the index of
+    the same name on every shard, or on the shard of one warehouse."""
+
+    def __init__(self, name, shards):
+        self._name = name
+        self._shards = shards
+
+    def each(self, query):
+        """``query(index)`` for the index of every shard."""
+        with self._shards.gate.operation():
+            return [
+                query(shard.index(self._name))
+                for shard in self._shards.shards.values()
+            ]
+
+    def of(self, warehouse_id, query):
+        """``query(index)`` for the index of a warehouse's shard."""
+        with self._shards.gate.operation():
+            return query(self._index_of(warehouse_id))
+
+    def _index_of(self, warehouse_id):
+        shard = self._shards.shards[self._shards.owner(warehouse_id)]
+        return shard.index(self._name)
+
+
+class _MergedListing(_MergedIndex):
+
+    def page(self, query=WarehouseQuery()):
+        """Merge the first ``offset + limit`` warehouses of every shard.
+
+        Deep pages therefore cost O(shards * (offset + limit)).
+        """
+        wanted = query._replace(offset=0, limit=query.offset + query.limit)
+        pages = self.each(lambda index: index.page(wanted))
+        merged = heapq.merge(
+            *(page.items for page in pages),
+            key=_SORT_KEYS[query.sort], reverse=query.descending,
+        )
+        return WarehousePage(
+            list(islice(merged, query.offset, query.offset + query.limit)),
+            sum(page.total for page in pages),
+        )
+
+
+class _MergedProducts(_MergedIndex):
+
+    def holdings(self, product_name):
+        holdings = {}
+        for part in self.each(lambda index: index.holdings(product_name)):
+            holdings.update(part)
+        return holdings
+
+    def total(self, product_name):
+        return sum(self.each(lambda index: index.total(product_name)))
+
+
+class _MergedCapacity(_MergedIndex):
+
+    def free_space(self, warehouse_id):
+        return self.of(
+            warehouse_id, lambda index: index.free_space(warehouse_id)
+        )
+
+    def with_room(self, product_name, quantity, limit=10):
+        """Merged in the order of ``Ohtuvarasto``: the warehouses with the
+        most free space first."""
+        rooms = [
+            item for part in self.each(
+                lambda index: _rooms(index, product_name, quantity, limit)
+            ) for item in part
+        ]
+        rooms.sort(reverse=True)
+        return [(wid, room) for _, wid, room in rooms[:limit]]
+
+
+def _rooms(index, product_name, quantity, limit):
+    """(free space, warehouse_id, room) of the warehouses with room in
+    the capacity index of one shard."""
+    return [
+        (index.free_space(wid), wid, room)
+        for wid, room in index.with_room(product_name, quantity, limit)
+    ]
+
+
+class _MergedVersions(_MergedIndex):
+
+    def version(self, warehouse_id=None):
+        """A value that changes whenever the data changes. The version of
+        one warehouse also changes when a warehouse moves between shards."""
+        if warehouse_id is None:
+            return sum(self.each(lambda index: index.version()))
+        with self._shards.gate.operation():
+            return (self._shards.gate.moves,
+                    self._index_of(warehouse_id).version(warehouse_id))
+
+
+class _MergedSearch(_MergedIndex):
+
+    def search(self, query, limit=20):
+        """Merged in the order of ``Ohtuvarasto``, without duplicates."""
+        names = set().union(*self.each(
+            lambda index: index.search(query, limit)
+        ))
+        return sorted(names, key=lambda name: rank(query, name))[:limit]
+
+
+class _MergedHistory(_MergedIndex):
+
+    def at(self, warehouse_id, product_name, when):
+        return self.of(
+            warehouse_id,
+            lambda index: index.at(warehouse_id, product_name, when),
+        )
+
+    def samples(self, warehouse_id, product_name, start, end):
+        return self.of(warehouse_id, lambda index: index.samples(
+            warehouse_id, product_name, start, end
+        ))
+
+
+class _MergedAlerts(_MergedIndex):
+    """Rules for every warehouse and listeners are also set on the
+    shards added later."""
+
+    def set_reorder_point(self, product_name, level, warehouse_id=None):
+        if warehouse_id is not None:
+            return self.of(warehouse_id, lambda index: index.set_reorder_point(
+                product_name, level, warehouse_id
+            ))
+        return self._on_all(
+            lambda alerts: alerts.set_reorder_point(product_name, level)
+        )
+
+    def set_fill_alert(self, warehouse_id, ratio):
+        return self.of(
+            warehouse_id,
+            lambda index: index.set_fill_alert(warehouse_id, ratio),
+        )
+
+    def low_stock(self, limit=10):
+        """Merged by quantity relative to the reorder point."""
+        return heapq.nsmallest(limit, (
+            item for part in self.each(lambda index: index.low_stock(limit))
+            for item in part
+        ), key=lambda item: item[2] / item[3])
+
+    def add_listener(self, listener):
+        self._on_all(lambda alerts: alerts.add_listener(listener))
+
+    def _on_all(self, call):
+        """``call(alerts)`` on every shard, now and when one is added;
+        returns whether all calls returned a true value."""
+        with self._shards.gate.operation():
+            results = [
+                call(shard.index(self._name))
+                for shard in self._shards.shards.values()
+            ]
+            if all(result is not False for result in results):
+                self._shards.setup.append(
+                    lambda shard: call(shard.index(self._name))
+                )
+                return True
+        return False
+
+
+_MERGED = {
+    "listing": _MergedListing,
+    "products": _MergedProducts,
+    "capacity": _MergedCapacity,
+    "versions": _MergedVersions,
+    "search": _MergedSearch,
+    "history": _MergedHistory,
+    "alerts": _MergedAlerts,
+}
+
+
+class ShardedOhtuvarasto(SingleTransfers):
+    """Warehouses spread over named Ohtuvarasto shards.
+
+    Operations on one warehouse go to its shard. The indexes of
+    ``index`` ask every shard and merge the answers, or ask the shard of
+    the warehouse in question; change events are numbered per shard, so
+    there is no merged "feed". Batches spanning shards hold the locks on
+    all of them and are applied only if every part is valid; each shard
+    logs its own part.
+
+    ``add_shard`` rebalances: the warehouses that now hash to the new
+    shard are moved there one at a time, pausing other operations only
+    while a warehouse is being moved. Observers, alert listeners and
+    reorder points for all warehouses are passed on to a new shard; a
+    moved warehouse takes its own alert rules and history along.
+    """
+
+    def __init__(self, shards, allocator=None):
+        self._shards = dict(shards)
+        self._ring = HashRing(sorted(self._shards))
+        self._pending = {}  # {warehouse_id: shard name}, not yet moved
+        self._setup = []  # setup(shard) calls replayed on new shards
+        self._gate = _MoveGate()
+        # How quantities are represented; all shards must agree.
+        self.quantities = next(iter(self._shards.values())).quantities
+        self._ids = allocator or IdAllocator(max(
+            (shard.index("ids").next_id for shard in self._shards.values()),
+            default=1,
+        ))
+
+    def add_shard(self, name, shard):
+        """Add a shard and move to it the warehouses it now owns.
+
+        Returns the number of warehouses moved.
+        """
+        with self._gate.move():
+            for setup in self._setup:
+                setup(shard)
+            self._shards[name] = shard
+            self._ring.add(name)
+            moving = {
+                wid: owner for owner, wid in self._all_ids()
+                if self._ring.node_for(wid) != owner
+            }
+            self._pending.update(moving)
+        for warehouse_id in moving:
+            with self._gate.move(warehouse_id):
+                self._move(warehouse_id)
+        return len(moving)
+
+    def create_warehouse(self, name):
+        with self._gate.operation():
+            warehouse_id = self._ids.allocate()
+            self._shard(warehouse_id).restore_warehouse(
+                warehouse_id, {"name": name}
+            )
+        return warehouse_id
+
+    def restore_warehouse(self, warehouse_id, warehouse):
+        return self._on_shard(warehouse_id, "restore_warehouse", warehouse)
+
+    def get_warehouse(self, warehouse_id):
+        return self._on_shard(warehouse_id, "get_warehouse")
+
+    def get_all_warehouses(self):
+        with self._gate.operation():
+            return sorted(
+                item for shard in self._shards.values()
+                for item in shard.get_all_warehouses()
+            )
+
+    def index(self, name):
+        """A merged index of the shards; "ids" is the ``IdAllocator``
+        shared by them."""
+        if name == "ids":
+            return self._ids
+        return _MERGED[name](name, _Shards(
+            self._shards, self._gate, self._shard_name, self._setup
+        ))
+
+    def set_capacity(self, warehouse_id, capacity, product_name=None):
+        return self._on_shard(
+            warehouse_id, "set_capacity", capacity, product_name
+        )
+
+    def update_warehouse_name(self, warehouse_id, new_name):
+        return self._on_shard(warehouse_id, "update_warehouse_name", new_name)
+
+    def delete_warehouse(self, warehouse_id):
+        return self._on_shard(warehouse_id, "delete_warehouse")
+
+    def add_product(self, warehouse_id, product_name, quantity):
+        return self._on_shard(
+            warehouse_id, "add_product", product_name, quantity
+        )
+
+    def import_products(self, warehouse_id, products, chunk_size=1000):
+        return self._on_shard(
+            warehouse_id, "import_products", products, chunk_size
+        )
+
+    def get_products(self, warehouse_id):
+        return self._on_shard(warehouse_id, "get_products")
+
+    def remove_product(self, warehouse_id, product_name):
+        return self._on_shard(warehouse_id, "remove_product", product_name)
+
+    def update_product_quantity(self, warehouse_id, product_name, new_quantity):
+        return self._on_shard(
+            warehouse_id, "update_product_quantity", product_name, new_quantity
+        )
+
+    def clear_warehouse(self, warehouse_id):
+        return self._on_shard(warehouse_id, "clear_warehouse")
+
+    def apply_batch(self, operations):
+        """Apply a batch atomically across all the shards it touches."""
+        with self._gate.operation(), \
+                self._staged_batch(operations) as (errors, commit):
+            if any(errors):
+                return False, errors
+            commit()
+        return True, errors
+
+    def transfer_order(self, lines):
+        """Apply transfers atomically, in order, like ``Ohtuvarasto``.
+
+        An order within one shard is left to it. One spanning shards is
+        planned from the warehouses as they are, then written as a batch
+        on each shard while the locks of all of them are held, taken in
+        name order as in ``apply_batch``. If a warehouse changed between
+        the planning and the locking, the order is planned again.
+        """
+        lines = list(lines)
+        with self._gate.operation():
+            names = {
+                self._shard_name(wid) for wid in transfer_warehouses(lines)
+            }
+            if len(names) <= 1:
+                shard = self._shards[min(names or self._shards)]
+                return shard.transfer_order(lines)
+            result = None
+            while result is None:
+                result = self._try_transfer_order(lines)
+            return result
+
+    def add_observer(self, observer):
+        observer = _ShardObserver(observer, self._gate)
+        with self._gate.operation():
+            self._setup.append(lambda shard: shard.add_observer(observer))
+            for shard in self._shards.values():
+                shard.add_observer(observer)
+
+    def snapshot(self):
+        for shard in self._shards.values():
+            shard.snapshot()
+
+    def close(self):
+        for shard in self._shards.values():
+            shard.close()
+
+    def _shard_name(self, warehouse_id):
+        """The name of the shard holding a warehouse."""
+        return self._pending.get(warehouse_id) or self._ring.node_for(
+            warehouse_id
+        )
+
+    def _shard(self, warehouse_id):
+        return self._shards[self._shard_name(warehouse_id)]
+
+    def _on_shard(self, warehouse_id, method, *args):
+        """Call a method of the shard holding a warehouse."""
+        with self._gate.operation():
+            return getattr(self._shard(warehouse_id), method)(
+                warehouse_id, *args
+            )
+
+    @contextmanager
+    def _staged_batch(self, operations):
+        """Stage the part of a batch on each shard, locking the shards in
+        name order; yields (errors, commit) like ``Ohtuvarasto``. Must be
+        used inside a ``_gate`` operation."""
+        operations = list(operations)
+        errors = [None] * len(operations)
+        with ExitStack() as stack:
+            commits = []
+            for name, part in sorted(self._partition(operations).items()):
+                part_errors, commit = stack.enter_context(
+                    self._shards[name].staged_batch(
+                        operation for _, operation in part
+                    )
+                )
+                for (position, _), error in zip(part, part_errors):
+                    errors[position] = error
+                commits.append(commit)
+            yield errors, partial(_call_all, commits)
+
+    def _try_transfer_order(self, lines):
+        """Plan and apply a transfer order spanning shards; None if one of
+        its warehouses changed before it could be applied."""
+        warehouse_ids = transfer_warehouses(lines)
+        versions = self._versions(warehouse_ids)
+        warehouses = self._read_warehouses(warehouse_ids)
+        errors = [transfer_error(line, warehouses) for line in lines]
+        if any(errors):
+            return None, errors
+        moved, operations = _TransferPlan(warehouses).plan(lines)
+        with self._staged_batch(operations) as (batch_errors, commit):
+            if any(batch_errors) or self._versions(warehouse_ids) != versions:
+                return None
+            commit()
+        return moved, errors
+
+    def _versions(self, warehouse_ids):
+        return {
+            wid: self._shard(wid).index("versions").version(wid)
+            for wid in warehouse_ids
+        }
+
+    def _read_warehouses(self, warehouse_ids):
+        """{warehouse_id: (data, products)} of the existing warehouses."""
+        warehouses = {}
+        for wid in warehouse_ids:
+            shard = self._shard(wid)
+            warehouse = shard.get_warehouse(wid)
+            if warehouse is not None:
+                warehouses[wid] = (warehouse, shard.get_products(wid))
+        return warehouses
+
+    def _partition(self, operations):
+        """Split a batch into {shard name: [(position, operation)]}."""
+        parts = {}
+        for position, operation in enumerate(operations):
+            name = self._batch_shard(operation)
+            parts.setdefault(name, []).append((position, operation))
+        return parts
+
+    def _batch_shard(self, operation):
+        warehouse_id = None
+        if isinstance(operation, dict):
+            warehouse_id = operation.get("warehouse_id")
+        if isinstance(warehouse_id, int):
+            return self._shard_name(warehouse_id)
+        return min(self._shards)
+
+    def _all_ids(self):
+        """(shard name, warehouse_id) of every warehouse."""
+        for name, shard in self._shards.items():
+            for warehouse_id, _ in shard.get_all_warehouses():
+                yield name, warehouse_id
+
+    def _move(self, warehouse_id):
+        """Move a warehouse from its old shard to the one it hashes to.
+
+        It is restored on the new shard before it is deleted from the old
+        one, and stays routed to the old one until both are done, so a
+        failure in between leaves it where it was rather than nowhere.
+        The observers of the sharded manager see neither change (see
+        ``_ShardObserver``).
+        """
+        source = self._shards[self._pending[warehouse_id]]
+        target = self._shards[self._ring.node_for(warehouse_id)]
+        if _copy_warehouse(source, target, warehouse_id):
+            source.delete_warehouse(warehouse_id)
+            self._gate.moves += 1
+        del self._pending[warehouse_id]
@@ -0,0 +1,76 @@
+"""Faster cold starts for new instances of the Flask app.
+
+Three things delay the first responses of a new process, and each has a
+switch here:
+
+* Compiling the templates on their first render. With
+  ``OHTUVARASTO_TEMPLATE_CACHE=<directory>`` compiled templates are kept
+  there as bytecode, and ``flask --app app compile-templates`` fills the
+  directory at build time, so new instances only load them. A template
+  whose source changed is compiled again, so a stale cache is harmless.
+* Importing modules that few requests need. ``lazy_import`` returns a
+  module that is only executed on its first attribute access.
+* The rest of the first request: matching the URL map, the first query
+  of the indexes, the response cache. With ``OHTUVARASTO_WARM_UP=true``
+  ``init_app`` runs ``warm_up``, so the process does that work before it
+  takes traffic.
+
+``python -m benchmarks.cold_start`` measures the time to the first
+responses with each setting.
+"""
+
+import importlib.util
+import os
+import sys
+import click
+from jinja2 import FileSystemBytecodeCache
+
+
+def lazy_import(name):
+    """Import module ``name`` on the first access to its attributes."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = sys.modules[name] = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def compile_templates(app):
+    """Load every template of ``app``, compiling those that are not in
+    the bytecode cache. Returns the number of templates."""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_up(app, paths=("/",)):
+    """Load the templates and serve ``paths`` once, so that the first
+    real requests find everything ready."""
+    compile_templates(app)
+    client = app.test_client()
+    for path in paths:
+        client.get(path)
+
+
+def init_app(app):
+    """Configure the template cache and the warm-up from the environment
+    and register the ``compile-templates`` command. Call it after every
+    route is registered."""
+    directory = os.environ.get("OHTUVARASTO_TEMPLATE_CACHE")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    @app.cli.command("compile-templates")
+    def compile_command():
+        """Compile the templates into OHTUVARASTO_TEMPLATE_CACHE."""
+        if app.jinja_env.bytecode_cache is None:
+            raise click.UsageError("OHTUVARASTO_TEMPLATE_CACHE is not set.")
+        click.echo(f"Compiled {compile_templates(app)} templates.")
+
+    if os.environ.get("OHTUVARASTO_WARM_UP", "false").lower() == "true":
+        warm_up(app)
@@ -0,0 +1,452 @@
+"""Durable storage for Ohtuvarasto: a write-ahead log plus snapshots.
+
+A storage backend is any object with the methods used by ``Ohtuvarasto``:
+
+* ``load()`` returns ``(state, records)`` where ``state`` is the latest
+  snapshot (or None) and ``records`` iterates the log entries written
+  after it, each a dict with ``"op"``, ``"args"`` and ``"time"``, the
+  time of the mutation (missing in records of older logs).
+* ``append(op, args, when)`` records one successful mutation made at
+  time ``when``.
+* ``needs_snapshot()`` tells whether the log tail has grown long enough
+  to be worth compacting, and ``write_snapshot(state)`` does it.
+* ``close()`` flushes everything still buffered.
+
+Backends that several processes share also keep each process up to
+date with the writes of the others:
+
+* ``transaction()`` is a context manager holding the exclusive write
+  lock, so that catching up, applying a mutation and appending it are
+  atomic across processes.
+* ``catch_up(replay)`` calls ``replay(state, records)`` with the records
+  other processes have written since the last call, and with the latest
+  snapshot as ``state`` when older records were already compacted away
+  (``state`` is None otherwise).
+
+``FileStorage`` is owned by a single process, so for it these are no-ops.
+"""
+
+import json
+import os
+import threading
+from contextlib import nullcontext
+from typing import NamedTuple
+
+
+class SyncPolicy(NamedTuple):
+    """How eagerly the log is fsynced and compacted."""
+
+    sync_every: int = 64
+    sync_interval: float = 0.05
+    snapshot_every: int = 10000
+
+
+class _GroupCommit:
+    """An open log file whose fsyncs are batched across several writes.
+
+    Writes happen under the lock of ``storage``, so a delayed sync goes
+    through ``storage.sync``, which takes that lock too: a write cannot
+    slip in between the flush and the reset of the pending count, and a
+    file closed by ``write_snapshot`` is never synced.
+    """
+
+    def __init__(self, path, mode, storage):
+        # pylint: disable-next=consider-using-with
+        self._file = open(path, mode, encoding="utf-8")
+        self._policy = storage.policy
+        self._storage_sync = storage.sync
+        self._pending = 0
+        self._timer = None
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def write(self, line):
+        """Write a line; fsync now if the batch is full, else schedule it."""
+        self._file.write(line)
+        self._pending += 1
+        if self._pending >= self._policy.sync_every:
+            self.sync()
+        elif self._timer is None:
+            self._timer = threading.Timer(
+                self._policy.sync_interval, self._storage_sync
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def sync(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+class FileStorage:
+    """Append-only JSON-lines log with periodic compacted snapshots.
+
+    Records are written immediately but fsynced in groups: a sync
+    happens once ``sync_every`` records are pending or ``sync_interval``
+    seconds after the first unsynced record, whichever comes first.
+    ``append`` returns before the fsync, so a crash can lose mutations
+    that were already acknowledged, up to ``sync_interval`` seconds (or
+    ``sync_every`` records) of them. Call ``sync`` to make sure.
+    """
+
+    LOG_NAME = "wal.jsonl"
+    SNAPSHOT_NAME = "snapshot.json"
+
+    def __init__(self, directory, policy=None):
+        os.makedirs(directory, exist_ok=True)
+        self.policy = policy or SyncPolicy()
+        self._directory = directory
+        self._lock = threading.RLock()
+        self._seq = 0
+        self._since_snapshot = 0
+        self._log = None
+
+    def load(self):
+        """Return the latest snapshot and the log records written after it."""
+        state = self._read_snapshot()
+        if state is not None:
+            self._seq = state["seq"]
+        records = [r for r in self._read_log() if r["seq"] > self._seq]
+        if records:
+            self._seq = records[-1]["seq"]
+        self._since_snapshot = len(records)
+        self._log = _GroupCommit(self._path(self.LOG_NAME), "a", self)
+        return state, records
+
+    def append(self, op, args, when):
+        """Write one mutation record to the log."""
+        with self._lock:
+            self._seq += 1
+            record = {
+                "seq": self._seq, "op": op, "args": list(args), "time": when,
+            }
+            self._log.write(json.dumps(record) + "\n")
+            self._since_snapshot += 1
+
+    def sync(self):
+        """Flush and fsync every buffered record."""
+        with self._lock:
+            if self._log is not None:
+                self._log.sync()
+
+    def transaction(self):
+        return nullcontext()
+
+    def catch_up(self, replay):
+        """Nothing to do: no other process writes to this log."""
+
+    def needs_snapshot(self):
+        return self._since_snapshot >= self.policy.snapshot_every
+
+    def write_snapshot(self, state):
+        """Atomically replace the snapshot and truncate the log."""
+        with self._lock:
+            self._log.close()
+            state = dict(state, seq=self._seq)
+            _write_atomically(self._path(self.SNAPSHOT_NAME), json.dumps(state))
+            self._log = _GroupCommit(self._path(self.LOG_NAME), "w", self)
+            _fsync_directory(self._directory)
+            self._since_snapshot = 0
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _path(self, name):
+        return os.path.join(self._directory, name)
+
+    def _read_snapshot(self):
+        path = self._path(self.SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as snapshot:
+            return json.load(snapshot)
+
+    def _read_log(self):
+        """Read log records, dropping a torn record left by a crash."""
+        path = self._path(self.LOG_NAME)
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as log:
+            records, valid_bytes = _parse_records(log)
+        os.truncate(path, valid_bytes)
+        return records
+
+
+def _parse_records(lines):
+    """Parse complete JSON lines, stopping at the first torn one."""
+    records = []
+    valid_bytes = 0
+    for line in lines:
+        if not line.endswith(b"\n"):
+            break
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break
+        valid_bytes += len(line)
+    return records, valid_bytes
+
+
+def _write_atomically(path, text):
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as target:
+        target.write(text)
+        target.flush()
+        os.fsync(target.fileno())
+    os.replace(temporary, path)
+    _fsync_directory(os.path.dirname(path))
+
+
+def _fsync_directory(directory):
+    descriptor = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class SqliteStorage:
+    """A log and snapshot in one SQLite database, shared by processes.
+
+    Every process keeps the whole state in memory and serves reads from
+    it; the database is the shared, ordered log of mutations. Writes
+    take SQLite's write lock (``BEGIN IMMEDIATE``), catch up with the
+    records of other processes and append their own record before
+    committing. Before a read, a process checks ``PRAGMA data_version``
+    and replays only when another process has committed something.
+
+    The database runs in WAL mode, so readers never wait for writers.
+    Snapshots keep ``snapshot_every`` records of history, so processes
+    that were idle for a while can usually replay instead of reloading.
+    """
+
+    def __init__(self, path, policy=None):
+        self.policy = policy or SyncPolicy()
+        # Lock order: the write transaction, then the reader's lock, then
+        # the manager's warehouse locks. _seq_lock is only held on its own.
+        self._transaction = _WriteTransaction(_connect(path))
+        self._writer = self._transaction.connection
+        self._reader = _Reader(_connect(path))
+        self._seq_lock = threading.Lock()
+        self._seq = 0
+        self._snapshot_seq = 0
+
+    def load(self):
+        """Return the latest snapshot and the log records written after it."""
+        with self._reader.lock:
+            state, records = self._read_changes(0, use_snapshot=True)
+            self._advance(records)
+        return state, records
+
+    def transaction(self):
+        """Hold the database write lock; nested transactions join it."""
+        return self._transaction
+
+    def catch_up(self, replay):
+        """Replay the records committed by other processes, if any."""
+        with self._reader.lock:
+            if not self._reader.changed():
+                return
+            state, records = self._read_changes(self._seq)
+            if state is None and not records:
+                return
+            replay(state, records)
+            self._advance(records)
+
+    def append(self, op, args, when):
+        """Add one record; must be called inside ``transaction()``."""
+        cursor = self._writer.execute(
+            "INSERT INTO log (op, args, time) VALUES (?, ?, ?)",
+            (op, json.dumps(list(args)), when),
+        )
+        with self._seq_lock:
+            self._seq = max(self._seq, cursor.lastrowid)
+
+    def needs_snapshot(self):
+        return self._seq - self._snapshot_seq >= self.policy.snapshot_every
+
+    def write_snapshot(self, state):
+        """Store a snapshot and drop the records older than one snapshot
+        interval; must be called inside ``transaction()``."""
+        self._writer.execute(
+            "INSERT OR REPLACE INTO snapshot (id, seq, state) VALUES (1, ?, ?)",
+            (self._seq, json.dumps(state)),
+        )
+        self._writer.execute(
+            "DELETE FROM log WHERE seq <= ?",
+            (self._seq - self.policy.snapshot_every,),
+        )
+        self._snapshot_seq = self._seq
+
+    def sync(self):
+        """Commits are durable already; there is nothing buffered."""
+
+    def close(self):
+        with self._transaction.lock, self._reader.lock:
+            self._writer.close()
+            self._reader.connection.close()
+
+    def _advance(self, records):
+        """Mark the records, or the snapshot before them, as applied."""
+        with self._seq_lock:
+            last = records[-1]["seq"] if records else self._snapshot_seq
+            self._seq = max(self._seq, last)
+
+    def _read_changes(self, seq, use_snapshot=False):
+        """Read (state, records) after ``seq`` in one read transaction.
+
+        State is the newer snapshot if ``use_snapshot`` is set or the
+        records right after ``seq`` were already dropped, else None.
+        """
+        with self._reader.connection:
+            self._reader.execute("BEGIN")
+            state, seq = self._newer_snapshot(seq, use_snapshot)
+            records = [
+                {
+                    "seq": number, "op": op, "args": json.loads(args),
+                    "time": when,
+                }
+                for number, op, args, when in self._reader.execute(
+                    "SELECT seq, op, args, time FROM log"
+                    " WHERE seq > ? ORDER BY seq",
+                    (seq,),
+                )
+            ]
+        return state, records
+
+    def _newer_snapshot(self, seq, use_snapshot):
+        """Return (snapshot state, its seq) if it should replace the
+        records after ``seq``, else (None, seq)."""
+        row = self._reader.execute(
+            "SELECT seq, state FROM snapshot WHERE id = 1"
+        ).fetchone()
+        if row is None:
+            return None, seq
+        self._snapshot_seq = row[0]
+        if row[0] > seq and (use_snapshot or not self._has_record(seq + 1)):
+            return json.loads(row[1]), row[0]
+        return None, seq
+
+    def _has_record(self, seq):
+        return self._reader.execute(
+            "SELECT 1 FROM log WHERE seq = ?", (seq,)
+        ).fetchone() is not None
+
+
+class _Reader:
+    """The connection for reads, with a lock shared by the threads of a
+    process, and the data version it was last caught up with."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+        self._data_version = None
+
+    def execute(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters)
+
+    def changed(self):
+        """Whether the database changed since the last call; the first
+        call always says it did."""
+        version = self.connection.execute("PRAGMA data_version").fetchone()
+        changed, self._data_version = version != self._data_version, version
+        return changed
+
+
+class _WriteTransaction:
+    """A reentrant ``BEGIN IMMEDIATE`` transaction on one connection,
+    shared by the threads of a process."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            if self._depth == 0:
+                self.connection.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        self._depth += 1
+
+    def __exit__(self, error_type, error, traceback):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                self.connection.execute(
+                    "COMMIT" if error_type is None else "ROLLBACK"
+                )
+        finally:
+            self.lock.release()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    args TEXT NOT NULL,
+    time REAL
+);
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seq INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+"""
+
+
+def _connect(path):
+    # Imported here so that processes without a database skip loading it.
+    import sqlite3  # pylint: disable=import-outside-toplevel
+    connection = sqlite3.connect(
+        path, timeout=30, isolation_level=None, check_same_thread=False
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(_SCHEMA)
+    _add_time_column(connection)
+    return connection
+
+
+def _add_time_column(connection):
+    """Add the ``time`` column to a log table created without it."""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        columns = connection.execute("PRAGMA table_info(log)").fetchall()
+        if "time" not in [column[1] for column in columns]:
+            connection.execute("ALTER TABLE log ADD COLUMN time REAL")
+    finally:
+        connection.execute("COMMIT")
+
+
+def storage_from_env():
+    """Build the storage configured by the environment, if any.
+
+    OHTUVARASTO_DATABASE names an SQLite database that several worker
+    processes can share; OHTUVARASTO_DATA_DIR a directory for the log of
+    a single process.
+    """
+    database = os.environ.get("OHTUVARASTO_DATABASE")
+    if database:
+        return SqliteStorage(database)
+    directory = os.environ.get("OHTUVARASTO_DATA_DIR")
+    if not directory:
+        return None
+    return FileStorage(directory)
@@ -0,0 +1,216 @@
+import os
+import tempfile
+import unittest
+from alerts import Alert, Debouncer, FillWatch
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage, SqliteStorage, SyncPolicy
+from varasto import ValvottuVarasto
+
+
+class TestDebouncer(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.alerts = Debouncer(interval=3600)
+        self.alerts.add_listener(self.batches.append)
+
+    def alert(self, product="Apple", value=1):
+        return Alert("low_stock", 1, product, value, 5)
+
+    def test_alerts_are_delivered_in_one_batch(self):
+        self.alerts.raised(self.alert("Apple"))
+        self.alerts.raised(self.alert("Pear"))
+        self.assertEqual(self.batches, [])
+        self.alerts.flush()
+        self.assertEqual(
+            self.batches, [[self.alert("Apple"), self.alert("Pear")]]
+        )
+        self.alerts.flush()
+        self.assertEqual(len(self.batches), 1)
+
+    def test_cleared_alert_is_dropped(self):
+        self.alerts.raised(self.alert("Apple"))
+        self.alerts.cleared("low_stock", 1, "Apple")
+        self.alerts.raised(self.alert("Pear", value=1))
+        self.alerts.raised(self.alert("Pear", value=2))
+        self.alerts.flush()
+        self.assertEqual(self.batches, [[self.alert("Pear", value=2)]])
+
+    def test_no_interval_delivers_at_once(self):
+        self.alerts.interval = 0
+        self.alerts.raised(self.alert())
+        self.assertEqual(self.batches, [[self.alert()]])
+
+
+class TestManagerAlerts(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.alerts = []
+        self.index = self.manager.index("alerts")
+        self.index.add_listener(self.alerts.extend)
+        self.warehouse_id = self.manager.create_warehouse("Main")
+
+    def delivered(self):
+        self.index.debouncer.flush()
+        alerts, self.alerts[:] = list(self.alerts), []
+        return alerts
+
+    def test_reorder_point_is_checked_on_change(self):
+        self.manager.add_product(self.warehouse_id, "Apple", 10)
+        self.assertTrue(self.index.set_reorder_point("Apple", 5))
+        self.assertEqual(self.delivered(), [])
+        self.manager.update_product_quantity(self.warehouse_id, "Apple", 4)
+        self.manager.update_product_quantity(self.warehouse_id, "Apple", 3)
+        self.assertEqual(
+            self.delivered(),
+            [Alert("low_stock", self.warehouse_id, "Apple", 4, 5)],
+        )
+        self.manager.update_product_quantity(self.warehouse_id, "Apple", 6)
+        self.manager.update_product_quantity(self.warehouse_id, "Apple", 2)
+        self.assertEqual(
+            self.delivered(),
+            [Alert("low_stock", self.warehouse_id, "Apple", 2, 5)],
+        )
+
+    def test_bounce_within_interval_alerts_once(self):
+        self.manager.add_product(self.warehouse_id, "Apple", 10)
+        self.index.set_reorder_point("Apple", 5)
+        for quantity in (4, 6, 4, 6):
+            self.manager.update_product_quantity(
+                self.warehouse_id, "Apple", quantity
+            )
+        self.assertEqual(self.delivered(), [])
+
+    def test_low_stock_lists_lowest_relative_to_point(self):
+        other = self.manager.create_warehouse("Other")
+        for warehouse_id, product, quantity in (
+            (self.warehouse_id, "Apple", 4), (self.warehouse_id, "Pear", 1),
+            (other, "Apple", 1), (other, "Plum", 50),
+        ):
+            self.manager.add_product(warehouse_id, product, quantity)
+        self.index.set_reorder_point("Apple", 5)
+        self.index.set_reorder_point("Pear", 2)
+        self.index.set_reorder_point("Apple", 20, other)
+        self.assertEqual(self.index.low_stock(), [
+            (other, "Apple", 1, 20),
+            (self.warehouse_id, "Pear", 1, 2),
+            (self.warehouse_id, "Apple", 4, 5),
+        ])
+        self.assertEqual(len(self.index.low_stock(limit=1)), 1)
+        self.index.set_reorder_point("Pear", None)
+        self.manager.remove_product(other, "Apple")
+        self.assertEqual(
+            self.index.low_stock(), [(self.warehouse_id, "Apple", 4, 5)]
+        )
+
+    def test_invalid_rules_are_rejected(self):
+        self.assertFalse(self.index.set_reorder_point("Apple", 0))
+        self.assertFalse(self.index.set_reorder_point("Apple", 5, 99))
+        self.assertFalse(self.index.set_fill_alert(self.warehouse_id, -1))
+        self.assertFalse(self.index.set_fill_alert(99, 0.5))
+
+    def test_fill_alert(self):
+        self.manager.set_capacity(self.warehouse_id, 100)
+        self.assertTrue(self.index.set_fill_alert(self.warehouse_id, 0.8))
+        self.manager.add_product(self.warehouse_id, "Apple", 50)
+        self.manager.add_product(self.warehouse_id, "Pear", 30)
+        self.assertEqual(
+            self.delivered(), [Alert("fill", self.warehouse_id, None, 0.8, 0.8)]
+        )
+        self.manager.remove_product(self.warehouse_id, "Pear")
+        self.manager.add_product(self.warehouse_id, "Pear", 40)
+        self.assertEqual(len(self.delivered()), 1)
+        self.manager.set_capacity(self.warehouse_id, None)
+        self.manager.add_product(self.warehouse_id, "Plum", 10)
+        self.assertEqual(self.delivered(), [])
+
+
+class TestStoredAlertRules(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close()
+        self.tmp.cleanup()
+
+    def open_manager(self, storage):
+        manager = Ohtuvarasto(storage)
+        self.managers.append(manager)
+        return manager
+
+    def fill(self, manager):
+        warehouse_id = manager.create_warehouse("Main")
+        manager.set_capacity(warehouse_id, 8)
+        manager.add_product(warehouse_id, "Apple", 2)
+        manager.add_product(warehouse_id, "Pear", 2)
+        alerts = manager.index("alerts")
+        alerts.set_reorder_point("Apple", 5)
+        alerts.set_reorder_point("Pear", 1)
+        alerts.set_reorder_point("Pear", 3, warehouse_id)
+        alerts.set_fill_alert(warehouse_id, 0.5)
+        return warehouse_id
+
+    def assert_rules_restored(self, policy):
+        manager = self.open_manager(FileStorage(self.tmp.name, policy))
+        warehouse_id = self.fill(manager)
+        manager.close()
+        restored = self.open_manager(FileStorage(self.tmp.name, policy))
+        delivered = []
+        restored.index("alerts").add_listener(delivered.extend)
+        restored.index("alerts").debouncer.flush()
+        self.assertEqual(delivered, [])
+        self.assertEqual(restored.index("alerts").low_stock(), [
+            (warehouse_id, "Apple", 2, 5), (warehouse_id, "Pear", 2, 3),
+        ])
+        restored.add_product(warehouse_id, "Plum", 1)
+        restored.index("alerts").debouncer.flush()
+        self.assertEqual(delivered, [], "the fill alert was raised before")
+
+    def test_rules_are_replayed_from_the_log_without_alerting(self):
+        self.assert_rules_restored(None)
+
+    def test_rules_survive_snapshots(self):
+        self.assert_rules_restored(SyncPolicy(snapshot_every=3))
+
+    def test_changes_of_other_processes_do_not_alert(self):
+        path = os.path.join(self.tmp.name, "ohtuvarasto.db")
+        first = self.open_manager(SqliteStorage(path))
+        second = self.open_manager(SqliteStorage(path))
+        delivered = []
+        second.index("alerts").add_listener(delivered.extend)
+        warehouse_id = self.fill(first)
+        first.update_product_quantity(warehouse_id, "Apple", 1)
+        self.assertEqual(len(second.index("alerts").low_stock()), 2)
+        second.index("alerts").debouncer.flush()
+        self.assertEqual(delivered, [])
+        second.update_product_quantity(warehouse_id, "Pear", 5)
+        second.update_product_quantity(warehouse_id, "Pear", 0)
+        second.index("alerts").debouncer.flush()
+        self.assertEqual(
+            delivered, [Alert("low_stock", warehouse_id, "Pear", 0, 3)]
+        )
+
+
+class TestFillWatch(unittest.TestCase):
+
+    def test_watched_bin_alerts_when_filled(self):
+        batches = []
+        alerts = Debouncer(interval=0)
+        alerts.add_listener(batches.append)
+        varasto = ValvottuVarasto(10, 2, FillWatch("bin", 0.75, alerts))
+        varasto.lisaa_varastoon(5)
+        self.assertEqual(batches, [])
+        varasto.lisaa_varastoon(1)
+        self.assertEqual(batches, [[Alert("fill", "bin", None, 0.8, 0.75)]])
+        self.assertEqual(varasto.ota_varastosta(4), 4)
+        varasto.lisaa_varastoon(4)
+        self.assertEqual(len(batches), 2)
+
+    def test_unwatched_bin_behaves_like_varasto(self):
+        varasto = ValvottuVarasto(10, 2)
+        varasto.lisaa_varastoon(3)
+        self.assertEqual(varasto.saldo, 5)
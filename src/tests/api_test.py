@@ -0,0 +1,261 @@
+import unittest
+from app import app, warehouse_manager
+
+
+class TestJsonApi(unittest.TestCase):
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        for warehouse_id, _ in warehouse_manager.get_all_warehouses():
+            warehouse_manager.delete_warehouse(warehouse_id)
+        warehouse_manager.index("ids").next_id = 1
+
+    def test_create_and_list_warehouses(self):
+        response = self.client.post("/api/v1/warehouses", json={"name": "Main"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json, {"id": 1, "name": "Main"})
+        response = self.client.get("/api/v1/warehouses")
+        self.assertEqual(
+            response.json["warehouses"],
+            [{"id": 1, "name": "Main", "product_count": 0}],
+        )
+
+    def test_create_warehouse_without_name_is_bad_request(self):
+        response = self.client.post("/api/v1/warehouses", json={"name": " "})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json)
+
+    def test_get_warehouse_includes_products(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.add_product(warehouse_id, "Apple", 3)
+        response = self.client.get(f"/api/v1/warehouses/{warehouse_id}")
+        self.assertEqual(response.json["products"], {"Apple": 3})
+
+    def test_product_history(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.add_product(warehouse_id, "Apple", 3)
+        warehouse_manager.update_product_quantity(warehouse_id, "Apple", 1)
+        path = f"/api/v1/warehouses/{warehouse_id}/products/Apple/history"
+        samples = self.client.get(path).json["samples"]
+        self.assertEqual([sample["close"] for sample in samples], [3, 1])
+        self.assertEqual(samples[0]["width"], 0)
+        response = self.client.get(path + "?at=0")
+        self.assertEqual(response.json, {"at": 0, "quantity": None})
+        response = self.client.get(f"{path}?at={samples[-1]['time']}")
+        self.assertEqual(response.json["quantity"], 1)
+        response = self.client.get("/api/v1/warehouses/99/products/A/history")
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_products(self):
+        first = warehouse_manager.create_warehouse("First")
+        second = warehouse_manager.create_warehouse("Second")
+        warehouse_manager.add_product(first, "Pineapple", 2)
+        warehouse_manager.add_product(first, "Apple", 3)
+        warehouse_manager.add_product(second, "Apple", 4)
+        response = self.client.get("/api/v1/products?q=apple&limit=5")
+        self.assertEqual(response.json, {"products": [
+            {"name": "Apple", "total": 7}, {"name": "Pineapple", "total": 2},
+        ]})
+        response = self.client.get("/api/v1/products?q=apple&limit=1")
+        self.assertEqual(len(response.json["products"]), 1)
+
+    def test_reorder_points_and_low_stock(self):
+        first = warehouse_manager.create_warehouse("First")
+        second = warehouse_manager.create_warehouse("Second")
+        warehouse_manager.add_product(first, "Apple", 3)
+        warehouse_manager.add_product(second, "Apple", 1)
+        self.addCleanup(warehouse_manager.index("alerts").set_reorder_point, "Apple", None)
+        path = "/api/v1/products/Apple/reorder-point"
+        response = self.client.put(path, json={"level": 5})
+        self.assertEqual(response.json,
+                         {"product": "Apple", "level": 5, "warehouse_id": None})
+        self.client.put(path, json={"level": 2, "warehouse_id": first})
+        self.assertEqual(self.client.get("/api/v1/low-stock").json, {
+            "items": [{"warehouse_id": second, "product": "Apple",
+                       "quantity": 1, "level": 5}],
+        })
+        for body, status in (({"level": 0}, 400),
+                             ({"level": 1, "warehouse_id": "1"}, 400),
+                             ({"level": 1, "warehouse_id": 99}, 404)):
+            self.assertEqual(self.client.put(path, json=body).status_code,
+                             status)
+
+    def test_fill_alert(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        path = f"/api/v1/warehouses/{warehouse_id}/fill-alert"
+        response = self.client.put(path, json={"ratio": 0.9})
+        self.assertEqual(response.json, {"ratio": 0.9})
+        self.assertEqual(
+            self.client.put(path, json={"ratio": 0}).status_code, 400
+        )
+        response = self.client.put("/api/v1/warehouses/99/fill-alert",
+                                   json={"ratio": 0.9})
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_warehouse_is_not_found(self):
+        self.assertEqual(self.client.get("/api/v1/warehouses/9").status_code, 404)
+        response = self.client.get("/api/v1/warehouses/9/products")
+        self.assertEqual(response.status_code, 404)
+
+    def test_rename_and_delete_warehouse(self):
+        warehouse_id = warehouse_manager.create_warehouse("Old")
+        url = f"/api/v1/warehouses/{warehouse_id}"
+        response = self.client.patch(url, json={"name": "New"})
+        self.assertEqual(response.json["name"], "New")
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_product_lifecycle(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        url = f"/api/v1/warehouses/{warehouse_id}/products"
+        response = self.client.post(url, json={"name": "Apple", "quantity": 5})
+        self.assertEqual(response.status_code, 200)
+        self.client.post(url, json={"name": "Apple", "quantity": 2})
+        self.assertEqual(self.client.get(url).json["products"], {"Apple": 7})
+
+        response = self.client.put(f"{url}/Apple", json={"quantity": 1})
+        self.assertEqual(response.json, {"name": "Apple", "quantity": 1})
+        self.assertEqual(self.client.delete(f"{url}/Apple").status_code, 204)
+        self.assertEqual(self.client.delete(f"{url}/Apple").status_code, 404)
+
+    def test_invalid_quantities_are_rejected(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        url = f"/api/v1/warehouses/{warehouse_id}/products"
+        for quantity in (-1, "5", True, None):
+            response = self.client.post(
+                url, json={"name": "Apple", "quantity": quantity}
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_clear_products(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.add_product(warehouse_id, "Apple", 3)
+        url = f"/api/v1/warehouses/{warehouse_id}/products"
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(warehouse_manager.get_products(warehouse_id), {})
+
+    def test_writes_do_not_flash_or_redirect(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        self.client.post(
+            f"/api/v1/warehouses/{warehouse_id}/products",
+            json={"name": "Apple", "quantity": 1},
+        )
+        with self.client.session_transaction() as session:
+            self.assertNotIn("_flashes", session)
+
+    def test_product_lookup(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.add_product(warehouse_id, "Apple", 3)
+        response = self.client.get("/api/v1/products/Apple")
+        self.assertEqual(response.json, {
+            "name": "Apple", "total": 3,
+            "warehouses": [{"id": warehouse_id, "quantity": 3}],
+        })
+
+    def test_set_capacity_and_find_room(self):
+        small = warehouse_manager.create_warehouse("Small")
+        large = warehouse_manager.create_warehouse("Large")
+        response = self.client.put(
+            f"/api/v1/warehouses/{small}/capacity", json={"capacity": 5}
+        )
+        self.assertEqual(response.json["free_space"], 5)
+        self.client.put(f"/api/v1/warehouses/{large}/capacity",
+                        json={"capacity": 50})
+        response = self.client.get("/api/v1/products/Apple/room?quantity=10")
+        self.assertEqual(response.json["warehouses"], [{"id": large, "room": 50}])
+
+    def test_updates_answer_with_the_clamped_quantity(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.set_capacity(warehouse_id, 5)
+        path = f"/api/v1/warehouses/{warehouse_id}/products"
+        response = self.client.post(path, json={"name": "Apple", "quantity": 9})
+        self.assertEqual(response.json, {"name": "Apple", "quantity": 5})
+        response = self.client.put(path + "/Apple", json={"quantity": 8})
+        self.assertEqual(response.json, {"name": "Apple", "quantity": 5})
+
+    def test_invalid_capacity_is_rejected(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        response = self.client.put(
+            f"/api/v1/warehouses/{warehouse_id}/capacity", json={"capacity": -1}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_warehouse_as_csv(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.add_product(warehouse_id, "Apple", 3)
+        response = self.client.get(
+            f"/api/v1/warehouses/{warehouse_id}/export?format=csv"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertIn("attachment", response.headers["Content-Disposition"])
+        self.assertEqual(
+            response.get_data(as_text=True),
+            "warehouse_id,warehouse,product,quantity\n1,Main,Apple,3\n",
+        )
+
+    def test_export_with_unknown_format_is_bad_request(self):
+        response = self.client.get("/api/v1/export?format=xml")
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_into_warehouse(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        response = self.client.post(
+            f"/api/v1/warehouses/{warehouse_id}/import?format=jsonl",
+            data='{"product": "Apple", "quantity": 2}\n{"product": "Pear"}\n',
+        )
+        self.assertEqual(response.json["imported"], 1)
+        self.assertEqual(response.json["rejected"], 1)
+        self.assertEqual(
+            response.json["errors"], [{"line": 2, "error": "invalid quantity"}]
+        )
+        self.assertEqual(warehouse_manager.get_products(warehouse_id), {"Apple": 2})
+
+    def test_import_reports_lines_that_are_not_utf8(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        response = self.client.post(
+            f"/api/v1/warehouses/{warehouse_id}/import",
+            data="product,quantity\nPäär,1\nApple,2\n".encode("latin-1"),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["imported"], 1)
+        self.assertEqual(
+            response.json["errors"], [{"line": 2, "error": "not valid UTF-8"}]
+        )
+
+    def test_import_into_missing_warehouse_is_not_found(self):
+        response = self.client.post(
+            "/api/v1/warehouses/999/import", data="product,quantity\nA,1\n"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_full_export_restores(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.add_product(warehouse_id, "Apple", 3)
+        exported = self.client.get("/api/v1/export?format=jsonl").data
+        warehouse_manager.delete_warehouse(warehouse_id)
+        response = self.client.post("/api/v1/import?format=jsonl", data=exported)
+        self.assertEqual(response.json["created"], 1)
+        self.assertEqual(warehouse_manager.index("products").holdings("Apple"), {2: 3})
+
+    def test_transfer_order(self):
+        source = warehouse_manager.create_warehouse("Source")
+        target = warehouse_manager.create_warehouse("Target")
+        warehouse_manager.add_product(source, "Apple", 5)
+        response = self.client.post("/api/v1/transfers", json={"lines": [
+            {"from": source, "to": target, "product": "Apple", "quantity": 2},
+            {"from": source, "to": target, "product": "Apple", "quantity": 9},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"moved": [2, 3]})
+        self.assertEqual(warehouse_manager.get_products(target), {"Apple": 5})
+
+    def test_invalid_transfer_order(self):
+        response = self.client.post("/api/v1/transfers", json={"lines": [
+            {"from": 1, "to": 2, "product": "Apple", "quantity": 1},
+        ]})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json, {"errors": ["warehouse not found"]})
+        response = self.client.post("/api/v1/transfers", json={"lines": 3})
+        self.assertEqual(response.status_code, 400)
@@ -1,4 +1,6 @@
+import io
 import unittest
+from flask import url_for
 from app import app, warehouse_manager
 from ohtuvarasto import Ohtuvarasto
 
@@ -10,8 +12,9 @@ class TestFlaskApp(unittest.TestCase):
         app.config["WTF_CSRF_ENABLED"] = False
         self.client = app.test_client()
         # Reset the warehouse manager before each test
-        warehouse_manager._warehouses.clear()
-        warehouse_manager._next_id = 1
+        for warehouse_id, _ in warehouse_manager.get_all_warehouses():
+            warehouse_manager.delete_warehouse(warehouse_id)
+        warehouse_manager.index("ids").next_id = 1
 
     def test_index_page_loads(self):
         response = self.client.get("/")
@@ -117,6 +120,17 @@ class TestFlaskApp(unittest.TestCase):
         products = warehouse_manager.get_products(warehouse_id)
         self.assertEqual(products["Apple"], 20)
 
+    def test_update_flashes_the_clamped_quantity(self):
+        warehouse_id = warehouse_manager.create_warehouse("Limited")
+        warehouse_manager.set_capacity(warehouse_id, 5)
+        warehouse_manager.add_product(warehouse_id, "Apple", 1)
+        response = self.client.post(
+            f"/warehouse/{warehouse_id}/product/Apple/update",
+            data={"quantity": "8"},
+            follow_redirects=True,
+        )
+        self.assertIn(b"quantity updated to 5.", response.data)
+
     def test_clear_warehouse(self):
         warehouse_id = warehouse_manager.create_warehouse("Test Warehouse")
         warehouse_manager.add_product(warehouse_id, "Apple", 10)
@@ -127,3 +141,233 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         products = warehouse_manager.get_products(warehouse_id)
         self.assertEqual(products, {})
+
+    def test_batch_endpoint_applies_operations(self):
+        warehouse_id = warehouse_manager.create_warehouse("Dock")
+        response = self.client.post("/batch", json={"operations": [
+            {"op": "add", "warehouse_id": warehouse_id,
+             "product": "Apple", "quantity": 3},
+            {"op": "add", "warehouse_id": warehouse_id,
+             "product": "Apple", "quantity": 4},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json["applied"])
+        self.assertEqual(response.json["results"], [{"ok": True}, {"ok": True}])
+        products = warehouse_manager.get_products(warehouse_id)
+        self.assertEqual(products["Apple"], 7)
+
+    def test_batch_endpoint_reports_failed_operations(self):
+        response = self.client.post("/batch", json={"operations": [
+            {"op": "clear", "warehouse_id": 999},
+        ]})
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(response.json["applied"])
+        self.assertEqual(
+            response.json["results"],
+            [{"ok": False, "error": "warehouse not found"}],
+        )
+
+    def test_batch_endpoint_rejects_non_json(self):
+        response = self.client.post("/batch", data="nope")
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_paginates_warehouses(self):
+        for number in range(25):
+            warehouse_manager.create_warehouse(f"Warehouse {number:02}")
+        first_page = self.client.get("/").data
+        self.assertIn(b"Warehouse 19", first_page)
+        self.assertNotIn(b"Warehouse 20", first_page)
+        self.assertIn(b"page 1 of 2", first_page)
+        second_page = self.client.get("/?page=2").data
+        self.assertIn(b"Warehouse 24", second_page)
+        self.assertNotIn(b"Warehouse 19", second_page)
+
+    def test_index_filters_by_name_prefix(self):
+        warehouse_manager.create_warehouse("Helsinki")
+        warehouse_manager.create_warehouse("Tampere")
+        response = self.client.get("/?q=hel")
+        self.assertIn(b"Helsinki", response.data)
+        self.assertNotIn(b"Tampere", response.data)
+
+    def test_view_product_lists_holdings(self):
+        first = warehouse_manager.create_warehouse("North")
+        second = warehouse_manager.create_warehouse("South")
+        warehouse_manager.add_product(first, "Apple", 2)
+        warehouse_manager.add_product(second, "Apple", 3)
+        response = self.client.get("/product/Apple")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"North", response.data)
+        self.assertIn(b"South", response.data)
+        self.assertIn(b"Total quantity: 5", response.data)
+
+    def test_view_warehouse_shows_capacity(self):
+        warehouse_id = warehouse_manager.create_warehouse("Limited")
+        warehouse_manager.set_capacity(warehouse_id, 10)
+        warehouse_manager.add_product(warehouse_id, "Apple", 4)
+        response = self.client.get(f"/warehouse/{warehouse_id}")
+        self.assertIn(b"Capacity 10, free space 6", response.data)
+
+    def test_view_warehouse_pages_products(self):
+        warehouse_id = warehouse_manager.create_warehouse("Big")
+        warehouse_manager.import_products(
+            warehouse_id, [(f"P{number:03}", 1) for number in range(250)]
+        )
+        first = self.client.get(f"/warehouse/{warehouse_id}").data
+        self.assertIn(b"250 products, page 1 of 3", first)
+        self.assertIn(b">P099<", first)
+        self.assertNotIn(b">P100<", first)
+        last = self.client.get(f"/warehouse/{warehouse_id}?page=3").data
+        self.assertIn(b">P249<", last)
+        self.assertNotIn(b">P099<", last)
+
+    def test_view_warehouse_streams_all_products(self):
+        warehouse_id = warehouse_manager.create_warehouse("Big")
+        warehouse_manager.import_products(
+            warehouse_id, [(f"P{number:03}", 1) for number in range(250)]
+        )
+        response = self.client.get(f"/warehouse/{warehouse_id}?per_page=all")
+        self.assertTrue(response.is_streamed)
+        self.assertIn(b"250 products", response.data)
+        self.assertIn(b">P000<", response.data)
+        self.assertIn(b">P249<", response.data)
+
+    def test_product_urls_match_url_for(self):
+        warehouse_id = warehouse_manager.create_warehouse("Main")
+        warehouse_manager.add_product(warehouse_id, "Nuts & bolts/M4?", 1)
+        response = self.client.get(f"/warehouse/{warehouse_id}")
+        with app.test_request_context():
+            for endpoint in ("update_product", "remove_product"):
+                url = url_for(endpoint, warehouse_id=warehouse_id,
+                              product_name="Nuts & bolts/M4?")
+                self.assertIn(
+                    f'action="{url.replace("&", "&amp;")}"'.encode(),
+                    response.data,
+                )
+
+    def test_unchanged_page_is_not_modified(self):
+        warehouse_id = warehouse_manager.create_warehouse("Cached")
+        url = f"/warehouse/{warehouse_id}"
+        first = self.client.get(url)
+        self.assertIsNotNone(first.headers.get("ETag"))
+        second = self.client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(second.status_code, 304)
+
+    def test_mutation_invalidates_cached_page(self):
+        warehouse_id = warehouse_manager.create_warehouse("Cached")
+        url = f"/warehouse/{warehouse_id}"
+        etag = self.client.get(url).headers["ETag"]
+        warehouse_manager.add_product(warehouse_id, "Apple", 3)
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Apple", response.data)
+
+    def test_index_cache_follows_global_version(self):
+        self.client.get("/")
+        warehouse_manager.create_warehouse("Fresh")
+        self.assertIn(b"Fresh", self.client.get("/").data)
+
+    def test_pages_with_flash_messages_are_not_cached(self):
+        response = self.client.post(
+            "/warehouse/new", data={"name": "Flashy"}, follow_redirects=True
+        )
+        self.assertIn(b"created successfully", response.data)
+        self.assertIsNone(response.headers.get("ETag"))
+        self.assertNotIn(b"created successfully", self.client.get("/").data)
+
+    def test_import_uploaded_file(self):
+        warehouse_id = warehouse_manager.create_warehouse("Import")
+        upload = (io.BytesIO(b"product,quantity\nApple,4\nPear,x\n"), "stock.csv")
+        response = self.client.post(
+            f"/warehouse/{warehouse_id}/import",
+            data={"file": upload},
+            content_type="multipart/form-data",
+            follow_redirects=True,
+        )
+        self.assertIn(b"Imported 1 products.", response.data)
+        self.assertIn(b"Skipped 1 invalid rows.", response.data)
+        self.assertEqual(warehouse_manager.get_products(warehouse_id), {"Apple": 4})
+
+    def test_import_skips_lines_that_are_not_utf8(self):
+        warehouse_id = warehouse_manager.create_warehouse("Import")
+        data = "product,quantity\nPäär,1\nApple,4\n".encode("latin-1")
+        response = self.client.post(
+            f"/warehouse/{warehouse_id}/import",
+            data={"file": (io.BytesIO(data), "stock.csv")},
+            content_type="multipart/form-data",
+            follow_redirects=True,
+        )
+        self.assertIn(b"Imported 1 products.", response.data)
+        self.assertIn(b"Skipped 1 invalid rows.", response.data)
+
+    def test_import_without_file_flashes_error(self):
+        warehouse_id = warehouse_manager.create_warehouse("Import")
+        response = self.client.post(
+            f"/warehouse/{warehouse_id}/import", follow_redirects=True
+        )
+        self.assertIn(b"Choose a file to import.", response.data)
+
+    def read_events(self, url, count, **kwargs):
+        response = self.client.get(url, buffered=False, **kwargs)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        chunks = iter(response.response)
+        events = [next(chunks).decode() for _ in range(count)]
+        response.close()
+        return events
+
+    def test_event_stream_sends_changes_after_since(self):
+        since = warehouse_manager.index("feed").latest
+        warehouse_id = warehouse_manager.create_warehouse("Streamed")
+        warehouse_manager.add_product(warehouse_id, "Apple", 2)
+        created, added = self.read_events(f"/events?since={since}", 2)
+        self.assertEqual(
+            created.splitlines()[:2],
+            [f"id: {since + 1}", "event: warehouse_created"],
+        )
+        self.assertIn('"product": "Apple"', added)
+
+    def test_event_stream_resumes_from_last_event_id(self):
+        warehouse_id = warehouse_manager.create_warehouse("Streamed")
+        since = warehouse_manager.index("feed").latest
+        warehouse_manager.clear_warehouse(warehouse_id)
+        warehouse_manager.delete_warehouse(warehouse_id)
+        (event,) = self.read_events(
+            "/events?since=0", 1, headers={"Last-Event-ID": str(since)}
+        )
+        self.assertIn("event: warehouse_deleted", event)
+
+    def test_event_stream_resets_unknown_sequence(self):
+        latest = warehouse_manager.index("feed").latest
+        (event,) = self.read_events(f"/events?since={latest + 100}", 1)
+        self.assertIn("event: reset", event)
+        self.assertIn(f'"seq": {latest}', event)
+
+    def test_event_stream_sends_keepalives(self):
+        app.config["EVENTS_KEEPALIVE"] = 0.01
+        try:
+            (event,) = self.read_events("/events", 1)
+        finally:
+            app.config["EVENTS_KEEPALIVE"] = 15
+        self.assertEqual(event, ": keepalive\n\n")
+
+    def test_transfer_form(self):
+        source = warehouse_manager.create_warehouse("Source")
+        target = warehouse_manager.create_warehouse("Target")
+        warehouse_manager.add_product(source, "Apple", 5)
+        response = self.client.post(
+            f"/warehouse/{source}/transfer",
+            data={"product_name": "Apple", "target_id": str(target),
+                  "quantity": "2"},
+            follow_redirects=True,
+        )
+        self.assertIn(b"Moved 2.0 of &#39;Apple&#39; to warehouse 2.",
+                      response.data)
+        self.assertEqual(warehouse_manager.get_products(target), {"Apple": 2})
+
+    def test_transfer_form_rejects_unknown_target(self):
+        source = warehouse_manager.create_warehouse("Source")
+        response = self.client.post(
+            f"/warehouse/{source}/transfer",
+            data={"product_name": "Apple", "target_id": "9", "quantity": "1"},
+            follow_redirects=True,
+        )
+        self.assertIn(b"Invalid transfer.", response.data)
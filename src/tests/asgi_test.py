@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+import unittest
+from asgi import WarehouseApp
+from ohtuvarasto import Ohtuvarasto
+
+
+async def _call(app, method, path, body=None, query=b""):
+    """Send one HTTP request to an ASGI app; returns (status, JSON body)."""
+    content = b"" if body is None else json.dumps(body).encode()
+    messages = [{"type": "http.request", "body": content, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query,
+    }
+    await app(scope, receive, send)
+    payload = sent[1]["body"]
+    return sent[0]["status"], json.loads(payload) if payload else None
+
+
+class TestAsgiApp(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.app = WarehouseApp(self.manager)
+
+    def call(self, method, path, body=None, query=b""):
+        return asyncio.run(_call(self.app, method, "/api/v1" + path, body, query))
+
+    def test_create_and_list_warehouses(self):
+        status, body = self.call("POST", "/warehouses", {"name": "Main"})
+        self.assertEqual((status, body), (201, {"id": 1, "name": "Main"}))
+        status, body = self.call("GET", "/warehouses", query=b"per_page=5")
+        self.assertEqual(
+            body["warehouses"], [{"id": 1, "name": "Main", "product_count": 0}]
+        )
+        self.assertEqual(body["per_page"], 5)
+
+    def test_product_operations(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        path = f"/warehouses/{warehouse_id}/products"
+        status, body = self.call("POST", path, {"name": "Apple", "quantity": 3})
+        self.assertEqual(body, {"name": "Apple", "quantity": 3})
+        self.call("PUT", path + "/Apple", {"quantity": 5})
+        self.call("POST", path, {"name": "Pear", "quantity": 1})
+        status, _ = self.call("DELETE", path + "/Pear")
+        self.assertEqual(status, 204)
+        status, body = self.call("GET", f"/warehouses/{warehouse_id}")
+        self.assertEqual(body["products"], {"Apple": 5})
+        status, body = self.call("GET", "/products/Apple")
+        self.assertEqual(body["total"], 5)
+
+    def test_product_history(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        self.manager.add_product(warehouse_id, "Apple", 3)
+        path = f"/warehouses/{warehouse_id}/products/Apple/history"
+        status, body = self.call("GET", path)
+        self.assertEqual(status, 200)
+        self.assertEqual([sample["close"] for sample in body["samples"]], [3])
+        status, body = self.call("GET", path, query=b"at=0")
+        self.assertEqual(body, {"at": 0, "quantity": None})
+
+    def test_search_products(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        self.manager.add_product(warehouse_id, "Pineapple", 2)
+        self.manager.add_product(warehouse_id, "Apple", 3)
+        status, body = self.call("GET", "/products", query=b"q=APP")
+        self.assertEqual((status, body), (200, {"products": [
+            {"name": "Apple", "total": 3}, {"name": "Pineapple", "total": 2},
+        ]}))
+
+    def test_missing_warehouse_is_not_found(self):
+        self.assertEqual(self.call("GET", "/warehouses/9")[0], 404)
+        status, _ = self.call("POST", "/warehouses/9/products",
+                              {"name": "Apple", "quantity": 1})
+        self.assertEqual(status, 404)
+
+    def test_invalid_input_is_bad_request(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        status, body = self.call("POST", f"/warehouses/{warehouse_id}/products",
+                                 {"name": "Apple", "quantity": -1})
+        self.assertEqual(status, 400)
+        self.assertIn("error", body)
+
+    def test_unknown_route_and_method(self):
+        self.assertEqual(self.call("GET", "/nothing")[0], 404)
+        self.assertEqual(self.call("POST", "/products/Apple")[0], 405)
+
+    def test_capacity_and_room(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        status, body = self.call(
+            "PUT", f"/warehouses/{warehouse_id}/capacity", {"capacity": 10}
+        )
+        self.assertEqual(body["free_space"], 10)
+        status, body = self.call("GET", "/products/Apple/room",
+                                 query=b"quantity=4")
+        self.assertEqual(body["warehouses"], [{"id": warehouse_id, "room": 10}])
+
+    def test_updates_answer_with_the_clamped_quantity(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        self.manager.set_capacity(warehouse_id, 5)
+        path = f"/warehouses/{warehouse_id}/products"
+        _, body = self.call("POST", path, {"name": "Apple", "quantity": 9})
+        self.assertEqual(body, {"name": "Apple", "quantity": 5})
+        _, body = self.call("PUT", path + "/Apple", {"quantity": 8})
+        self.assertEqual(body, {"name": "Apple", "quantity": 5})
+
+    def test_concurrent_mutations_are_serialized(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        path = f"/api/v1/warehouses/{warehouse_id}/products"
+
+        async def add_many():
+            await asyncio.gather(*(
+                _call(self.app, "POST", path, {"name": "Apple", "quantity": 1})
+                for _ in range(200)
+            ))
+
+        asyncio.run(add_many())
+        self.assertEqual(self.manager.index("products").total("Apple"), 200)
+
+    def test_manager_is_not_called_on_the_event_loop(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        threads = []
+        index = self.manager.index
+
+        def record(name):
+            threads.append(threading.current_thread().name)
+            return index(name)
+
+        self.manager.index = record
+        for method, path, body in (
+            ("GET", "/warehouses", None),
+            ("GET", "/products/Apple", None),
+            ("GET", f"/warehouses/{warehouse_id}/products/Apple/history",
+             None),
+            ("PUT", f"/warehouses/{warehouse_id}/capacity", {"capacity": 1}),
+        ):
+            self.assertEqual(self.call(method, path, body)[0], 200)
+        self.assertEqual(len(threads), 4)
+        self.assertTrue(all(
+            name.startswith("ohtuvarasto-reader") for name in threads
+        ), threads)
+
+    def test_lifespan_shutdown_closes_manager(self):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        asyncio.run(self.app({"type": "lifespan"}, receive, send))
+        self.assertEqual(
+            sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
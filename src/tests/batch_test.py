@@ -0,0 +1,84 @@
+import tempfile
+import unittest
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage
+
+
+class TestApplyBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.first = self.manager.create_warehouse("A")
+        self.second = self.manager.create_warehouse("B")
+        self.manager.add_product(self.first, "Apple", 10)
+
+    def add(self, warehouse_id, product, quantity):
+        return {
+            "op": "add", "warehouse_id": warehouse_id,
+            "product": product, "quantity": quantity,
+        }
+
+    def test_valid_batch_is_applied(self):
+        applied, errors = self.manager.apply_batch([
+            self.add(self.first, "Apple", 5),
+            self.add(self.second, "Pear", 2),
+            {"op": "update", "warehouse_id": self.second,
+             "product": "Pear", "quantity": 7},
+        ])
+        self.assertTrue(applied)
+        self.assertEqual(errors, [None, None, None])
+        self.assertEqual(self.manager.get_products(self.first), {"Apple": 15})
+        self.assertEqual(self.manager.get_products(self.second), {"Pear": 7})
+
+    def test_invalid_operation_rolls_back_whole_batch(self):
+        applied, errors = self.manager.apply_batch([
+            self.add(self.first, "Apple", 5),
+            {"op": "remove", "warehouse_id": self.second, "product": "Nope"},
+        ])
+        self.assertFalse(applied)
+        self.assertEqual(errors, [None, "product not found"])
+        self.assertEqual(self.manager.get_products(self.first), {"Apple": 10})
+
+    def test_operations_see_earlier_operations_in_batch(self):
+        applied, _ = self.manager.apply_batch([
+            self.add(self.second, "Pear", 1),
+            {"op": "remove", "warehouse_id": self.second, "product": "Pear"},
+            self.add(self.second, "Pear", 3),
+        ])
+        self.assertTrue(applied)
+        self.assertEqual(self.manager.get_products(self.second), {"Pear": 3})
+
+    def test_clear_drops_earlier_changes_but_keeps_later_ones(self):
+        applied, _ = self.manager.apply_batch([
+            self.add(self.first, "Pear", 1),
+            {"op": "clear", "warehouse_id": self.first},
+            self.add(self.first, "Plum", 4),
+        ])
+        self.assertTrue(applied)
+        self.assertEqual(self.manager.get_products(self.first), {"Plum": 4})
+
+    def test_validation_errors(self):
+        _, errors = self.manager.apply_batch([
+            self.add(999, "Apple", 1),
+            self.add(self.first, "Apple", -1),
+            {"op": "explode", "warehouse_id": self.first},
+            {"warehouse_id": self.first},
+            self.add(self.first, ["Apple"], 1),
+            {"op": "update", "warehouse_id": self.first,
+             "product": "Nope", "quantity": 1},
+        ])
+        self.assertEqual(errors, [
+            "warehouse not found", "invalid quantity", "unknown operation",
+            "malformed operation", "malformed operation", "product not found",
+        ])
+
+    def test_batch_is_replayed_from_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = Ohtuvarasto(FileStorage(directory))
+            warehouse_id = manager.create_warehouse("A")
+            manager.apply_batch([self.add(warehouse_id, "Apple", 2)] * 3)
+            manager.close()
+            restored = Ohtuvarasto(FileStorage(directory))
+            products = restored.get_products(warehouse_id)
+            restored.close()
+        self.assertEqual(products, {"Apple": 6})
@@ -0,0 +1,40 @@
+import copy
+import unittest
+from benchmarks import suite
+
+
+def _contents(manager):
+    """Copies of the warehouses, unchanged by later writes."""
+    return [copy.deepcopy(manager.get_warehouse(wid)) for wid in (1, 2, 3)]
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_compare_flags_changes_beyond_the_threshold(self):
+        baseline = {name: {"best": 1.0} for name in "abcd"}
+        current = {"a": {"best": 1.05}, "b": {"best": 1.2},
+                   "c": {"best": 0.5}, "e": {"best": 1.0}}
+        self.assertEqual(suite.compare(baseline, current, 0.1), [
+            ("a", 1.0, 1.05, ""),
+            ("b", 1.0, 1.2, "slower"),
+            ("c", 1.0, 0.5, "faster"),
+        ])
+
+    def test_measure_reports_seconds_per_call(self):
+        calls = []
+        result = suite.measure(lambda: calls.append(1), 0.001, 3)
+        self.assertGreater(result["number"], 1)
+        # Calibrating takes 1 + 2 + ... + number calls, then 3 rounds.
+        self.assertEqual(len(calls), 5 * result["number"] - 1)
+        self.assertLessEqual(result["best"], result["median"])
+
+    def test_manager_cases_leave_the_inventory_unchanged(self):
+        manager = suite.populated(3, 4)
+        before = _contents(manager)
+        for case in suite._manager_cases(manager).values():
+            case()
+            case()
+        manager.remove_product(2, "Extra")
+        manager.set_capacity(2, None, "Extra")
+        self.assertEqual(_contents(manager), before)
+        self.assertEqual(manager.index("alerts").low_stock(), [])
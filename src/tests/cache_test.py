@@ -0,0 +1,58 @@
+import unittest
+from cache import ResponseCache
+from ohtuvarasto import Ohtuvarasto
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", ("A", "text/html"))
+        cache.put("b", ("B", "text/html"))
+        cache.get("a")
+        cache.put("c", ("C", "text/html"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), ("A", "text/html"))
+        self.assertEqual(len(cache), 2)
+
+    def test_etag_depends_on_key(self):
+        cache = ResponseCache()
+        self.assertEqual(cache.etag(("index", 1)), cache.etag(("index", 1)))
+        self.assertNotEqual(cache.etag(("index", 1)), cache.etag(("index", 2)))
+        self.assertNotEqual(cache.etag("x"), ResponseCache().etag("x"))
+
+
+class TestVersions(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.first = self.manager.create_warehouse("A")
+        self.second = self.manager.create_warehouse("B")
+        self.versions = self.manager.index("versions")
+
+    def test_every_mutation_bumps_versions(self):
+        mutations = [
+            lambda: self.manager.add_product(self.first, "Apple", 1),
+            lambda: self.manager.update_product_quantity(self.first, "Apple", 3),
+            lambda: self.manager.update_warehouse_name(self.first, "C"),
+            lambda: self.manager.set_capacity(self.first, 10),
+            lambda: self.manager.remove_product(self.first, "Apple"),
+            lambda: self.manager.add_product(self.first, "Pear", 1),
+            lambda: self.manager.clear_warehouse(self.first),
+        ]
+        for mutate in mutations:
+            before = (self.versions.version(), self.versions.version(self.first))
+            mutate()
+            after = (self.versions.version(), self.versions.version(self.first))
+            self.assertGreater(after[0], before[0])
+            self.assertGreater(after[1], before[1])
+
+    def test_other_warehouses_keep_their_version(self):
+        version = self.versions.version(self.second)
+        self.manager.add_product(self.first, "Apple", 1)
+        self.assertEqual(self.versions.version(self.second), version)
+
+    def test_failed_mutation_does_not_bump(self):
+        version = self.versions.version()
+        self.manager.remove_product(self.first, "Nope")
+        self.assertEqual(self.versions.version(), version)
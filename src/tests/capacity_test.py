@@ -0,0 +1,108 @@
+import tempfile
+import unittest
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage
+
+
+class TestCapacities(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.warehouse_id = self.manager.create_warehouse("Main")
+        self.capacity = self.manager.index("capacity")
+
+    def products(self):
+        return self.manager.get_products(self.warehouse_id)
+
+    def test_warehouses_are_unlimited_by_default(self):
+        self.manager.add_product(self.warehouse_id, "Apple", 10**9)
+        self.assertEqual(self.capacity.free_space(self.warehouse_id), float("inf"))
+
+    def test_add_is_clamped_to_warehouse_capacity(self):
+        self.manager.set_capacity(self.warehouse_id, 10)
+        self.manager.add_product(self.warehouse_id, "Apple", 6)
+        self.assertTrue(self.manager.add_product(self.warehouse_id, "Pear", 6))
+        self.assertEqual(self.products(), {"Apple": 6, "Pear": 4})
+        self.assertEqual(self.capacity.free_space(self.warehouse_id), 0)
+
+    def test_add_is_clamped_to_product_capacity(self):
+        self.manager.set_capacity(self.warehouse_id, 5, "Apple")
+        self.manager.add_product(self.warehouse_id, "Apple", 3)
+        self.manager.add_product(self.warehouse_id, "Apple", 3)
+        self.manager.add_product(self.warehouse_id, "Pear", 30)
+        self.assertEqual(self.products(), {"Apple": 5, "Pear": 30})
+
+    def test_update_is_clamped_like_varasto_constructor(self):
+        self.manager.set_capacity(self.warehouse_id, 10)
+        self.manager.add_product(self.warehouse_id, "Apple", 4)
+        self.manager.add_product(self.warehouse_id, "Pear", 4)
+        self.manager.update_product_quantity(self.warehouse_id, "Apple", 50)
+        self.assertEqual(self.products()["Apple"], 6)
+
+    def test_free_space_follows_removals(self):
+        self.manager.set_capacity(self.warehouse_id, 10)
+        self.manager.add_product(self.warehouse_id, "Apple", 4)
+        self.manager.remove_product(self.warehouse_id, "Apple")
+        self.assertEqual(self.capacity.free_space(self.warehouse_id), 10)
+
+    def test_removing_capacity(self):
+        self.manager.set_capacity(self.warehouse_id, 1)
+        self.manager.set_capacity(self.warehouse_id, None)
+        self.manager.add_product(self.warehouse_id, "Apple", 5)
+        self.assertEqual(self.products(), {"Apple": 5})
+
+    def test_batches_are_clamped(self):
+        self.manager.set_capacity(self.warehouse_id, 3, "Apple")
+        applied, _ = self.manager.apply_batch([
+            {"op": "add", "warehouse_id": self.warehouse_id,
+             "product": "Apple", "quantity": 2},
+            {"op": "add", "warehouse_id": self.warehouse_id,
+             "product": "Apple", "quantity": 2},
+        ])
+        self.assertTrue(applied)
+        self.assertEqual(self.products(), {"Apple": 3})
+
+    def test_warehouses_with_room_sorted_by_free_space(self):
+        small = self.manager.create_warehouse("Small")
+        large = self.manager.create_warehouse("Large")
+        self.manager.set_capacity(self.warehouse_id, 5)
+        self.manager.set_capacity(small, 10)
+        self.manager.set_capacity(large, 100)
+        self.manager.add_product(large, "Apple", 95)
+        self.assertEqual(
+            self.capacity.with_room("Pear", 5),
+            [(small, 10), (large, 5), (self.warehouse_id, 5)],
+        )
+        self.assertEqual(self.capacity.with_room("Pear", 6), [(small, 10)])
+
+    def test_warehouses_with_room_respects_product_capacity(self):
+        self.manager.set_capacity(self.warehouse_id, 100)
+        self.manager.set_capacity(self.warehouse_id, 2, "Apple")
+        other = self.manager.create_warehouse("Other")
+        self.manager.set_capacity(other, 50)
+        self.assertEqual(self.capacity.with_room("Apple", 5), [(other, 50)])
+        self.assertEqual(
+            self.capacity.with_room("Apple", 1, limit=1),
+            [(self.warehouse_id, 2)],
+        )
+
+    def test_unlimited_warehouses_come_first(self):
+        self.manager.set_capacity(self.warehouse_id, 5)
+        unlimited = self.manager.create_warehouse("Unlimited")
+        rooms = self.capacity.with_room("Apple", 1)
+        self.assertEqual(rooms[0], (unlimited, float("inf")))
+
+    def test_capacities_survive_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = Ohtuvarasto(FileStorage(directory))
+            warehouse_id = manager.create_warehouse("Main")
+            manager.set_capacity(warehouse_id, 10)
+            manager.set_capacity(warehouse_id, 3, "Apple")
+            manager.snapshot()
+            manager.add_product(warehouse_id, "Apple", 5)
+            manager.close()
+            restored = Ohtuvarasto(FileStorage(directory))
+            restored.add_product(warehouse_id, "Pear", 20)
+            products = restored.get_products(warehouse_id)
+            restored.close()
+        self.assertEqual(products, {"Apple": 3, "Pear": 7})
@@ -0,0 +1,104 @@
+import tempfile
+import threading
+import unittest
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage, SyncPolicy
+
+THREADS = 16
+ROUNDS = 500
+
+
+def run_threads(target, count=THREADS):
+    """Start ``count`` threads running ``target(index)`` together and wait."""
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        barrier.wait()
+        target(index)
+
+    threads = [
+        threading.Thread(target=worker, args=(index,)) for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class TestConcurrentOhtuvarasto(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+
+    def test_concurrent_adds_to_one_warehouse_are_not_lost(self):
+        warehouse_id = self.manager.create_warehouse("Shared")
+
+        def add(_index):
+            for _ in range(ROUNDS):
+                self.manager.add_product(warehouse_id, "Apple", 1)
+
+        run_threads(add)
+        products = self.manager.get_products(warehouse_id)
+        self.assertEqual(products["Apple"], THREADS * ROUNDS)
+
+    def test_concurrent_creates_hand_out_unique_ids(self):
+        created = [[] for _ in range(THREADS)]
+
+        def create(index):
+            for _ in range(ROUNDS // 10):
+                created[index].append(self.manager.create_warehouse("W"))
+
+        run_threads(create)
+        ids = [wid for chunk in created for wid in chunk]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(len(self.manager.get_all_warehouses()), len(ids))
+
+    def test_mixed_workload_keeps_totals(self):
+        warehouse_ids = [self.manager.create_warehouse(f"W{i}") for i in range(4)]
+
+        def work(index):
+            own = warehouse_ids[index % len(warehouse_ids)]
+            for round_number in range(ROUNDS):
+                self.manager.add_product(own, f"P{round_number % 5}", 2)
+                self.manager.get_products(own)
+
+        run_threads(work)
+        total = sum(
+            sum(self.manager.get_products(wid).values()) for wid in warehouse_ids
+        )
+        self.assertEqual(total, THREADS * ROUNDS * 2)
+
+    def test_locked_warehouse_does_not_block_others(self):
+        first = self.manager.create_warehouse("A")
+        second = self.manager.create_warehouse("B")
+        self.assertIsNot(
+            self.manager._lock_for(first), self.manager._lock_for(second)
+        )
+        finished = threading.Event()
+
+        def add_to_second():
+            self.manager.add_product(second, "Apple", 1)
+            finished.set()
+
+        with self.manager._lock_for(first):
+            thread = threading.Thread(target=add_to_second)
+            thread.start()
+            self.assertTrue(finished.wait(timeout=5))
+        thread.join()
+
+    def test_concurrent_writes_replay_from_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            policy = SyncPolicy(snapshot_every=1000)
+            manager = Ohtuvarasto(FileStorage(directory, policy))
+            warehouse_id = manager.create_warehouse("Shared")
+
+            def add(_index):
+                for _ in range(ROUNDS // 5):
+                    manager.add_product(warehouse_id, "Apple", 1)
+
+            run_threads(add)
+            manager.close()
+            restored = Ohtuvarasto(FileStorage(directory, policy))
+            products = restored.get_products(warehouse_id)
+            restored.close()
+        self.assertEqual(products["Apple"], THREADS * ROUNDS // 5)
@@ -0,0 +1,84 @@
+import threading
+import unittest
+from feed import ChangeFeed
+from ohtuvarasto import Ohtuvarasto
+from quantities import FixedQuantities
+
+
+class TestChangeFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.feed = ChangeFeed(size=3)
+
+    def test_events_are_numbered_in_order(self):
+        self.feed.warehouse_created(1, "Main")
+        self.feed.product_changed(1, "Apple", None, 5)
+        self.assertEqual(self.feed.latest, 2)
+        self.assertEqual(self.feed.since(0, timeout=0), [
+            {"seq": 1, "type": "warehouse_created", "warehouse_id": 1,
+             "name": "Main"},
+            {"seq": 2, "type": "product_changed", "warehouse_id": 1,
+             "product": "Apple", "old": None, "quantity": 5},
+        ])
+        self.assertEqual(self.feed.since(2, timeout=0), [])
+
+    def test_old_events_are_dropped(self):
+        for warehouse_id in range(5):
+            self.feed.warehouse_deleted(warehouse_id, "W")
+        self.assertIsNone(self.feed.since(1, timeout=0))
+        self.assertEqual(
+            [event["seq"] for event in self.feed.since(2, timeout=0)],
+            [3, 4, 5],
+        )
+
+    def test_sequence_ahead_of_the_feed_is_rejected(self):
+        self.assertIsNone(self.feed.since(7, timeout=0))
+
+    def test_waits_for_the_next_event(self):
+        timer = threading.Timer(
+            0.05, self.feed.warehouse_renamed, (1, "Old", "New")
+        )
+        timer.start()
+        events = self.feed.since(0, timeout=5)
+        timer.join()
+        self.assertEqual(events[0]["name"], "New")
+
+    def test_wait_times_out(self):
+        self.assertEqual(self.feed.since(0, timeout=0.01), [])
+
+
+class TestOhtuvarastoChanges(unittest.TestCase):
+
+    def test_every_mutation_is_in_the_feed(self):
+        manager = Ohtuvarasto()
+        start = manager.index("feed").latest
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 3)
+        manager.set_capacity(warehouse_id, 10)
+        manager.apply_batch([
+            {"op": "add", "warehouse_id": warehouse_id, "product": "Pear",
+             "quantity": 1},
+            {"op": "remove", "warehouse_id": warehouse_id, "product": "Apple"},
+        ])
+        manager.delete_warehouse(warehouse_id)
+        events = manager.index("feed").since(start)
+        self.assertEqual([event["type"] for event in events], [
+            "warehouse_created", "product_changed", "capacity_changed",
+            "product_changed", "product_changed",
+            "product_changed", "warehouse_deleted",
+        ])
+        self.assertEqual(events[-1]["seq"], manager.index("feed").latest)
+
+    def test_quantities_are_reported_as_numbers(self):
+        manager = Ohtuvarasto(quantities=FixedQuantities(2))
+        warehouse_id = manager.create_warehouse("Main")
+        start = manager.index("feed").latest
+        manager.set_capacity(warehouse_id, 1000)
+        manager.add_product(warehouse_id, "Apple", 250)
+        manager.add_product(warehouse_id, "Apple", 5)
+        events = manager.index("feed").since(start)
+        self.assertEqual(events[0]["capacity"], 10)
+        self.assertEqual(
+            [(event["old"], event["quantity"]) for event in events[1:]],
+            [(None, 2.5), (2.5, 2.55)],
+        )
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from history import HOUR, MINUTE, Retention, Sample, StockHistory
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage, SqliteStorage, SyncPolicy
+
+
+class Clock:
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestStockHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.history = StockHistory(
+            self.clock, Retention(raw=10 * MINUTE, minutes=2 * HOUR,
+                                  hours=24 * HOUR, raw_chunks=4),
+        )
+
+    def change(self, quantity, after=1.0, product="Apple"):
+        self.clock.now += after
+        self.history.product_changed(1, product, None, quantity)
+
+    def test_point_in_time(self):
+        start = self.clock.now
+        self.change(5)
+        self.change(7, after=10)
+        self.change(None, after=10)
+        self.assertIsNone(self.history.at(1, "Apple", start))
+        self.assertEqual(self.history.at(1, "Apple", start + 1), 5)
+        self.assertEqual(self.history.at(1, "Apple", start + 15), 7)
+        self.assertEqual(self.history.at(1, "Apple", start + 100), 0)
+        self.assertIsNone(self.history.at(1, "Pear", start + 100))
+        self.assertIsNone(self.history.at(2, "Apple", start + 100))
+
+    def test_range_of_raw_changes(self):
+        start = self.clock.now
+        for quantity in range(5):
+            self.change(quantity)
+        self.assertEqual(
+            self.history.samples(1, "Apple", start + 2, start + 4),
+            [Sample(start + 2, 0, 1, 1, 1), Sample(start + 3, 0, 2, 2, 2)],
+        )
+
+    def test_old_changes_are_rolled_up(self):
+        with mock.patch("history.CHUNK", 4):
+            start = self.clock.now - self.clock.now % HOUR
+            self.clock.now = start
+            for quantity in (3, 9, 1, 4):  # one chunk within one minute
+                self.change(quantity)
+            for quantity in range(16):
+                self.change(quantity, after=20 * MINUTE)
+        # The first hour also holds the changes at 20 and 40 minutes.
+        first = self.history.samples(1, "Apple", start, start + MINUTE)
+        self.assertEqual(first, [Sample(start, HOUR, 0, 9, 1)])
+        self.assertEqual(self.history.at(1, "Apple", start + 30), 1)
+        minute = start + 200 * MINUTE
+        self.assertEqual(
+            self.history.samples(1, "Apple", minute, minute + 1),
+            [Sample(minute, MINUTE, 9, 9, 9)],
+        )
+        self.assertEqual(self.history.at(1, "Apple", self.clock.now), 15)
+
+    def test_memory_is_bounded(self):
+        with mock.patch("history.CHUNK", 8):
+            for quantity in range(20_000):
+                self.change(quantity % 50, after=7)
+        series = self.history._get(1, "Apple")
+        self.assertLessEqual(len(series.raw.chunks), 4)
+        self.assertLessEqual(len(series.minutes.starts), 2 * 60 + 1)
+        self.assertLessEqual(len(series.hours.starts), 24 + 1)
+        samples = self.history.samples(1, "Apple", 0, self.clock.now + 1)
+        self.assertEqual([s.time for s in samples],
+                         sorted(s.time for s in samples))
+
+    def test_exported_series_can_be_adopted(self):
+        self.change(5)
+        self.change(7)
+        other = StockHistory(self.clock)
+        other.product_changed(1, "Apple", None, 7)
+        other.adopt(1, self.history.export(1))
+        self.assertEqual(
+            other.samples(1, "Apple", 0, self.clock.now + 1),
+            self.history.samples(1, "Apple", 0, self.clock.now + 1),
+        )
+        self.assertEqual(len(other.samples(1, "Apple", 0, 2_000_000)), 2)
+
+    def test_deleted_warehouse_is_forgotten(self):
+        self.change(5)
+        self.history.warehouse_deleted(1, "Main")
+        self.assertIsNone(self.history.at(1, "Apple", self.clock.now))
+
+
+class TestManagerHistory(unittest.TestCase):
+
+    def test_every_mutation_is_recorded(self):
+        manager = Ohtuvarasto()
+        clock = Clock()
+        manager.index("history")._clock = clock
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 5)
+        clock.now += 60
+        manager.update_product_quantity(warehouse_id, "Apple", 2)
+        clock.now += 60
+        manager.clear_warehouse(warehouse_id)
+        self.assertEqual(
+            [manager.index("history").at(warehouse_id, "Apple", clock.now - seconds)
+             for seconds in (150, 90, 30, 0)],
+            [None, 5, 2, 0],
+        )
+        self.assertEqual(len(manager.index("history").samples(
+            warehouse_id, "Apple", 0, clock.now + 1
+        )), 3)
+
+    def restored_samples(self, storage):
+        with mock.patch("observers.time") as clock:
+            clock.time.return_value = 100.0
+            manager = Ohtuvarasto(storage())
+            warehouse_id = manager.create_warehouse("Main")
+            for _ in range(3):
+                clock.time.return_value += 100
+                manager.add_product(warehouse_id, "Apple", 1)
+            manager.close()
+        restored = Ohtuvarasto(storage())
+        history = restored.index("history")
+        samples = history.samples(warehouse_id, "Apple", 0, 1e12)
+        before = history.at(warehouse_id, "Apple", 150.0)
+        restored.close()
+        return [(sample.time, sample.close) for sample in samples], before
+
+    def test_history_is_replayed_at_the_logged_times(self):
+        with tempfile.TemporaryDirectory() as directory:
+            samples, before = self.restored_samples(
+                lambda: FileStorage(directory)
+            )
+        self.assertEqual(samples, [(200.0, 1), (300.0, 2), (400.0, 3)])
+        self.assertIsNone(before)
+
+    def test_history_restarts_at_the_snapshot_time(self):
+        with tempfile.TemporaryDirectory() as directory:
+            samples, _ = self.restored_samples(
+                lambda: FileStorage(directory, SyncPolicy(snapshot_every=3))
+            )
+        self.assertEqual(samples, [(300.0, 2), (400.0, 3)])
+
+    def test_sqlite_log_keeps_the_times(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ohtuvarasto.db")
+            samples, _ = self.restored_samples(lambda: SqliteStorage(path))
+        self.assertEqual(samples, [(200.0, 1), (300.0, 2), (400.0, 3)])
@@ -0,0 +1,125 @@
+import unittest
+from indexes import WarehouseQuery
+from ohtuvarasto import Ohtuvarasto
+
+
+class TestWarehouseListing(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.ids = {
+            name: self.manager.create_warehouse(name)
+            for name in ["Oulu", "helsinki", "Espoo", "Hamina", "Turku"]
+        }
+        self.manager.add_product(self.ids["Turku"], "Apple", 1)
+        self.manager.add_product(self.ids["Turku"], "Pear", 1)
+        self.manager.add_product(self.ids["Espoo"], "Apple", 1)
+
+    def names(self, **query):
+        page = self.manager.index("listing").page(WarehouseQuery(**query))
+        return [data["name"] for _, data in page.items]
+
+    def test_default_page_is_sorted_by_id(self):
+        page = self.manager.index("listing").page()
+        self.assertEqual([wid for wid, _ in page.items], [1, 2, 3, 4, 5])
+        self.assertEqual(page.total, 5)
+
+    def test_offset_and_limit(self):
+        self.assertEqual(self.names(offset=1, limit=2), ["helsinki", "Espoo"])
+        self.assertEqual(self.names(offset=4, limit=2), ["Turku"])
+        self.assertEqual(self.names(offset=9), [])
+
+    def test_sort_by_name_is_case_insensitive(self):
+        self.assertEqual(
+            self.names(sort="name"),
+            ["Espoo", "Hamina", "helsinki", "Oulu", "Turku"],
+        )
+        self.assertEqual(
+            self.names(sort="name", descending=True, limit=2),
+            ["Turku", "Oulu"],
+        )
+
+    def test_sort_by_product_count(self):
+        self.assertEqual(
+            self.names(sort="products", descending=True, limit=2),
+            ["Turku", "Espoo"],
+        )
+        self.manager.clear_warehouse(self.ids["Turku"])
+        self.assertEqual(self.names(sort="products", descending=True)[0], "Espoo")
+
+    def test_name_prefix_filter(self):
+        page = self.manager.index("listing").page(
+            WarehouseQuery(sort="name", name_prefix="H")
+        )
+        self.assertEqual(page.total, 2)
+        self.assertEqual(self.names(name_prefix="h", descending=True),
+                         ["Hamina", "helsinki"])
+        self.assertEqual(self.names(sort="products", name_prefix="h",
+                                    descending=True, offset=1), ["helsinki"])
+
+    def test_listing_follows_renames_and_deletes(self):
+        self.manager.update_warehouse_name(self.ids["Oulu"], "Aura")
+        self.manager.delete_warehouse(self.ids["Espoo"])
+        self.assertEqual(
+            self.names(sort="name"), ["Aura", "Hamina", "helsinki", "Turku"]
+        )
+
+    def test_unknown_sort_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.manager.index("listing").page(WarehouseQuery(sort="size"))
+
+    def test_observer_added_later_sees_current_state(self):
+        seen = []
+
+        class Recorder:
+            def warehouse_created(self, warehouse_id, name):
+                seen.append(("created", warehouse_id))
+
+            def product_changed(self, warehouse_id, product_name, old, new):
+                seen.append((product_name, old, new))
+
+        self.manager.add_observer(Recorder())
+        self.assertIn(("created", self.ids["Oulu"]), seen)
+        self.assertIn(("Pear", None, 1), seen)
+
+
+class TestProductIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.first = self.manager.create_warehouse("A")
+        self.second = self.manager.create_warehouse("B")
+        self.manager.add_product(self.first, "Apple", 10)
+        self.manager.add_product(self.second, "Apple", 5)
+        self.manager.add_product(self.second, "Pear", 1)
+
+    def test_find_product_and_total(self):
+        self.assertEqual(
+            self.manager.index("products").holdings("Apple"), {self.first: 10, self.second: 5}
+        )
+        self.assertEqual(self.manager.index("products").total("Apple"), 15)
+
+    def test_unknown_product(self):
+        self.assertEqual(self.manager.index("products").holdings("Plum"), {})
+        self.assertEqual(self.manager.index("products").total("Plum"), 0)
+
+    def test_index_follows_every_mutation(self):
+        self.manager.add_product(self.first, "Apple", 2)
+        self.manager.update_product_quantity(self.second, "Apple", 1)
+        self.assertEqual(self.manager.index("products").total("Apple"), 13)
+        self.manager.remove_product(self.first, "Apple")
+        self.assertEqual(self.manager.index("products").holdings("Apple"), {self.second: 1})
+        self.manager.clear_warehouse(self.second)
+        self.assertEqual(self.manager.index("products").total("Apple"), 0)
+        self.manager.add_product(self.first, "Pear", 4)
+        self.manager.delete_warehouse(self.first)
+        self.assertEqual(self.manager.index("products").holdings("Pear"), {})
+
+    def test_index_follows_batches(self):
+        self.manager.apply_batch([
+            {"op": "clear", "warehouse_id": self.second},
+            {"op": "add", "warehouse_id": self.first,
+             "product": "Pear", "quantity": 3},
+        ])
+        self.assertEqual(self.manager.index("products").holdings("Pear"), {self.first: 3})
+        self.assertEqual(self.manager.index("products").total("Apple"), 10)
@@ -0,0 +1,156 @@
+import io
+import tempfile
+import unittest
+import inventory
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage
+
+
+def _csv(text):
+    return inventory.read_csv(io.StringIO(text))
+
+
+def _jsonl(text):
+    return inventory.read_jsonl(io.StringIO(text))
+
+
+class TestInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.warehouse_id = self.manager.create_warehouse("Main")
+        self.rejected = inventory.Rejected()
+
+    def export(self, fmt, warehouse_ids=None):
+        rows = inventory.export_rows(self.manager, warehouse_ids)
+        return "".join(inventory.WRITERS[fmt](rows))
+
+    def test_import_csv_adds_products(self):
+        self.manager.add_product(self.warehouse_id, "Apple", 1)
+        rows = _csv("product,quantity\nApple,2\nPear,3.5\n")
+        imported = inventory.import_products(
+            self.manager, self.warehouse_id, rows, self.rejected
+        )
+        self.assertEqual(imported, 2)
+        self.assertEqual(
+            self.manager.get_products(self.warehouse_id),
+            {"Apple": 3, "Pear": 3.5},
+        )
+
+    def test_invalid_rows_are_skipped_and_reported(self):
+        rows = _jsonl(
+            '{"product": "Apple", "quantity": 2}\n'
+            "\n"
+            "not json\n"
+            '{"product": "", "quantity": 1}\n'
+            '{"product": "Pear", "quantity": -1}\n'
+            '{"product": "Plum", "quantity": "many"}\n'
+        )
+        imported = inventory.import_products(
+            self.manager, self.warehouse_id, rows, self.rejected
+        )
+        self.assertEqual(imported, 1)
+        self.assertEqual(self.rejected.count, 4)
+        self.assertEqual(self.rejected.errors, [
+            (3, "malformed row"),
+            (4, "missing product"),
+            (5, "invalid quantity"),
+            (6, "invalid quantity"),
+        ])
+
+    def test_import_into_missing_warehouse_returns_none(self):
+        rows = _csv("product,quantity\nApple,2\n")
+        self.assertIsNone(
+            inventory.import_products(self.manager, 999, rows, self.rejected)
+        )
+
+    def test_import_respects_capacity(self):
+        self.manager.set_capacity(self.warehouse_id, 5)
+        rows = _csv("product,quantity\nApple,4\nPear,4\n")
+        inventory.import_products(
+            self.manager, self.warehouse_id, rows, self.rejected
+        )
+        self.assertEqual(
+            self.manager.get_products(self.warehouse_id),
+            {"Apple": 4, "Pear": 1},
+        )
+
+    def test_export_is_chunked(self):
+        products = ((f"P{number}", number) for number in range(2500))
+        self.manager.import_products(self.warehouse_id, products)
+        chunks = list(inventory.write_jsonl(
+            inventory.export_rows(self.manager)
+        ))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count("\n") for chunk in chunks), 2500)
+
+    def test_csv_export_restores_into_empty_manager(self):
+        self.manager.add_product(self.warehouse_id, "Apple", 2)
+        self.manager.add_product(self.warehouse_id, "Pear", 1.5)
+        self.manager.create_warehouse("Empty")
+        exported = self.export("csv")
+
+        restored = Ohtuvarasto()
+        created = inventory.restore(restored, _csv(exported), self.rejected)
+        self.assertEqual(created, 2)
+        self.assertEqual(self.rejected.count, 0)
+        (first, data), (second, empty) = restored.get_all_warehouses()
+        self.assertEqual(data["name"], "Main")
+        self.assertEqual(
+            restored.get_products(first), {"Apple": 2.0, "Pear": 1.5}
+        )
+        self.assertEqual(empty["name"], "Empty")
+        self.assertEqual(restored.get_products(second), {})
+
+    def test_jsonl_export_round_trips(self):
+        self.manager.add_product(self.warehouse_id, "Apple", 2)
+        exported = self.export("jsonl", [self.warehouse_id])
+        restored = Ohtuvarasto()
+        inventory.restore(restored, _jsonl(exported), self.rejected)
+        self.assertEqual(restored.get_products(1), {"Apple": 2})
+
+    def test_restore_rejects_rows_without_warehouse(self):
+        rows = _csv("product,quantity\nApple,2\n")
+        self.assertEqual(inventory.restore(self.manager, rows, self.rejected), 0)
+        self.assertEqual(self.rejected.errors, [(2, "missing warehouse")])
+
+    def test_format_of_uses_extension(self):
+        self.assertEqual(inventory.format_of("stock.CSV"), "csv")
+        self.assertEqual(inventory.format_of("stock.ndjson"), "jsonl")
+        self.assertEqual(inventory.format_of("stock"), "csv")
+
+    def test_text_lines_drops_byte_order_mark(self):
+        binary = io.BytesIO("\ufeffproduct,quantity\nApple,1\n".encode())
+        rows = list(inventory.read_csv(
+            inventory.text_lines(binary, self.rejected)
+        ))
+        self.assertEqual(rows, [(2, {"product": "Apple", "quantity": "1"})])
+
+    def test_text_lines_rejects_lines_that_are_not_utf8(self):
+        binary = io.BytesIO("product,quantity\nPäär,1\nApple,2\n".encode(
+            "latin-1"
+        ))
+        rows = list(inventory.read_csv(
+            inventory.text_lines(binary, self.rejected)
+        ))
+        self.assertEqual(rows, [(2, {"product": "Apple", "quantity": "2"})])
+        self.assertEqual(self.rejected.errors, [(2, "not valid UTF-8")])
+
+
+class TestBulkImport(unittest.TestCase):
+
+    def test_chunks_are_logged_and_replayed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = Ohtuvarasto(FileStorage(directory))
+            warehouse_id = manager.create_warehouse("Main")
+            products = [(f"P{number}", 1) for number in range(25)]
+            self.assertEqual(
+                manager.import_products(warehouse_id, products, chunk_size=10),
+                25,
+            )
+            manager.close()
+            with open(f"{directory}/wal.jsonl", encoding="utf-8") as log:
+                self.assertEqual(len(log.readlines()), 4)
+            restored = Ohtuvarasto(FileStorage(directory))
+            self.assertEqual(len(restored.get_products(warehouse_id)), 25)
+            self.assertEqual(restored.index("products").total("P3"), 1)
@@ -0,0 +1,125 @@
+import os
+import unittest
+from unittest import mock
+from flask import Flask
+import metrics
+from app import app, warehouse_manager
+from ohtuvarasto import Ohtuvarasto
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.collect(), ([2, 3, 4], 4, 3.65))
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_render_prometheus_text(self):
+        registry = metrics.Registry()
+        registry.gauge("things", "Number of things.", lambda: 3)
+        histogram = registry.histogram("took_seconds", "Time.", kind='a"b')
+        histogram.buckets = (1.0,)
+        histogram.observe(0.5)
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP things Number of things.",
+            "# TYPE things gauge",
+            "things 3",
+            "# HELP took_seconds Time.",
+            "# TYPE took_seconds histogram",
+            'took_seconds_bucket{kind="a\\"b",le="1.0"} 1',
+            'took_seconds_bucket{kind="a\\"b",le="+Inf"} 1',
+            'took_seconds_sum{kind="a\\"b"} 0.5',
+            'took_seconds_count{kind="a\\"b"} 1',
+        ])
+
+    def test_same_labels_share_a_histogram(self):
+        registry = metrics.Registry()
+        first = registry.histogram("x", "X.", a=1, b=2)
+        self.assertIs(registry.histogram("x", "X.", b=2, a=1), first)
+
+
+class TestInstrumentManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.manager.create_warehouse("Existing")
+        self.registry = metrics.Registry()
+        metrics.instrument_manager(self.manager, self.registry)
+
+    def count(self, method):
+        histogram = self.registry.histogram(
+            "ohtuvarasto_manager_seconds", "", method=method
+        )
+        return histogram.collect()[1]
+
+    def test_calls_are_timed(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        self.manager.add_product(warehouse_id, "Apple", 1)
+        self.manager.add_product(warehouse_id, "Pear", 1)
+        self.assertEqual(self.count("create_warehouse"), 1)
+        self.assertEqual(self.count("add_product"), 2)
+        self.assertEqual(self.count("get_products"), 0)
+
+    def test_counts_warehouses_and_products(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        self.manager.add_product(warehouse_id, "Apple", 1)
+        self.manager.add_product(warehouse_id, "Apple", 1)
+        self.manager.add_product(1, "Apple", 1)
+        self.manager.remove_product(1, "Apple")
+        text = self.registry.render()
+        self.assertIn("\nohtuvarasto_warehouses 2\n", text)
+        self.assertIn("\nohtuvarasto_products 1\n", text)
+
+    def test_index_queries_are_timed(self):
+        warehouse_id = self.manager.create_warehouse("Main")
+        self.manager.add_product(warehouse_id, "Apple", 2)
+        products = self.manager.index("products")
+        self.assertEqual(products.total("Apple"), 2)
+        self.assertEqual(self.manager.index("products").total("Pear"), 0)
+        self.assertEqual(self.manager.index("ids").next_id, 3)
+        histogram = self.registry.histogram(
+            "ohtuvarasto_index_seconds", "", index="products", method="total"
+        )
+        self.assertEqual(histogram.collect()[1], 2)
+
+    def test_untimed_methods_are_left_alone(self):
+        self.assertNotIn("changes", vars(self.manager))
+        self.assertNotIn("staged_batch", vars(self.manager))
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+
+    def test_routes_templates_and_manager_are_measured(self):
+        warehouse_id = warehouse_manager.create_warehouse("Measured")
+        self.client.get(f"/warehouse/{warehouse_id}")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.mimetype, "text/plain")
+        text = response.get_data(as_text=True)
+        self.assertIn(
+            'ohtuvarasto_request_seconds_count{method="GET",'
+            'route="/warehouse/<int:warehouse_id>",status="200"}', text
+        )
+        self.assertIn(
+            'ohtuvarasto_template_seconds_count{'
+            'template="view_warehouse.html"}', text
+        )
+        self.assertIn(
+            'ohtuvarasto_manager_seconds_count{method="create_warehouse"}',
+            text
+        )
+
+    def test_can_be_disabled(self):
+        other_app, manager = Flask(__name__), Ohtuvarasto()
+        with mock.patch.dict(os.environ, {"OHTUVARASTO_METRICS": "false"}):
+            metrics.init_app(other_app, manager)
+        self.assertEqual(other_app.test_client().get("/metrics").status_code,
+                         404)
+        self.assertEqual(vars(manager).keys() & {"add_product"}, set())
@@ -77,14 +77,39 @@ class TestOhtuvarasto(unittest.TestCase):
         result = self.manager.add_product(warehouse_id, "Apple", -5)
         self.assertFalse(result)
 
-    def test_get_products_returns_copy(self):
+    def test_get_products_is_read_only(self):
         warehouse_id = self.manager.create_warehouse("Test")
         self.manager.add_product(warehouse_id, "Apple", 10)
         products = self.manager.get_products(warehouse_id)
-        products["Apple"] = 999
+        with self.assertRaises(TypeError):
+            products["Apple"] = 999
         original_products = self.manager.get_products(warehouse_id)
         self.assertEqual(original_products["Apple"], 10)
 
+    def test_get_products_is_not_changed_by_later_writes(self):
+        warehouse_id = self.manager.create_warehouse("Test")
+        self.manager.add_product(warehouse_id, "Apple", 10)
+        products = self.manager.get_products(warehouse_id)
+        self.manager.add_product(warehouse_id, "Apple", 5)
+        self.manager.add_product(warehouse_id, "Pear", 1)
+        self.manager.remove_product(warehouse_id, "Apple")
+        self.assertEqual(dict(products), {"Apple": 10})
+        self.assertEqual(
+            dict(self.manager.get_products(warehouse_id)), {"Pear": 1}
+        )
+
+    def test_get_products_views_share_unchanged_data(self):
+        warehouse_id = self.manager.create_warehouse("Test")
+        self.manager.add_product(warehouse_id, "Apple", 10)
+        first = self.manager.get_products(warehouse_id)
+        second = self.manager.get_products(warehouse_id)
+        self.assertEqual(first, second)
+        first_id = id(self.manager.get_warehouse(warehouse_id)["products"])
+        self.manager.get_products(warehouse_id)
+        self.assertEqual(
+            id(self.manager.get_warehouse(warehouse_id)["products"]), first_id
+        )
+
     def test_get_products_from_nonexistent_warehouse_returns_none(self):
         products = self.manager.get_products(999)
         self.assertIsNone(products)
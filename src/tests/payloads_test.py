@@ -0,0 +1,29 @@
+import unittest
+import payloads
+from quantities import FloatQuantities
+
+
+class TestPayloads(unittest.TestCase):
+
+    def test_field_of_non_object_body_is_none(self):
+        self.assertEqual(payloads.field({"a": 1}, "a"), 1)
+        for payload in (None, [1], "a"):
+            self.assertIsNone(payloads.field(payload, "a"))
+
+    def test_quantity_must_be_a_non_negative_number(self):
+        quantities = FloatQuantities()
+        self.assertEqual(payloads.quantity({"quantity": 2}, quantities), 2)
+        self.assertEqual(
+            payloads.quantity({"level": 1.5}, quantities, "level"), 1.5
+        )
+        for value in (True, "2", None, -1):
+            self.assertIsNone(payloads.quantity({"quantity": value}, quantities))
+
+    def test_name_is_stripped_and_not_empty(self):
+        self.assertEqual(payloads.name({"name": " Main "}), "Main")
+        for value in ("  ", 3, None):
+            self.assertIsNone(payloads.name({"name": value}))
+
+    def test_errors_are_body_and_status(self):
+        self.assertEqual(payloads.error("Bad.", 400), ({"error": "Bad."}, 400))
+        self.assertEqual(payloads.not_found()[1], 404)
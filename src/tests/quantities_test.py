@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from flask import Flask
+import api
+from ohtuvarasto import Ohtuvarasto
+from quantities import (
+    FLOAT, FixedQuantities, parse_lines, quantities_from_env
+)
+from storage import FileStorage
+from varasto import Varasto
+
+
+class TestFixedQuantities(unittest.TestCase):
+
+    def setUp(self):
+        self.quantities = FixedQuantities(3, {"Screws": 0, "Paint": 2})
+
+    def test_parses_numbers_and_text_into_units(self):
+        self.assertEqual(self.quantities.parse("1.5"), 1500)
+        self.assertEqual(self.quantities.parse(0.1), 100)
+        self.assertEqual(self.quantities.parse(7), 7000)
+        self.assertEqual(self.quantities.parse("0.0004"), 0)
+
+    def test_rejects_invalid_quantities(self):
+        for value in ("-1", "abc", "nan", "inf", float("inf"), -0.5, True,
+                      None, [1]):
+            self.assertIsNone(self.quantities.parse(value), value)
+
+    def test_rounds_half_to_even(self):
+        self.assertEqual(self.quantities.parse("0.0025"), 2)
+        self.assertEqual(self.quantities.parse("0.0035"), 4)
+
+    def test_products_may_have_fewer_digits(self):
+        self.assertEqual(self.quantities.parse("2.5", "Screws"), 2000)
+        self.assertEqual(self.quantities.parse("3.5", "Screws"), 4000)
+        self.assertEqual(self.quantities.parse("1.235", "Paint"), 1240)
+        self.assertEqual(self.quantities.parse("1.235", "Apple"), 1235)
+
+    def test_product_digits_must_fit(self):
+        with self.assertRaises(ValueError):
+            FixedQuantities(2, {"Screws": 3})
+
+    def test_shows_units_exactly(self):
+        self.assertEqual(self.quantities.text(1500), "1.5")
+        self.assertEqual(self.quantities.text(7000), "7")
+        self.assertEqual(self.quantities.text(5), "0.005")
+        self.assertEqual(self.quantities.text(float("inf")), "inf")
+        self.assertEqual(self.quantities.number(1500), 1.5)
+        self.assertEqual(self.quantities.number(float("inf")), float("inf"))
+        self.assertEqual(FixedQuantities(0).number(12), 12)
+
+    def test_float_quantities_are_unchanged(self):
+        self.assertEqual(FLOAT.parse("2.5"), 2.5)
+        self.assertEqual(FLOAT.parse(3), 3)
+        self.assertIsNone(FLOAT.parse("-1"))
+        self.assertEqual(FLOAT.text(2.5), "2.5")
+
+    def test_parses_quantities_of_json_lines(self):
+        lines = parse_lines(self.quantities, [
+            {"product": "Screws", "quantity": 1.5},
+            {"product": "Apple", "quantity": -1},
+            {"product": ["odd"], "quantity": 1},
+            {"product": "Apple", "quantity": "1"},
+            "malformed",
+        ])
+        self.assertEqual([line if isinstance(line, str) else line["quantity"]
+                          for line in lines], [2000, None, 1000, "1",
+                                               "malformed"])
+
+    def test_configured_by_environment(self):
+        self.assertIs(quantities_from_env(), FLOAT)
+        with mock.patch.dict(os.environ, {
+            "OHTUVARASTO_QUANTITY_DIGITS": "2",
+            "OHTUVARASTO_PRODUCT_DIGITS": "Screws=0, Paint=1",
+        }):
+            quantities = quantities_from_env()
+        self.assertEqual(quantities.digits, 2)
+        self.assertEqual(quantities.product_digits, {"Screws": 0, "Paint": 1})
+
+
+class TestFixedPointManager(unittest.TestCase):
+
+    def setUp(self):
+        self.quantities = FixedQuantities(2)
+        self.manager = Ohtuvarasto(quantities=self.quantities)
+        self.warehouse_id = self.manager.create_warehouse("Main")
+
+    def test_sums_are_exact(self):
+        tenth = self.quantities.parse("0.1")
+        for _ in range(1000):
+            self.manager.add_product(self.warehouse_id, "Flour", tenth)
+        total = self.manager.index("products").total("Flour")
+        self.assertEqual(self.quantities.text(total), "100")
+
+    def test_varasto_stays_integer(self):
+        varasto = Varasto(1000, 250)
+        self.assertEqual(varasto.ota_varastosta(300), 250)
+        varasto.lisaa_varastoon(2000)
+        self.assertEqual(varasto.saldo, 1000)
+        self.assertIsInstance(varasto.paljonko_mahtuu(), int)
+
+    def test_capacity_is_clamped_exactly(self):
+        self.manager.set_capacity(self.warehouse_id, self.quantities.parse(1))
+        self.manager.add_product(
+            self.warehouse_id, "Salt", self.quantities.parse("0.7")
+        )
+        self.manager.add_product(
+            self.warehouse_id, "Salt", self.quantities.parse("0.7")
+        )
+        self.assertEqual(self.manager.get_products(self.warehouse_id),
+                         {"Salt": 100})
+        self.assertEqual(self.manager.index("capacity").free_space(self.warehouse_id), 0)
+
+    def test_units_are_replayed_from_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = Ohtuvarasto(FileStorage(directory), self.quantities)
+            warehouse_id = manager.create_warehouse("A")
+            manager.add_product(warehouse_id, "Apple", 10)
+            manager.add_product(warehouse_id, "Apple", 20)
+            manager.close()
+            restored = Ohtuvarasto(FileStorage(directory), self.quantities)
+            products = dict(restored.get_products(warehouse_id))
+            restored.close()
+        self.assertEqual(products, {"Apple": 30})
+        self.assertIsInstance(products["Apple"], int)
+
+    def test_api_converts_at_the_edges(self):
+        app = Flask(__name__)
+        api.init_app(app, self.manager)
+        client = app.test_client()
+        response = client.post(
+            f"/api/v1/warehouses/{self.warehouse_id}/products",
+            json={"name": "Rice", "quantity": 0.1},
+        )
+        self.assertEqual(response.json, {"name": "Rice", "quantity": 0.1})
+        self.assertEqual(self.manager.get_products(self.warehouse_id),
+                         {"Rice": 10})
+        other = self.manager.create_warehouse("Other")
+        response = client.post("/api/v1/transfers", json={"lines": [
+            {"from": self.warehouse_id, "to": other, "product": "Rice",
+             "quantity": 0.05},
+        ]})
+        self.assertEqual(response.json, {"moved": [0.05]})
+        response = client.get("/api/v1/products/Rice")
+        self.assertEqual(response.json["total"], 0.1)
@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+from ohtuvarasto import Ohtuvarasto
+import search
+from search import ProductSearch
+
+
+class TestProductSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.search = ProductSearch()
+        for number, name in enumerate(
+            ("Apple juice", "Pineapple", "apple pie", "Grape", "Snapple",
+             "Maple syrup")
+        ):
+            self.search.product_changed(number, name, None, 1)
+
+    def test_prefix_matches_come_first(self):
+        self.assertEqual(
+            self.search.search("apple"),
+            ["Apple juice", "apple pie", "Pineapple", "Snapple"],
+        )
+
+    def test_short_queries(self):
+        self.assertEqual(self.search.search("pl"),
+                         ["Apple juice", "apple pie", "Maple syrup",
+                          "Pineapple", "Snapple"])
+        self.assertEqual(self.search.search("G"), ["Grape"])
+
+    def test_limit(self):
+        self.assertEqual(self.search.search("app", limit=3),
+                         ["Apple juice", "apple pie", "Pineapple"])
+        self.assertEqual(self.search.search("apple", limit=0), [])
+        self.assertEqual(self.search.search(""), [])
+
+    def test_selective_and_common_trigrams_agree(self):
+        expected = self.search.search("ple")
+        with mock.patch.object(search, "COMMON", 2):
+            self.assertEqual(self.search.search("ple"), expected)
+        self.assertEqual(self.search.search("xyz"), [])
+
+    def test_names_leave_with_their_last_holder(self):
+        self.search.product_changed(9, "Grape", None, 4)
+        self.search.product_changed(3, "Grape", 1, None)
+        self.assertEqual(self.search.search("grape"), ["Grape"])
+        self.search.product_changed(9, "Grape", 4, 2)
+        self.search.product_changed(9, "Grape", 2, None)
+        self.assertEqual(self.search.search("grape"), [])
+        self.assertEqual(self.search.search("rap"), [])
+        self.assertEqual(len(self.search), 5)
+
+
+class TestManagerSearch(unittest.TestCase):
+
+    def test_search_follows_product_changes(self):
+        manager = Ohtuvarasto()
+        first = manager.create_warehouse("First")
+        second = manager.create_warehouse("Second")
+        manager.import_products(first, [("SKU-1001", 1), ("SKU-2001", 2)])
+        manager.add_product(second, "sku-1002", 3)
+        self.assertEqual(manager.index("search").search("sku-1"),
+                         ["SKU-1001", "sku-1002"])
+        self.assertEqual(manager.index("search").search("001"),
+                         ["SKU-1001", "SKU-2001"])
+        manager.delete_warehouse(first)
+        self.assertEqual(manager.index("search").search("sku"), ["sku-1002"])
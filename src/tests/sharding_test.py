@@ -0,0 +1,295 @@
+import copy
+import tempfile
+import unittest
+from unittest import mock
+from indexes import WarehouseListing, WarehouseQuery
+from observers import WarehouseObserver
+from ohtuvarasto import Ohtuvarasto
+from sharding import HashRing, ShardedOhtuvarasto
+from storage import FileStorage
+from tests.concurrency_test import run_threads
+
+
+def _sharded(count=3):
+    return ShardedOhtuvarasto(
+        {f"shard-{number}": Ohtuvarasto() for number in range(count)}
+    )
+
+
+class _Recorder(WarehouseObserver):
+
+    def __init__(self):
+        self.calls = []
+
+    def warehouse_created(self, warehouse_id, name):
+        self.calls.append(("created", warehouse_id))
+
+    def warehouse_deleted(self, warehouse_id, name):
+        self.calls.append(("deleted", warehouse_id))
+
+    def product_changed(self, warehouse_id, product_name, old, new):
+        self.calls.append(("product", warehouse_id, old, new))
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_keys_spread_over_nodes(self):
+        ring = HashRing(["a", "b", "c"])
+        owners = [ring.node_for(key) for key in range(3000)]
+        for node in "abc":
+            self.assertGreater(owners.count(node), 600)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        ring = HashRing(["a", "b", "c"])
+        before = {key: ring.node_for(key) for key in range(3000)}
+        ring.add("d")
+        moved = [key for key in before if ring.node_for(key) != before[key]]
+        self.assertTrue(moved)
+        self.assertLess(len(moved), 1200)
+        self.assertTrue(all(ring.node_for(key) == "d" for key in moved))
+
+    def test_empty_ring_has_no_owner(self):
+        with self.assertRaises(LookupError):
+            HashRing().node_for(1)
+
+
+class TestShardedOhtuvarasto(unittest.TestCase):
+
+    def setUp(self):
+        self.sharded = _sharded()
+
+    def create(self, count):
+        return [self.sharded.create_warehouse(f"W{n:03}") for n in range(count)]
+
+    def test_ids_are_unique_and_spread_over_shards(self):
+        warehouse_ids = self.create(60)
+        self.assertEqual(warehouse_ids, list(range(1, 61)))
+        shards = {self.sharded._shard_name(wid) for wid in warehouse_ids}
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(
+            [wid for wid, _ in self.sharded.get_all_warehouses()],
+            warehouse_ids,
+        )
+
+    def test_single_warehouse_operations(self):
+        warehouse_id = self.sharded.create_warehouse("Main")
+        self.assertTrue(self.sharded.add_product(warehouse_id, "Apple", 3))
+        self.sharded.update_product_quantity(warehouse_id, "Apple", 5)
+        self.sharded.add_product(warehouse_id, "Pear", 1)
+        self.sharded.remove_product(warehouse_id, "Pear")
+        self.sharded.update_warehouse_name(warehouse_id, "Renamed")
+        self.sharded.set_capacity(warehouse_id, 8)
+        self.assertEqual(self.sharded.get_products(warehouse_id), {"Apple": 5})
+        self.assertEqual(self.sharded.get_warehouse(warehouse_id)["name"],
+                         "Renamed")
+        self.assertEqual(self.sharded.index("capacity").free_space(warehouse_id), 3)
+        self.assertTrue(self.sharded.delete_warehouse(warehouse_id))
+        self.assertIsNone(self.sharded.get_products(warehouse_id))
+
+    def test_product_lookups_merge_shards(self):
+        warehouse_ids = self.create(10)
+        for warehouse_id in warehouse_ids:
+            self.sharded.add_product(warehouse_id, "Apple", warehouse_id)
+        self.assertEqual(self.sharded.index("products").total("Apple"), 55)
+        self.assertEqual(
+            self.sharded.index("products").holdings("Apple"),
+            {wid: wid for wid in warehouse_ids},
+        )
+        for warehouse_id in warehouse_ids:
+            self.sharded.set_capacity(warehouse_id, 100)
+        rooms = self.sharded.index("capacity").with_room("Apple", 95, limit=3)
+        self.assertEqual(rooms, [(1, 99), (2, 98), (3, 97)])
+
+    def test_listing_pages_match_an_unsharded_manager(self):
+        single = Ohtuvarasto()
+        for number in range(40):
+            name = f"{'ab'[number % 2]}{(number * 7) % 40:02}"
+            self.assertEqual(self.sharded.create_warehouse(name),
+                             single.create_warehouse(name))
+            for manager in (self.sharded, single):
+                for product in range(number % 4):
+                    manager.add_product(number + 1, f"P{product}", 1)
+        for sort in WarehouseListing.SORTS:
+            for descending in (False, True):
+                for offset in (0, 15, 35):
+                    query = WarehouseQuery(sort, "", offset, 10, descending)
+                    expected = single.index("listing").page(query)
+                    page = self.sharded.index("listing").page(query)
+                    self.assertEqual(
+                        [wid for wid, _ in page.items],
+                        [wid for wid, _ in expected.items],
+                    )
+                    self.assertEqual(page.total, expected.total)
+
+    def test_batch_across_shards_is_atomic(self):
+        warehouse_ids = self.create(12)
+        operations = [
+            {"op": "add", "warehouse_id": wid, "product": "Apple",
+             "quantity": 1}
+            for wid in warehouse_ids
+        ]
+        bad = operations + [{"op": "remove", "warehouse_id": 1,
+                             "product": "Nope"}]
+        applied, errors = self.sharded.apply_batch(bad)
+        self.assertFalse(applied)
+        self.assertEqual(errors, [None] * 12 + ["product not found"])
+        self.assertEqual(self.sharded.index("products").total("Apple"), 0)
+
+        applied, _ = self.sharded.apply_batch(operations)
+        self.assertTrue(applied)
+        self.assertEqual(self.sharded.index("products").total("Apple"), 12)
+
+    def test_search_merges_shards(self):
+        for number, wid in enumerate(self.create(12)):
+            self.sharded.add_product(wid, f"Item {number % 5}", 1)
+            self.sharded.add_product(wid, f"Big item {number}", 1)
+        self.assertEqual(
+            self.sharded.index("search").search("item", limit=7),
+            [f"Item {number}" for number in range(5)]
+            + ["Big item 0", "Big item 1"],
+        )
+
+    def test_low_stock_is_merged_from_all_shards(self):
+        warehouse_ids = self.create(6)
+        for quantity, wid in enumerate(warehouse_ids):
+            self.sharded.add_product(wid, "Apple", quantity)
+        self.assertTrue(self.sharded.index("alerts").set_reorder_point("Apple", 4))
+        self.sharded.index("alerts").set_reorder_point("Apple", 1, warehouse_ids[0])
+        self.assertEqual(
+            [item[0] for item in self.sharded.index("alerts").low_stock(limit=3)],
+            warehouse_ids[:3],
+        )
+        self.sharded.add_shard("shard-new", Ohtuvarasto())
+        self.assertEqual(len(self.sharded.index("alerts").low_stock()), 4)
+
+    def test_malformed_batch_operations_are_reported(self):
+        applied, errors = self.sharded.apply_batch(["junk", {"op": "add"}])
+        self.assertFalse(applied)
+        self.assertEqual(errors, ["malformed operation"] * 2)
+
+
+class TestRebalancing(unittest.TestCase):
+
+    def setUp(self):
+        self.sharded = _sharded(2)
+        self.listing = WarehouseListing(self.sharded.get_warehouse)
+        self.sharded.add_observer(self.listing)
+        self.warehouse_ids = [
+            self.sharded.create_warehouse(f"W{number}") for number in range(60)
+        ]
+        for warehouse_id in self.warehouse_ids:
+            self.sharded.add_product(warehouse_id, "Apple", warehouse_id)
+            self.sharded.set_capacity(warehouse_id, 1000, "Apple")
+
+    def test_add_shard_moves_only_its_warehouses(self):
+        new_shard = Ohtuvarasto()
+        moved = self.sharded.add_shard("shard-new", new_shard)
+        self.assertGreater(moved, 0)
+        self.assertEqual(len(new_shard.get_all_warehouses()), moved)
+        for warehouse_id in self.warehouse_ids:
+            self.assertEqual(
+                self.sharded.get_products(warehouse_id),
+                {"Apple": warehouse_id},
+            )
+        self.assertEqual(self.sharded.index("products").total("Apple"), 1830)
+        self.assertEqual(
+            self.sharded.index("capacity").with_room("Apple", 990, limit=100),
+            [(10, 990), (9, 991), (8, 992), (7, 993), (6, 994), (5, 995),
+             (4, 996), (3, 997), (2, 998), (1, 999)],
+        )
+
+    def test_moved_warehouses_keep_their_rules_and_history(self):
+        alerts = self.sharded.index("alerts")
+        history = self.sharded.index("history")
+        for warehouse_id in self.warehouse_ids:
+            alerts.set_reorder_point("Apple", 100, warehouse_id)
+            alerts.set_fill_alert(warehouse_id, 0.5)
+        samples = {
+            wid: history.samples(wid, "Apple", 0, float("inf"))
+            for wid in self.warehouse_ids
+        }
+        new_shard = Ohtuvarasto()
+        self.assertGreater(self.sharded.add_shard("shard-new", new_shard), 0)
+        self.assertEqual(len(alerts.low_stock(limit=100)), 60)
+        self.assertEqual(
+            sorted(new_shard.index("alerts").fill.rules()),
+            sorted((wid, 0.5) for wid, _ in new_shard.get_all_warehouses()),
+        )
+        for warehouse_id in self.warehouse_ids:
+            self.assertEqual(
+                history.samples(warehouse_id, "Apple", 0, float("inf")),
+                samples[warehouse_id],
+            )
+
+    def test_new_warehouses_get_fresh_ids_after_rebalancing(self):
+        self.sharded.add_shard("shard-new", Ohtuvarasto())
+        self.assertEqual(self.sharded.create_warehouse("Next"), 61)
+
+    def test_observers_follow_moves(self):
+        self.sharded.add_shard("shard-new", Ohtuvarasto())
+        self.sharded.create_warehouse("Next")
+        items, total = self.listing.page(WarehouseQuery(limit=100))
+        self.assertEqual([wid for wid, _ in items], list(range(1, 62)))
+        self.assertEqual(total, 61)
+
+    def test_observers_do_not_see_moves(self):
+        recorder = _Recorder()
+        self.sharded.add_observer(recorder)
+        del recorder.calls[:]
+        self.sharded.add_shard("shard-new", Ohtuvarasto())
+        self.sharded.add_product(1, "Apple", 1)
+        self.assertEqual(recorder.calls, [("product", 1, 1, 2)])
+
+    def test_failed_move_leaves_the_warehouse_on_its_old_shard(self):
+        new_shard = Ohtuvarasto()
+        with mock.patch.object(
+            new_shard, "restore_warehouse", side_effect=OSError
+        ), self.assertRaises(OSError):
+            self.sharded.add_shard("shard-new", new_shard)
+        for warehouse_id in self.warehouse_ids:
+            self.assertEqual(
+                self.sharded.get_products(warehouse_id),
+                {"Apple": warehouse_id},
+            )
+        self.assertEqual(self.sharded.index("products").total("Apple"), 1830)
+
+    def test_version_changes_when_a_warehouse_moves(self):
+        versions = self.sharded.index("versions")
+        before = {wid: versions.version(wid) for wid in self.warehouse_ids}
+        self.sharded.add_shard("shard-new", Ohtuvarasto())
+        versions = self.sharded.index("versions")
+        self.assertTrue(all(
+            versions.version(wid) != before[wid]
+            for wid in self.warehouse_ids
+        ))
+
+    def test_writes_during_rebalancing_are_not_lost(self):
+        def work(index):
+            if index == 0:
+                self.sharded.add_shard("shard-new", Ohtuvarasto())
+                return
+            for warehouse_id in self.warehouse_ids:
+                self.sharded.add_product(warehouse_id, "Pear", 1)
+
+        run_threads(work, count=5)
+        self.assertEqual(self.sharded.index("products").total("Pear"), 4 * 60)
+
+
+class TestRestoreWarehouse(unittest.TestCase):
+
+    def test_dump_and_restore_survive_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = Ohtuvarasto(FileStorage(directory))
+            warehouse_id = manager.create_warehouse("Main")
+            manager.add_product(warehouse_id, "Apple", 4)
+            manager.set_capacity(warehouse_id, 10)
+            manager.set_capacity(warehouse_id, 6, "Apple")
+            dumped = copy.deepcopy(manager.get_warehouse(warehouse_id))
+            self.assertTrue(manager.restore_warehouse(42, dumped))
+            self.assertFalse(manager.restore_warehouse(42, {"name": "Again"}))
+            manager.close()
+
+            restored = Ohtuvarasto(FileStorage(directory))
+            self.assertEqual(restored.get_warehouse(42), dumped)
+            self.assertEqual(restored.index("ids").next_id, 43)
+            self.assertEqual(restored.index("capacity").free_space(42), 6)
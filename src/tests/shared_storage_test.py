@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from ohtuvarasto import Ohtuvarasto
+from storage import SqliteStorage, SyncPolicy, storage_from_env
+
+PROCESSES = 4
+ROUNDS = 100
+
+
+def _worker(path, warehouse_id):
+    """Run in a separate process: add apples and create a warehouse."""
+    manager = Ohtuvarasto(SqliteStorage(path))
+    for _ in range(ROUNDS):
+        manager.add_product(warehouse_id, "Apple", 1)
+    manager.create_warehouse(f"Worker {os.getpid()}")
+    manager.close()
+
+
+class TestSqliteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ohtuvarasto.db")
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close()
+        self.tmp.cleanup()
+
+    def open_manager(self, policy=None):
+        manager = Ohtuvarasto(SqliteStorage(self.path, policy))
+        self.managers.append(manager)
+        return manager
+
+    def test_state_survives_restart(self):
+        manager = self.open_manager()
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 10)
+        manager.set_capacity(warehouse_id, 20)
+
+        restored = self.open_manager()
+        self.assertEqual(restored.get_products(warehouse_id), {"Apple": 10})
+        self.assertEqual(restored.index("capacity").free_space(warehouse_id), 10)
+
+    def test_reads_see_writes_of_other_managers(self):
+        first, second = self.open_manager(), self.open_manager()
+        warehouse_id = first.create_warehouse("Main")
+        first.add_product(warehouse_id, "Apple", 3)
+        self.assertEqual(second.get_products(warehouse_id), {"Apple": 3})
+        self.assertEqual(second.index("products").holdings("Apple"), {warehouse_id: 3})
+        second.update_product_quantity(warehouse_id, "Apple", 5)
+        self.assertEqual(first.index("products").total("Apple"), 5)
+
+    def test_warehouse_ids_are_unique_across_managers(self):
+        first, second = self.open_manager(), self.open_manager()
+        ids = [first.create_warehouse("A"), second.create_warehouse("B"),
+               first.create_warehouse("C")]
+        self.assertEqual(ids, [1, 2, 3])
+        self.assertEqual(len(second.get_all_warehouses()), 3)
+
+    def test_writes_apply_on_top_of_other_managers_writes(self):
+        first, second = self.open_manager(), self.open_manager()
+        warehouse_id = first.create_warehouse("Main")
+        first.add_product(warehouse_id, "Apple", 1)
+        second.add_product(warehouse_id, "Apple", 1)
+        first.add_product(warehouse_id, "Apple", 1)
+        self.assertEqual(self.open_manager().index("products").total("Apple"), 3)
+
+    def test_batch_fails_on_state_written_by_other_manager(self):
+        first, second = self.open_manager(), self.open_manager()
+        warehouse_id = first.create_warehouse("Main")
+        first.add_product(warehouse_id, "Apple", 1)
+        second.get_products(warehouse_id)
+        first.remove_product(warehouse_id, "Apple")
+        applied, errors = second.apply_batch([{
+            "op": "update", "warehouse_id": warehouse_id,
+            "product": "Apple", "quantity": 2,
+        }])
+        self.assertFalse(applied)
+        self.assertEqual(errors, ["product not found"])
+
+    def test_lagging_manager_reloads_from_snapshot(self):
+        policy = SyncPolicy(snapshot_every=5)
+        first, second = self.open_manager(policy), self.open_manager(policy)
+        warehouse_id = first.create_warehouse("Main")
+        first.add_product(warehouse_id, "Old", 1)
+        second.get_products(warehouse_id)
+        version = second.index("versions").version(warehouse_id)
+        first.delete_warehouse(warehouse_id)
+        new_id = first.create_warehouse("New")
+        for number in range(30):
+            first.add_product(new_id, f"P{number}", number)
+
+        self.assertIsNone(second.get_warehouse(warehouse_id))
+        self.assertEqual(len(second.get_products(new_id)), 30)
+        self.assertEqual(second.index("products").holdings("Old"), {})
+        self.assertGreater(second.index("versions").version(), version)
+
+    def test_processes_share_one_inventory(self):
+        manager = self.open_manager()
+        warehouse_id = manager.create_warehouse("Shared")
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(target=_worker, args=(self.path, warehouse_id))
+            for _ in range(PROCESSES)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        self.assertEqual(manager.index("products").total("Apple"), PROCESSES * ROUNDS)
+        warehouse_ids = [wid for wid, _ in manager.get_all_warehouses()]
+        self.assertEqual(warehouse_ids, list(range(1, PROCESSES + 2)))
+
+    def test_log_without_times_is_migrated(self):
+        connection = sqlite3.connect(self.path)
+        connection.executescript("""
+            CREATE TABLE log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                args TEXT NOT NULL
+            );
+            INSERT INTO log (op, args) VALUES ('create_warehouse', '[1, "A"]');
+        """)
+        connection.close()
+        manager = self.open_manager()
+        manager.add_product(1, "Apple", 2)
+        self.assertEqual(self.open_manager().get_products(1), {"Apple": 2})
+
+    def test_storage_from_env_prefers_database(self):
+        with mock.patch.dict(os.environ, {"OHTUVARASTO_DATABASE": self.path}):
+            storage = storage_from_env()
+        self.assertIsInstance(storage, SqliteStorage)
+        storage.close()
@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from jinja2 import FileSystemBytecodeCache
+from app import app
+import startup
+
+
+class TestLazyImport(unittest.TestCase):
+
+    def tearDown(self):
+        sys.modules.pop("colorsys", None)
+
+    def test_module_runs_on_first_attribute_access(self):
+        sys.modules.pop("colorsys", None)
+        module = startup.lazy_import("colorsys")
+        self.assertIs(sys.modules["colorsys"], module)
+        self.assertEqual(module.rgb_to_hsv(1, 0, 0), (0, 1, 1))
+
+    def test_imported_module_is_returned(self):
+        self.assertIs(startup.lazy_import("os"), os)
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.addCleanup(setattr, app.jinja_env, "bytecode_cache",
+                        app.jinja_env.bytecode_cache)
+        app.jinja_env.cache.clear()
+        self.addCleanup(app.jinja_env.cache.clear)
+
+    def test_command_fills_the_cache(self):
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(self.directory)
+        result = app.test_cli_runner().invoke(args=["compile-templates"])
+        count = len(app.jinja_env.list_templates())
+        self.assertEqual(result.output, f"Compiled {count} templates.\n")
+        self.assertEqual(len(os.listdir(self.directory)), count)
+
+    def test_command_needs_a_cache(self):
+        app.jinja_env.bytecode_cache = None
+        result = app.test_cli_runner().invoke(args=["compile-templates"])
+        self.assertNotEqual(result.exit_code, 0)
+
+    def test_environment_configures_the_cache(self):
+        cache = os.path.join(self.directory, "templates")
+        with mock.patch.dict(os.environ,
+                             {"OHTUVARASTO_TEMPLATE_CACHE": cache}):
+            startup.init_app(app)
+        self.assertIsInstance(app.jinja_env.bytecode_cache,
+                              FileSystemBytecodeCache)
+        self.assertTrue(os.path.isdir(cache))
+
+    def test_warm_up_loads_every_template(self):
+        startup.warm_up(app)
+        self.assertEqual(len(app.jinja_env.cache),
+                         len(app.jinja_env.list_templates()))
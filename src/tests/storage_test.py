@@ -0,0 +1,148 @@
+import os
+import tempfile
+import time
+import unittest
+from ohtuvarasto import Ohtuvarasto
+from storage import FileStorage, SyncPolicy
+
+
+class TestFileStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_manager(self, policy=None):
+        return Ohtuvarasto(FileStorage(self.directory, policy))
+
+    def test_state_survives_restart(self):
+        manager = self.open_manager()
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 10)
+        manager.add_product(warehouse_id, "Apple", 5)
+        manager.close()
+
+        restored = self.open_manager()
+        self.assertEqual(restored.get_warehouse(warehouse_id)["name"], "Main")
+        self.assertEqual(restored.get_products(warehouse_id), {"Apple": 15})
+
+    def test_every_mutation_is_replayed(self):
+        manager = self.open_manager()
+        first = manager.create_warehouse("A")
+        second = manager.create_warehouse("B")
+        manager.add_product(first, "Apple", 10)
+        manager.add_product(first, "Pear", 3)
+        manager.update_product_quantity(first, "Apple", 7)
+        manager.remove_product(first, "Pear")
+        manager.update_warehouse_name(first, "Renamed")
+        manager.add_product(second, "Banana", 1)
+        manager.clear_warehouse(second)
+        manager.delete_warehouse(second)
+        manager.close()
+
+        restored = self.open_manager()
+        self.assertEqual(restored.get_warehouse(first)["name"], "Renamed")
+        self.assertEqual(restored.get_products(first), {"Apple": 7})
+        self.assertIsNone(restored.get_warehouse(second))
+
+    def test_alert_rules_are_replayed(self):
+        manager = self.open_manager()
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 2)
+        manager.index("alerts").set_reorder_point("Apple", 5)
+        manager.close()
+
+        restored = self.open_manager()
+        self.assertEqual(
+            restored.index("alerts").low_stock(),
+            [(warehouse_id, "Apple", 2, 5)],
+        )
+
+    def test_failed_mutations_are_not_logged(self):
+        manager = self.open_manager()
+        manager.add_product(999, "Apple", 10)
+        manager.close()
+        with open(os.path.join(self.directory, FileStorage.LOG_NAME)) as log:
+            self.assertEqual(log.read(), "")
+
+    def test_ids_are_not_reused_after_restart(self):
+        manager = self.open_manager()
+        manager.create_warehouse("A")
+        second = manager.create_warehouse("B")
+        manager.delete_warehouse(second)
+        manager.close()
+
+        restored = self.open_manager()
+        self.assertEqual(restored.create_warehouse("C"), 3)
+
+    def test_snapshot_truncates_log(self):
+        manager = self.open_manager(SyncPolicy(snapshot_every=3))
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 1)
+        manager.add_product(warehouse_id, "Apple", 1)
+        manager.add_product(warehouse_id, "Apple", 1)
+        manager.close()
+
+        with open(os.path.join(self.directory, FileStorage.LOG_NAME)) as log:
+            self.assertEqual(len(log.readlines()), 1)
+        restored = self.open_manager()
+        self.assertEqual(restored.get_products(warehouse_id), {"Apple": 3})
+
+    def test_log_records_covered_by_snapshot_are_skipped(self):
+        manager = self.open_manager()
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 2)
+        manager.close()
+        log_path = os.path.join(self.directory, FileStorage.LOG_NAME)
+        with open(log_path) as log:
+            old_log = log.read()
+
+        manager = self.open_manager()
+        manager.snapshot()
+        manager.close()
+        # Simulate a crash between writing the snapshot and truncating the log
+        with open(log_path, "w") as log:
+            log.write(old_log)
+
+        restored = self.open_manager()
+        self.assertEqual(restored.get_products(warehouse_id), {"Apple": 2})
+
+    def test_torn_last_record_is_dropped(self):
+        manager = self.open_manager()
+        warehouse_id = manager.create_warehouse("Main")
+        manager.add_product(warehouse_id, "Apple", 2)
+        manager.close()
+        log_path = os.path.join(self.directory, FileStorage.LOG_NAME)
+        with open(log_path, "a") as log:
+            log.write('{"seq": 3, "op": "add_pro')
+
+        restored = self.open_manager()
+        restored.add_product(warehouse_id, "Apple", 1)
+        restored.close()
+
+        self.assertEqual(self.open_manager().get_products(warehouse_id), {"Apple": 3})
+
+    def test_group_commit_syncs_after_batch(self):
+        storage = FileStorage(self.directory, SyncPolicy(sync_every=2))
+        manager = Ohtuvarasto(storage)
+        manager.create_warehouse("A")
+        self.assertEqual(storage._log.pending, 1)
+        manager.create_warehouse("B")
+        self.assertEqual(storage._log.pending, 0)
+        manager.close()
+
+    def test_delayed_sync_waits_for_the_storage_lock(self):
+        storage = FileStorage(self.directory, SyncPolicy(sync_interval=0.01))
+        storage.load()
+        with storage._lock:
+            storage.append("create_warehouse", [1, "A"], 0.0)
+            time.sleep(0.05)
+            self.assertEqual(storage._log.pending, 1)
+        deadline = time.monotonic() + 5
+        while storage._log.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(storage._log.pending, 0)
+        storage.close()
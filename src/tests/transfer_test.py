@@ -0,0 +1,185 @@
+import tempfile
+import unittest
+from unittest import mock
+from ohtuvarasto import Ohtuvarasto
+from sharding import ShardedOhtuvarasto
+from storage import FileStorage
+from tests.concurrency_test import run_threads
+
+
+def _line(source_id, target_id, product, quantity):
+    return {"from": source_id, "to": target_id, "product": product,
+            "quantity": quantity}
+
+
+class TestTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Ohtuvarasto()
+        self.source = self.manager.create_warehouse("Source")
+        self.target = self.manager.create_warehouse("Target")
+        self.manager.add_product(self.source, "Apple", 10)
+
+    def products(self):
+        return (dict(self.manager.get_products(self.source)),
+                dict(self.manager.get_products(self.target)))
+
+    def test_transfer_moves_stock(self):
+        moved = self.manager.transfer(self.source, self.target, "Apple", 4)
+        self.assertEqual(moved, 4)
+        self.assertEqual(self.products(), ({"Apple": 6}, {"Apple": 4}))
+
+    def test_transfer_of_more_than_held_moves_everything(self):
+        moved = self.manager.transfer(self.source, self.target, "Apple", 25)
+        self.assertEqual(moved, 10)
+        self.assertEqual(self.products(), ({"Apple": 0}, {"Apple": 10}))
+
+    def test_transfer_is_limited_by_room_in_target(self):
+        self.manager.set_capacity(self.target, 3)
+        moved = self.manager.transfer(self.source, self.target, "Apple", 5)
+        self.assertEqual(moved, 3)
+        self.assertEqual(self.products(), ({"Apple": 7}, {"Apple": 3}))
+
+    def test_transfer_of_missing_product_moves_nothing(self):
+        moved = self.manager.transfer(self.source, self.target, "Pear", 5)
+        self.assertEqual(moved, 0)
+        self.assertEqual(self.products(), ({"Apple": 10}, {}))
+
+    def test_invalid_transfers(self):
+        for args in ((self.source, 99, "Apple", 1),
+                     (self.source, self.source, "Apple", 1),
+                     (self.source, self.target, "Apple", -1),
+                     (self.source, self.target, "", 1)):
+            self.assertIsNone(self.manager.transfer(*args))
+        self.assertEqual(self.products(), ({"Apple": 10}, {}))
+
+    def test_transfer_is_a_one_line_order(self):
+        with mock.patch.object(
+            self.manager, "transfer_order", wraps=self.manager.transfer_order
+        ) as transfer_order:
+            moved = self.manager.transfer(self.source, self.target, "Apple", 4)
+        self.assertEqual(moved, 4)
+        transfer_order.assert_called_once_with(
+            [_line(self.source, self.target, "Apple", 4)]
+        )
+
+    def test_order_lines_apply_in_order(self):
+        third = self.manager.create_warehouse("Third")
+        moved, errors = self.manager.transfer_order([
+            _line(self.source, self.target, "Apple", 6),
+            _line(self.target, third, "Apple", 8),
+        ])
+        self.assertEqual(moved, [6, 6])
+        self.assertEqual(errors, [None, None])
+        self.assertEqual(self.manager.get_products(third), {"Apple": 6})
+
+    def test_order_with_an_invalid_line_moves_nothing(self):
+        moved, errors = self.manager.transfer_order([
+            _line(self.source, self.target, "Apple", 6),
+            _line(self.target, 42, "Apple", 1),
+            {"from": self.source},
+        ])
+        self.assertIsNone(moved)
+        self.assertEqual(
+            errors, [None, "warehouse not found", "malformed line"]
+        )
+        self.assertEqual(self.products(), ({"Apple": 10}, {}))
+
+    def test_concurrent_transfers_keep_the_total(self):
+        self.manager.add_product(self.target, "Apple", 10)
+
+        def shuffle(index):
+            source, target = self.source, self.target
+            if index % 2:
+                source, target = target, source
+            for _ in range(200):
+                self.manager.transfer(source, target, "Apple", 3)
+
+        run_threads(shuffle)
+        self.assertEqual(self.manager.index("products").total("Apple"), 20)
+
+    def test_transfers_replay_from_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manager = Ohtuvarasto(FileStorage(directory))
+            source = manager.create_warehouse("Source")
+            target = manager.create_warehouse("Target")
+            manager.add_product(source, "Apple", 10)
+            manager.transfer(source, target, "Apple", 4)
+            manager.close()
+            restored = Ohtuvarasto(FileStorage(directory))
+            self.assertEqual(restored.get_products(target), {"Apple": 4})
+            self.assertEqual(restored.get_products(source), {"Apple": 6})
+
+
+class TestShardedTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.sharded = ShardedOhtuvarasto(
+            {name: Ohtuvarasto() for name in ("a", "b")}
+        )
+        ids = [self.sharded.create_warehouse(f"W{n}") for n in range(20)]
+        self.by_shard = {}
+        for warehouse_id in ids:
+            self.by_shard.setdefault(
+                self.sharded._shard_name(warehouse_id), []
+            ).append(warehouse_id)
+            self.sharded.add_product(warehouse_id, "Apple", 5)
+
+    def test_transfer_within_a_shard(self):
+        source, target = self.by_shard["a"][:2]
+        self.assertEqual(self.sharded.transfer(source, target, "Apple", 2), 2)
+        self.assertEqual(self.sharded.get_products(target), {"Apple": 7})
+
+    def test_transfer_across_shards(self):
+        source, target = self.by_shard["a"][0], self.by_shard["b"][0]
+        self.assertEqual(self.sharded.transfer(source, target, "Apple", 2), 2)
+        self.assertEqual(self.sharded.get_products(source), {"Apple": 3})
+        self.assertEqual(self.sharded.get_products(target), {"Apple": 7})
+        self.assertEqual(self.sharded.index("products").total("Apple"), 100)
+
+    def test_order_across_shards_applies_in_order(self):
+        first, second = self.by_shard["a"][:2]
+        third = self.by_shard["b"][0]
+        moved, errors = self.sharded.transfer_order([
+            _line(first, third, "Apple", 5),
+            _line(third, second, "Apple", 10),
+            _line(second, first, "Pear", 1),
+        ])
+        self.assertEqual(moved, [5, 10, 0])
+        self.assertEqual(errors, [None, None, None])
+        self.assertEqual(self.sharded.get_products(first), {"Apple": 0})
+        self.assertEqual(self.sharded.get_products(second), {"Apple": 15})
+        self.assertEqual(self.sharded.get_products(third), {"Apple": 0})
+
+    def test_order_across_shards_is_limited_by_capacity(self):
+        source, target = self.by_shard["a"][0], self.by_shard["b"][0]
+        self.sharded.set_capacity(target, 8)
+        moved, _ = self.sharded.transfer_order([
+            _line(source, target, "Apple", 2),
+            _line(source, target, "Pear", 0),
+            _line(source, target, "Apple", 2),
+        ])
+        self.assertEqual(moved, [2, 0, 1])
+        self.assertEqual(self.sharded.get_products(target), {"Apple": 8})
+
+    def test_order_across_shards_with_an_invalid_line_moves_nothing(self):
+        source, target = self.by_shard["a"][0], self.by_shard["b"][0]
+        moved, errors = self.sharded.transfer_order([
+            _line(source, target, "Apple", 2),
+            _line(target, 42, "Apple", 1),
+        ])
+        self.assertIsNone(moved)
+        self.assertIsNone(errors[0])
+        self.assertIsNotNone(errors[1])
+        self.assertEqual(self.sharded.index("products").total("Apple"), 100)
+
+    def test_concurrent_transfers_across_shards_keep_the_total(self):
+        pair = (self.by_shard["a"][0], self.by_shard["b"][0])
+
+        def shuffle(index):
+            source, target = pair[index % 2], pair[1 - index % 2]
+            for _ in range(100):
+                self.sharded.transfer(source, target, "Apple", 3)
+
+        run_threads(shuffle)
+        self.assertEqual(self.sharded.index("products").total("Apple"), 100)
@@ -0,0 +1,85 @@
+import unittest
+from random import Random
+from varasto import Varasto
+from varasto_array import VarastoArray
+
+
+class TestVarastoArray(unittest.TestCase):
+
+    def setUp(self):
+        self.varastot = VarastoArray([10, 20])
+
+    def test_konstruktori_luo_tyhjat_varastot(self):
+        self.assertEqual(len(self.varastot), 2)
+        self.assertAlmostEqual(self.varastot.saldo(0), 0)
+        self.assertAlmostEqual(self.varastot.tilavuus(1), 20)
+
+    def test_alku_saldot_rajataan_kuten_varastossa(self):
+        varastot = VarastoArray([-5, 10, 10], [3, -3, 15])
+        self.assertAlmostEqual(varastot.tilavuus(0), 0)
+        self.assertAlmostEqual(varastot.saldo(0), 0)
+        self.assertAlmostEqual(varastot.saldo(1), 0)
+        self.assertAlmostEqual(varastot.saldo(2), 10)
+
+    def test_lisaa_varasto_palauttaa_indeksin(self):
+        self.assertEqual(self.varastot.lisaa_varasto(5, 2), 2)
+        self.assertAlmostEqual(self.varastot.paljonko_mahtuu(2), 3)
+
+    def test_lisays_ja_otto_koskevat_vain_omaa_varastoa(self):
+        self.varastot.lisaa_varastoon(0, 8)
+        self.assertAlmostEqual(self.varastot.ota_varastosta(0, 2), 2)
+        self.assertAlmostEqual(self.varastot.saldo(0), 6)
+        self.assertAlmostEqual(self.varastot.saldo(1), 0)
+
+    def test_toimii_kuten_varasto(self):
+        # sama toimintosarja Varasto-olioilla ja taulukolla
+        toimet = [("lisaa", 8), ("lisaa", 20), ("lisaa", -5), ("ota", 3),
+                  ("ota", -1), ("ota", 50), ("lisaa", 4)]
+        varasto = Varasto(10)
+        indeksi = self.varastot.lisaa_varasto(10)
+        for toimi, maara in toimet:
+            if toimi == "lisaa":
+                varasto.lisaa_varastoon(maara)
+                self.varastot.lisaa_varastoon(indeksi, maara)
+            else:
+                self.assertAlmostEqual(
+                    self.varastot.ota_varastosta(indeksi, maara),
+                    varasto.ota_varastosta(maara),
+                )
+            self.assertAlmostEqual(self.varastot.saldo(indeksi), varasto.saldo)
+
+    def test_varastolla_ei_ole_dict_attribuuttia(self):
+        self.assertFalse(hasattr(Varasto(10), "__dict__"))
+
+    def test_monikkolisays_rajaa_tilavuuteen(self):
+        self.varastot.lisaa_varastoon_many([0, 1, 0, 1], [4, -2, 9, 5])
+        self.assertAlmostEqual(self.varastot.saldo(0), 10)
+        self.assertAlmostEqual(self.varastot.saldo(1), 5)
+
+    def test_monikko_otto_palauttaa_saadut_maarat(self):
+        self.varastot.lisaa_varastoon_many([0, 1], [5, 20])
+        saadut = self.varastot.ota_varastosta_many([0, 0, 1, 1], [3, 3, -1, 4])
+        self.assertEqual(list(saadut), [3, 2, 0, 4])
+        self.assertAlmostEqual(self.varastot.saldo(0), 0)
+        self.assertAlmostEqual(self.varastot.saldo(1), 16)
+
+    def test_monikko_vastaa_silmukkaa_toistuvilla_indekseilla(self):
+        random = Random(1)
+        silmukka = VarastoArray([random.uniform(0, 50) for _ in range(8)])
+        monikko = VarastoArray([silmukka.tilavuus(i) for i in range(8)])
+        for _ in range(20):
+            indeksit = [random.randrange(8) for _ in range(30)]
+            maarat = [random.uniform(-5, 20) for _ in range(30)]
+            for indeksi, maara in zip(indeksit, maarat):
+                silmukka.lisaa_varastoon(indeksi, maara)
+            monikko.lisaa_varastoon_many(indeksit, maarat)
+            odotetut = [silmukka.ota_varastosta(i, m / 2)
+                        for i, m in zip(indeksit, maarat)]
+            saadut = monikko.ota_varastosta_many(indeksit, [m / 2 for m in maarat])
+            self.assertEqual(list(saadut), odotetut)
+        self.assertEqual([monikko.saldo(i) for i in range(8)],
+                         [silmukka.saldo(i) for i in range(8)])
+
+    def test_eri_pituiset_taulukot_hylataan(self):
+        with self.assertRaises(ValueError):
+            self.varastot.ota_varastosta_many([0, 1], [1])
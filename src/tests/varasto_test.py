@@ -81,3 +81,17 @@ class TestVarasto(unittest.TestCase):
         teksti = str(self.varasto)
         self.assertIn("saldo = 3", teksti)
         self.assertIn("vielä tilaa 7", teksti)
+
+    def test_nollasaldo_on_tilavuuden_tyyppia(self):
+        varasto = Varasto(10.0)
+        self.assertIs(type(varasto.saldo), float)
+        self.assertEqual(str(varasto), "saldo = 0.0, vielä tilaa 10.0")
+        self.assertIs(type(Varasto(10).saldo), int)
+        self.assertIs(type(Varasto(10, 2.5).saldo), float)
+
+    def test_kokonaisluvut_pysyvat_kokonaislukuina(self):
+        varasto = Varasto(10, 4)
+        self.assertEqual(varasto.ota_varastosta(6), 4)
+        self.assertIs(type(varasto.saldo), int)
+        self.assertIs(type(varasto.ota_varastosta(-1)), int)
+        self.assertIs(type(Varasto(-5).tilavuus), int)
@@ -1,9 +1,14 @@
 class Varasto:
+    # __slots__ jättää pois oliokohtaisen __dict__:in, mikä säästää muistia
+    __slots__ = ("tilavuus", "saldo")
+
     def __init__(self, tilavuus, alku_saldo=0):
+        # nolla on tilavuuden tyyppiä, jotta kokonaisluvut pysyvät tarkkoina
+        nolla = type(tilavuus)(0)
         # tilavuus ei voi olla negatiivinen
-        self.tilavuus = max(0.0, tilavuus)
+        self.tilavuus = max(nolla, tilavuus)
         # saldo ei voi olla negatiivinen eikä yli tilavuuden
-        self.saldo = min(max(0.0, alku_saldo), self.tilavuus)
+        self.saldo = min(max(nolla, alku_saldo), self.tilavuus)
 
     # huom: ominaisuus voidaan myös laskea.
     def paljonko_mahtuu(self):
@@ -19,10 +24,10 @@ class Varasto:
 
     def ota_varastosta(self, maara):
         if maara < 0:
-            return 0.0
+            return type(maara)(0)
         if maara > self.saldo:
             kaikki_mita_voidaan = self.saldo
-            self.saldo = 0.0
+            self.saldo = type(self.saldo)(0)
 
             return kaikki_mita_voidaan
 
@@ -32,3 +37,28 @@ class Varasto:
 
     def __str__(self):
         return f"saldo = {self.saldo}, vielä tilaa {self.paljonko_mahtuu()}"
+
+
+class ValvottuVarasto(Varasto):
+    # Varasto, joka kertoo valvojalleen jokaisesta saldon muutoksesta,
+    # esim. alerts.FillWatch-oliolle täyttöasteen hälytyksiä varten.
+    # Tavallinen Varasto pysyy ennallaan, joten valvonta ei hidasta sitä.
+    __slots__ = ("valvoja",)
+
+    def __init__(self, tilavuus, alku_saldo=0, valvoja=None):
+        super().__init__(tilavuus, alku_saldo)
+        self.valvoja = valvoja
+        self._ilmoita()
+
+    def lisaa_varastoon(self, maara):
+        super().lisaa_varastoon(maara)
+        self._ilmoita()
+
+    def ota_varastosta(self, maara):
+        otettu = super().ota_varastosta(maara)
+        self._ilmoita()
+        return otettu
+
+    def _ilmoita(self):
+        if self.valvoja is not None:
+            self.valvoja.saldo_muuttui(self)
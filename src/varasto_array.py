@@ -0,0 +1,116 @@
+from array import array
+
+
+class VarastoArray:
+    """Joukko varastoja, joiden tilavuudet ja saldot ovat yhtenäisissä
+    array('d')-puskureissa yksittäisten Varasto-olioiden sijaan.
+
+    Jokaista varastoa käsitellään indeksillä, ja lisäys ja otto toimivat
+    täsmälleen kuten Varasto-luokassa. Monikkometodit käsittelevät koko
+    aallon yhdellä läpikäynnillä; sama indeksi voi esiintyä useasti, ja
+    rivit käsitellään annetussa järjestyksessä.
+    """
+
+    def __init__(self, tilavuudet=(), alku_saldot=None):
+        self._tilavuudet = array("d")
+        self._saldot = array("d")
+        if alku_saldot is None:
+            alku_saldot = [0] * len(tilavuudet)
+        for tilavuus, alku_saldo in zip(tilavuudet, alku_saldot):
+            self.lisaa_varasto(tilavuus, alku_saldo)
+
+    def __len__(self):
+        return len(self._saldot)
+
+    def lisaa_varasto(self, tilavuus, alku_saldo=0):
+        """Lisää uuden varaston ja palauttaa sen indeksin."""
+        # samat rajaukset kuin Varasto-luokan konstruktorissa
+        tilavuus = max(0.0, tilavuus)
+        self._tilavuudet.append(tilavuus)
+        self._saldot.append(min(max(0.0, alku_saldo), tilavuus))
+        return len(self._saldot) - 1
+
+    def tilavuus(self, indeksi):
+        return self._tilavuudet[indeksi]
+
+    def saldo(self, indeksi):
+        return self._saldot[indeksi]
+
+    def paljonko_mahtuu(self, indeksi):
+        return self._tilavuudet[indeksi] - self._saldot[indeksi]
+
+    def lisaa_varastoon(self, indeksi, maara):
+        if maara < 0:
+            return
+        if maara <= self.paljonko_mahtuu(indeksi):
+            self._saldot[indeksi] = self._saldot[indeksi] + maara
+        else:
+            self._saldot[indeksi] = self._tilavuudet[indeksi]
+
+    def ota_varastosta(self, indeksi, maara):
+        if maara < 0:
+            return 0.0
+        saldo = self._saldot[indeksi]
+        if maara > saldo:
+            self._saldot[indeksi] = 0.0
+            return saldo
+
+        self._saldot[indeksi] = saldo - maara
+
+        return maara
+
+    def lisaa_varastoon_many(self, indeksit, maarat):
+        """Lisää maarat[i] varastoon indeksit[i] jokaiselle i."""
+        _tarkista_pituudet(indeksit, maarat)
+        saldot = self._saldot_kasittelyyn(indeksit)
+        _lisaa(self._tilavuudet, saldot, indeksit, maarat)
+        self._saldot_takaisin(saldot)
+
+    def ota_varastosta_many(self, indeksit, maarat):
+        """Ottaa maarat[i] varastosta indeksit[i] ja palauttaa saadut
+        määrät array('d')-taulukkona samassa järjestyksessä."""
+        _tarkista_pituudet(indeksit, maarat)
+        saldot = self._saldot_kasittelyyn(indeksit)
+        saadut = _ota(saldot, indeksit, maarat)
+        self._saldot_takaisin(saldot)
+        return array("d", saadut)
+
+    def _saldot_kasittelyyn(self, indeksit):
+        # isossa aallossa saldot on nopeampi käsitellä listana ja kirjoittaa
+        # kerralla takaisin kuin lukea ja kirjoittaa taulukkoa alkio kerrallaan
+        if len(indeksit) >= len(self._saldot):
+            return self._saldot.tolist()
+        return self._saldot
+
+    def _saldot_takaisin(self, saldot):
+        if saldot is not self._saldot:
+            self._saldot = array("d", saldot)
+
+
+def _lisaa(tilavuudet, saldot, indeksit, maarat):
+    for indeksi, maara in zip(indeksit, maarat):
+        if maara < 0:
+            continue
+        saldo = saldot[indeksi]
+        if maara <= tilavuudet[indeksi] - saldo:
+            saldot[indeksi] = saldo + maara
+        else:
+            saldot[indeksi] = tilavuudet[indeksi]
+
+
+def _ota(saldot, indeksit, maarat):
+    saadut = []
+    lisaa_saatu = saadut.append
+    for indeksi, maara in zip(indeksit, maarat):
+        saldo = saldot[indeksi]
+        # sama kuin Varasto.ota_varastosta: negatiivinen otto antaa nollan ja
+        # liian suuri otto tyhjentää varaston
+        saatu = 0.0 if maara < 0 else saldo if maara > saldo else maara
+        saldot[indeksi] = saldo - saatu
+        lisaa_saatu(saatu)
+    return saadut
+
+
+def _tarkista_pituudet(indeksit, maarat):
+    if len(indeksit) != len(maarat):
+        raise ValueError("indeksejä ja määriä on oltava yhtä monta")